@@ -5,8 +5,11 @@ import os
 from pygarl.plugins.plist import list_serial_ports
 from pygarl.plugins.plot import plot_sample
 from pygarl.plugins.record import record_new_samples, record_new_samples_stream, record_new_samples_piezo
-from pygarl.plugins.train import train_svm_classifier, train_mlp_classifier
+from pygarl.plugins.train import train_svm_classifier, train_mlp_classifier, train_online_classifier, \
+    update_online_classifier, distill_classifier, train_approx_svm_classifier
 from pygarl.plugins.sprint import sprint as sprint_func
+from pygarl.plugins.run import run_pipeline
+from pygarl.plugins.serve import serve_model
 
 
 def get_default_record_directory():
@@ -71,7 +74,7 @@ def sprint(port, baudrate):
 @click.option('--dir', '-d', default=get_default_record_directory(),
               help="Dataset directory where samples are saved.")
 @click.option('--classifier', '-c', default="svm",
-              help="Classifier used to create a model. Default is SVM. You can use svm, mlp and custom.")
+              help="Classifier used to create a model. Default is SVM. You can use svm, mlp, approx, online and custom.")
 @click.option('--trainer', '-t', default=None,
               help="Load a custom trainer. --classifier custom must be specified.")
 @click.argument('output_file')
@@ -84,6 +87,10 @@ def train(dir, classifier, output_file, trainer):
         train_svm_classifier(dir, output_file)
     elif classifier == "mlp":
         train_mlp_classifier(dir, output_file)
+    elif classifier == "approx":
+        train_approx_svm_classifier(dir, output_file)
+    elif classifier == "online":
+        train_online_classifier(dir, output_file)
     elif classifier == "custom":
         if trainer is None:
             raise ValueError("If --classifier custom is used, a trainer must be specified")
@@ -97,6 +104,33 @@ def train(dir, classifier, output_file, trainer):
         raise ValueError("{classifier} is not a valid classifier".format(classifier=classifier))
 
 
+@cli.command()
+@click.option('--dir', '-d', default=get_default_record_directory(),
+              help="Dataset directory where samples are saved.")
+@click.argument('model_file')
+def update(dir, model_file):
+    """
+    Update an online model with the new samples of a dataset
+    """
+    update_online_classifier(dir, model_file)
+
+
+@cli.command()
+@click.option('--dir', '-d', default=get_default_record_directory(),
+              help="Dataset directory where samples are saved.")
+@click.option('--classifier', '-c', default="svm",
+              help="Classifier of the teacher model. You can use svm and mlp.")
+@click.option('--student', '-s', default="mlp",
+              help="Type of the compact model. You can use mlp and rff ( random Fourier features ).")
+@click.argument('teacher_file')
+@click.argument('output_file')
+def distill(dir, classifier, student, teacher_file, output_file):
+    """
+    Train a compact model that mimics a trained model
+    """
+    distill_classifier(dir, teacher_file, output_file, teacher_classifier=classifier, student=student)
+
+
 @cli.command()
 @click.option('--port', '-p', default="COM6", help="Serial Port NAME, for example COM3.")
 @click.argument('example_name')
@@ -117,6 +151,36 @@ def example(port, example_name, args):
     ex.run_example(arguments, port=port)
 
 
+@cli.command()
+@click.argument('spec_file')
+def run(spec_file):
+    """
+    Run the pipeline described by a JSON or TOML specification
+    """
+    run_pipeline(spec_file)
+
+
+@cli.command()
+@click.option('--classifier', '-c', default="svm",
+              help="Classifier of the model. You can use svm, mlp, approx, online, dtw and distilled.")
+@click.option('--socket', '-s', default=None, help="Path of the Unix domain socket the server listens on.")
+@click.option('--host', default="127.0.0.1", help="Host of the TCP socket, used if --socket is not specified.")
+@click.option('--port', '-p', default=5690, help="Port of the TCP socket, used if --socket is not specified.")
+@click.option('--window', '-w', default=20, help="Number of frames of the windows made from the streamed frames.")
+@click.option('--step', default=10, help="Number of frames between two consecutive windows.")
+@click.option('--workers', default=2, help="Number of threads that classify the samples.")
+@click.option('--batch-size', default=16, help="Maximum number of samples classified together.")
+@click.argument('model_file')
+def serve(classifier, socket, host, port, window, step, workers, batch_size, model_file):
+    """
+    Serve the predictions of a model to local clients
+    """
+    address = socket if socket is not None else (host, port)
+
+    serve_model(model_file, classifier=classifier, address=address, window=window, step=step, workers=workers,
+                batch_size=batch_size)
+
+
 @cli.command()
 @click.argument('sample_file')
 def plot(sample_file):
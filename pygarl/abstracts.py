@@ -1,12 +1,15 @@
 from __future__ import print_function
 import os
 import joblib
+import numpy as np
 import seaborn
 import pandas
 import matplotlib.pyplot as plt
 from matplotlib.colors import ListedColormap
+from scipy import signal
 
 from pygarl.base import Sample
+from pygarl.filters import SOSFilter
 
 
 class ControlSignal:
@@ -17,6 +20,25 @@ class ControlSignal:
     STOP = 1
     ERROR = 2
     TIMEOUT = 3
+    # Some frames have been lost, the following ones are not contiguous with the previous ones
+    OVERRUN = 4
+
+
+def get_axes_columns(axes, data_axes):
+    """
+    Return the indexes of the columns that contain the given axis
+
+    :param axes: list of the indexes of the axis to select
+    :param data_axes: list of the indexes of the axis contained in the columns, None if all the axis are
+    """
+    if data_axes is None:
+        return axes
+
+    try:
+        return [list(data_axes).index(axis) for axis in axes]
+    except ValueError:
+        raise ValueError("The data contains the axis {data_axes}, not all of {axes}".format(data_axes=data_axes,
+                                                                                             axes=axes))
 
 
 class AbstractDataReader(object):
@@ -25,14 +47,47 @@ class AbstractDataReader(object):
     with the signal source, as an Arduino or GPIOs pins.
     """
 
-    def __init__(self):
+    def __init__(self, axes=None, decimation=1):
+        """
+        :param axes: list of the indexes of the axis to read, the other values of each frame are
+                     never converted. If None, all the axis are read.
+        :param decimation: if greater than 1, only one frame every decimation frames is notified,
+                           after a low-pass filter that removes the frequencies above the new Nyquist rate.
+        """
         self.managers = []
 
+        self.axes = axes
+        self.decimation = decimation
+
+        # Anti-aliasing filter and the number of frames received, used by the decimation
+        self.decimation_filter = None
+        self.decimation_counter = 0
+        if decimation > 1:
+            # Same filter used by scipy.signal.decimate
+            self.decimation_filter = SOSFilter(signal.cheby1(8, 0.05, 0.8 / decimation, output="sos"))
+
+    def configure_for_classifier(self, classifier):
+        """
+        Read only the axis needed by the classifier
+        """
+        self.axes = classifier.axes
+
+        for manager in self.managers:
+            self.notify_axes(manager)
+
     def attach_manager(self, manager):
         """
         Attach a manager to the DataReader, so that when an event occurs the manager is notified
         """
         self.managers.append(manager)
+        self.notify_axes(manager)
+
+    def notify_axes(self, manager):
+        """
+        Tell the manager which axis the notified frames contain, if it keeps track of them
+        """
+        if hasattr(manager, "axes"):
+            manager.axes = self.axes
 
     def detach_manager(self, manager):
         """
@@ -40,21 +95,98 @@ class AbstractDataReader(object):
         """
         self.managers.remove(manager)
 
+    def parse_values(self, string_values):
+        """
+        Convert the values of a data line to floats, only for the selected axis
+
+        :param string_values: list of strings, one for each axis
+        :return: list of floats, or None if a value can't be converted
+        """
+        # Only the selected axis are converted
+        if self.axes is not None:
+            try:
+                string_values = [string_values[axis] for axis in self.axes]
+            except IndexError:
+                return None
+
+        try:
+            return [float(value) for value in string_values]
+        except ValueError:  # Conversion error, the data line is wrong
+            return None
+
+    def dispatch_line(self, line, expected_axis=None):
+        """
+        Analyze a line received from the signal source and dispatch the correct event based on the content.
+        A data line should have this format:
+        START -36 1968 16060 -108 258 -136 END
+
+        :param line: the received line, without the new line characters
+        :param expected_axis: if set, the number of values that a data line must contain
+        """
+        if line == "STARTING BATCH":
+            # Batch started, dispatch the START event
+            self.notify_signal(ControlSignal.START)
+        elif line == "CLOSING BATCH":
+            # Batch closed, dispatch the STOP event
+            self.notify_signal(ControlSignal.STOP)
+        elif line.startswith("START") and line.endswith("END"):
+            # Get the values by splitting the line, removing START and END
+            string_values = line.split(" ")[1:-1]
+
+            # There should be at least one value, or exactly the expected number
+            if len(string_values) == 0 or (expected_axis is not None and len(string_values) != expected_axis):
+                self.notify_signal(ControlSignal.ERROR)
+                return
+
+            values = self.parse_values(string_values)
+
+            # Before sending the values, make sure they are error free
+            if values is not None:
+                # Dispatch the DATA event, sending the values
+                self.notify_data(values)
+            else:
+                # An error occurred, dispatch the ERROR event
+                self.notify_signal(ControlSignal.ERROR)
+        elif line == "":  # This could be a timeout
+            # Dispatch the TIMEOUT event
+            self.notify_signal(ControlSignal.TIMEOUT)
+        else:  # This must be an error
+            # Dispatch the ERROR event
+            self.notify_signal(ControlSignal.ERROR)
+
     def notify_data(self, data):
         """
         Notify a new set of data to all the attached managers
         :param data: Float array containing the sensor data, every element is an axis reading
         """
+        # Filter every frame, but notify only one every "decimation" frames
+        if self.decimation_filter is not None:
+            filtered = self.decimation_filter.process_frame(data)
+
+            self.decimation_counter += 1
+            if self.decimation_counter < self.decimation:
+                return
+
+            self.decimation_counter = 0
+            data = filtered
+
         # Cycle through all managers and call their receive_data method, notifying the data event
         for manager in self.managers:
             manager.receive_data(data)
 
     def notify_signal(self, signal):
         """
-        Notify a ControlSignal to all the attached managers
+        Notify a ControlSignal to all the attached managers.
+        The decimation restarts at the beginning and at the end of a recording, and after lost frames,
+        so that the filter transients don't leak from a recording to the next one.
         :param signal: One of the ControlSignal values
         :return: 
         """
+        if self.decimation_filter is not None and signal in (ControlSignal.START, ControlSignal.STOP,
+                                                             ControlSignal.OVERRUN):
+            self.decimation_filter.reset()
+            self.decimation_counter = 0
+
         # Cycle through all managers and notify them of the new signal by calling their receive_signal method
         for manager in self.managers:
             manager.receive_signal(signal)
@@ -78,6 +210,37 @@ class AbstractDataReader(object):
         raise NotImplementedError("This method is not implemented in the abstract class.")
 
 
+class AbstractFrameMiddleware(AbstractDataReader):
+    """
+    Processes the raw frames of a DataReader, before they are grouped into samples.
+    Attach it to a DataReader as a manager, and attach the SampleManagers to it.
+    The signals are forwarded unchanged.
+    """
+
+    def process_data(self, data):
+        """
+        Receive a frame, process it and then return it.
+        If None is returned, the frame will be suppressed and will not be notified to the managers.
+        """
+        # In this case, return the passed frame without processing it
+        return data
+
+    def receive_data(self, data):
+        """
+        Receive a frame, process it and then notify the result to all the attached managers
+        """
+        processed_data = self.process_data(data)
+
+        if processed_data is not None:
+            self.notify_data(processed_data)
+
+    def receive_signal(self, signal):
+        """
+        Forward the signal to all the attached managers
+        """
+        self.notify_signal(signal)
+
+
 class Sender(object):
     """
     Manages the transmission of the samples to the attached Receivers
@@ -108,9 +271,10 @@ class Sender(object):
         Notify a sample to all the receivers
         :param sample: Sample
         """
-        # Cycle through all receivers, sending them the Sample
+        # Cycle through all receivers, sending them the Sample.
+        # Each receiver gets its own read-only view, so its changes are never visible to the others
         for receiver in self.receivers:
-            receiver.receive_sample(sample)
+            receiver.receive_sample(sample.share())
 
 
 class AbstractSampleManager(Sender):
@@ -119,14 +283,20 @@ class AbstractSampleManager(Sender):
     The logic involved vary based on the implementation.
     """
 
-    def __init__(self):
+    def __init__(self, device_id=None):
         """
         Initializes the buffer
+
+        :param device_id: id of the device whose frames are received, assigned to the packaged samples
         """
         # Initialize the sender
         Sender.__init__(self)
 
         self.buffer = []
+        self.device_id = device_id
+
+        # Indexes of the axis of the received frames, None if they contain all the axis. Set by the DataReader
+        self.axes = None
 
     def receive_data(self, data):
         raise NotImplementedError("This method is not implemented in the abstract class.")
@@ -181,22 +351,26 @@ class AbstractGesturePredictor(Receiver):
         """
         self.callbacks.remove(manager)
 
-    def notify_callbacks(self, gesture_id):
+    def notify_callbacks(self, gesture_id, confidence=None):
         """
-        Notify the gesture_id to all the attached CallbackManagers
+        Notify the gesture_id to all the attached CallbackManagers.
+        The confidence of the prediction, if available, is passed along with the gesture_id.
         """
         # Cycle through all the CallbackManagers and notify the gesture
         for callback in self.callbacks:
-            callback.receive_gesture(gesture_id)
+            if confidence is None:
+                callback.receive_gesture(gesture_id)
+            else:
+                callback.receive_gesture(gesture_id, confidence)
 
     def receive_sample(self, sample):
         """
         Receive the sample, try to predict the correct gesture and notify all the callbacks
         """
         # Predict the gesture
-        predicted_gesture = self.predict(sample)
+        predicted_gesture, confidence = self.predict_with_confidence(sample)
         # Notify all the callbacks
-        self.notify_callbacks(predicted_gesture)
+        self.notify_callbacks(predicted_gesture, confidence)
 
     def predict(self, sample):
         """
@@ -205,6 +379,13 @@ class AbstractGesturePredictor(Receiver):
         """
         raise NotImplementedError("This method is not implemented in the abstract class.")
 
+    def predict_with_confidence(self, sample):
+        """
+        Predict the gesture of the sample and return a tuple ( gesture_id, confidence ).
+        By default the confidence is not available and None is returned.
+        """
+        return self.predict(sample), None
+
 
 class AbstractMiddleware(Sender, Receiver):
     """
@@ -234,6 +415,68 @@ class AbstractMiddleware(Sender, Receiver):
             self.notify_receivers(processed_sample)
 
 
+class AbstractTrainableMiddleware(AbstractMiddleware):
+    """
+    Middleware whose transformation is learned from the dataset, such as a dimensionality reduction.
+    It works on linearized samples: each processed sample is replaced by a sample with a single frame.
+    When used as a trainable middleware of a classifier, it is fitted while loading the dataset
+    and saved in the model together with the classifier.
+    """
+
+    def __init__(self):
+        AbstractMiddleware.__init__(self)
+
+        # Becomes true after the middleware has been fitted
+        self.is_fitted = False
+
+    def fit(self, samples):
+        """
+        Learn the transformation from a list of samples with the same number of frames and axis
+        """
+        x = np.array([sample.get_linearized(one_dimensional=True) for sample in samples])
+        y = [sample.gesture_id for sample in samples]
+
+        self.fit_linearized(x, y)
+
+        self.is_fitted = True
+
+    def fit_linearized(self, x, y):
+        """
+        Learn the transformation from a batch of linearized samples and their gesture ids
+
+        :param x: 2-dimensional array, each row is a linearized sample
+        :param y: list containing the gesture_id of each row
+        """
+        raise NotImplementedError("This method is not implemented in the abstract class.")
+
+    def transform_linearized(self, x):
+        """
+        Transform a batch of linearized samples
+
+        :param x: 2-dimensional array, each row is a linearized sample
+        :return: 2-dimensional array, each row is a transformed sample
+        """
+        raise NotImplementedError("This method is not implemented in the abstract class.")
+
+    def transform_sample(self, sample):
+        """
+        Return the transformation of the sample, without changing the state of the middleware
+        """
+        # The transformation must be learned before processing a sample, if not, raise an exception
+        if not self.is_fitted:
+            raise ValueError("The middleware must be fitted before processing a sample")
+
+        # The transformed sample is not made of axis anymore
+        return Sample(data=self.transform_linearized(sample.get_linearized()), gesture_id=sample.gesture_id,
+                      device_id=sample.device_id, copy=False)
+
+    def process_sample(self, sample):
+        """
+        Replace the sample with its transformation
+        """
+        return self.transform_sample(sample)
+
+
 class AbstractClassifier(object):
     """
     Represents an entity that takes a directory containing a set of samples
@@ -241,7 +484,7 @@ class AbstractClassifier(object):
     belongs to.
     """
     def __init__(self, dataset_path=None, model_path=None, verbose=False, autonormalize=False, autoscale_size=None,
-                       middlewares=[]):
+                       middlewares=[], trainable_middlewares=[], axes=None):
         """
         :param dataset_path: path to the directory containing the samples dataset.
         :param model_path: path to a saved model file.
@@ -251,6 +494,11 @@ class AbstractClassifier(object):
                                to scale them to the number specified by this parameter.
         :param middlewares: a list of Middlewares that will be applied to each loaded sample before
                             loading the data. They are applied before the auto-normalization.
+        :param trainable_middlewares: a list of AbstractTrainableMiddlewares, fitted while loading the dataset
+                                      and saved with the model. They are applied after the auto-scaling.
+        :param axes: list of the indexes of the axis used by the classifier, if None all the axis are used.
+                     The samples with more axis, such as the ones of the dataset, are projected on them.
+                     Use configure_for_classifier to make a DataReader read only these axis.
         """
         # Dataset_path and model_path must be mutually exclusive and can't be both defined.
         # That's because dataset_path is used in the training phase, while
@@ -270,6 +518,8 @@ class AbstractClassifier(object):
         self.autonormalize = autonormalize
         self.autoscale_size = autoscale_size
         self.middlewares = middlewares
+        self.trainable_middlewares = trainable_middlewares
+        self.axes = axes
 
         # This is initially false and becomes true only when a valid model is ready
         # That could happen when a model is trained or loaded
@@ -378,28 +628,86 @@ class AbstractClassifier(object):
             raise ValueError("samples_filenames must be loaded before calling this method. "
                              "That can be done using load_samples_filenames()")
 
+        # The trainable middlewares must be fitted with the whole dataset before loading it
+        if len(self.trainable_middlewares) > 0:
+            samples = self.fit_trainable_middlewares(self.iter_samples(self.samples_filenames, trainable=False))
+        else:
+            samples = self.iter_samples(self.samples_filenames)
+
+        # Cycle through all the processed samples
+        for sample in samples:
+            # Call the implementation-specific load_sample_data method
+            self.load_sample_data(sample)
+
+    def fit_trainable_middlewares(self, samples):
+        """
+        Fit each trainable middleware with the samples transformed by the previous ones.
+        The middlewares already fitted, for example shared with another model, are not fitted again.
+
+        :param samples: iterable of processed samples
+        :return: the list of samples transformed by all the trainable middlewares
+        """
+        samples = list(samples)
+
+        for middleware in self.trainable_middlewares:
+            if not middleware.is_fitted:
+                middleware.fit(samples)
+            samples = [middleware.transform_sample(sample) for sample in samples]
+
+        return samples
+
+    def iter_samples(self, filenames, trainable=True):
+        """
+        Generator that loads and processes the samples of the dataset one at a time,
+        so that only one of them is kept in memory.
+
+        :param filenames: list of samples' filenames contained in the dataset_path
+        :param trainable: if False, the trainable middlewares are not applied
+        """
         # Cycle through all file names
-        for f in self.samples_filenames:
+        for f in filenames:
             # Generate the complete sample path
             complete_path = os.path.join(self.dataset_path, f)
 
             # Load the sample
             sample = Sample.load_from_file(complete_path)
 
-            # Apply all the middlewares
-            for middleware in self.middlewares:
-                sample = middleware.process_sample(sample)
+            # Apply the middlewares, the normalization and the scaling
+            yield self.preprocess_sample(sample, trainable=trainable)
 
-            # If autonormalize is set, normalize the sample's frames
-            if self.autonormalize:
-                sample.normalize_frames()
+    def preprocess_sample(self, sample, trainable=True):
+        """
+        Apply the axis projection, the middlewares, the auto-normalization, the auto-scaling and
+        the trainable middlewares to the given sample, in the same order used both when loading
+        the dataset and when predicting.
 
-            # If autoscale_size is set, scale the number of frames to the specified value
-            if self.autoscale_size is not None:
-                sample.scale_frames(n_frames=self.autoscale_size)
+        :param sample: the Sample to process
+        :param trainable: if False, the trainable middlewares are not applied
+        :return: the processed Sample
+        """
+        # Keep only the axis used by the classifier, in the classifier order
+        if self.axes is not None:
+            sample.data = sample.data[:, get_axes_columns(self.axes, sample.axes)]
+            sample.axes = self.axes
 
-            # Call the implementation-specific load_sample_data method
-            self.load_sample_data(sample)
+        # Apply all the middlewares
+        for middleware in self.middlewares:
+            sample = middleware.process_sample(sample)
+
+        # If autonormalize is set, normalize the sample's frames
+        if self.autonormalize:
+            sample.normalize_frames()
+
+        # If autoscale_size is set, scale the number of frames to the specified value
+        if self.autoscale_size is not None:
+            sample.scale_frames(n_frames=self.autoscale_size)
+
+        # Apply the fitted trainable middlewares
+        if trainable:
+            for middleware in self.trainable_middlewares:
+                sample = middleware.process_sample(sample)
+
+        return sample
 
     def predict(self, sample):
         """
@@ -414,20 +722,78 @@ class AbstractClassifier(object):
         if not self.is_trained:
             raise ValueError("The model must be trained before making a prediction")
 
-        # Apply all the middlewares
-        for middleware in self.middlewares:
-            sample = middleware.process_sample(sample)
+        # Apply the middlewares, the normalization and the scaling to a view of the sample,
+        # so that the sample of the caller is not modified
+        sample = self.preprocess_sample(sample.share())
 
-        # If autonormalize is set, normalize the sample's frames
-        if self.autonormalize:
-            sample.normalize_frames()
+        # Pass the sample to the inner prediction function
+        return self.predict_sample(sample)
 
-        # If autoscale_size is set, scale the number of frames to the specified value
-        if self.autoscale_size is not None:
-            sample.scale_frames(n_frames=self.autoscale_size)
+    def predict_with_confidence(self, sample):
+        """
+        Return a tuple ( gesture_id, confidence ), where the confidence is the probability
+        of the predicted gesture, or None if the classifier can't estimate the probabilities.
+        The sample is processed and classified only once: when the probabilities are available,
+        the predicted gesture is the most probable one, otherwise predict_sample is used.
+
+        :param sample: sample used to predict the gesture
+        """
+        # The model must be trained before making a prediction, if not, raise an exception
+        if not self.is_trained:
+            raise ValueError("The model must be trained before making a prediction")
+
+        # Apply the middlewares, the normalization and the scaling to a view of the sample,
+        # so that the sample of the caller is not modified
+        return self.predict_sample_with_confidence(self.preprocess_sample(sample.share()))
+
+    def predict_sample_with_confidence(self, sample):
+        """
+        Return a tuple ( gesture_id, confidence ) for an already processed sample, see predict_with_confidence
+        """
+        try:
+            probabilities = self.predict_sample_proba(sample)
+        except NotImplementedError:
+            return self.predict_sample(sample), None
+
+        internal_id = int(np.argmax(probabilities))
+
+        return self.gestures[internal_id], float(probabilities[internal_id])
+
+    def predict_proba(self, sample):
+        """
+        Return the probability of each gesture for the given sample.
+        IMPORTANT: to customize the algorithm, you must override the
+        "predict_sample_proba" method, not this one.
+
+        :param sample: sample used to predict the gesture
+        :return: an array containing a probability for each gesture, in the same order of self.gestures
+        """
+        # The model must be trained before making a prediction, if not, raise an exception
+        if not self.is_trained:
+            raise ValueError("The model must be trained before making a prediction")
+
+        # Apply the middlewares, the normalization and the scaling to a view of the sample,
+        # so that the sample of the caller is not modified
+        sample = self.preprocess_sample(sample.share())
 
         # Pass the sample to the inner prediction function
-        return self.predict_sample(sample)
+        return self.predict_sample_proba(sample)
+
+    def predict_sample_proba(self, sample):
+        """
+        Return the probability of each gesture for an already processed sample.
+        By default, the linearized sample is passed to predict_linearized_proba.
+        """
+        return self.predict_linearized_proba(sample.get_linearized())[0]
+
+    def predict_linearized_proba(self, x):
+        """
+        Return the probabilities of each gesture for a batch of processed and linearized samples.
+
+        :param x: 2-dimensional array, each row is a linearized sample
+        :return: 2-dimensional array, each row contains a probability for each gesture
+        """
+        raise NotImplementedError("This method is not implemented in the abstract class.")
 
     def load_sample_data(self, sample):
         """
@@ -451,7 +817,8 @@ class AbstractClassifier(object):
         """
         return {'verbose': self.verbose, 'autonormalize': self.autonormalize,
                 'autoscale_size': self.autoscale_size, 'gestures': self.gestures,
-                'middlewares': self.middlewares}
+                'middlewares': self.middlewares, 'trainable_middlewares': self.trainable_middlewares,
+                'axes': self.axes}
 
     def load_attributes(self, attributes):
         """
@@ -464,6 +831,9 @@ class AbstractClassifier(object):
         self.autoscale_size = attributes['autoscale_size']
         self.gestures = attributes['gestures']
         self.middlewares = attributes['middlewares']
+        # Models saved before the trainable middlewares were introduced don't have them
+        self.trainable_middlewares = attributes.get('trainable_middlewares', [])
+        self.axes = attributes.get('axes')
 
     def predict_sample(self, sample):
         raise NotImplementedError("This method is not implemented in the abstract class.")
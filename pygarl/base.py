@@ -1,4 +1,8 @@
 import json
+import time
+import threading
+import traceback
+from collections import deque
 import scipy as sp
 import numpy as np
 import matplotlib.pyplot as plt
@@ -6,15 +10,33 @@ from scipy.interpolate import interp2d, interp1d
 from sklearn.preprocessing import scale
 import pandas as pd
 
+# This import is needed for backward compatibility
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
 
 class Sample(object):
     """
     Contains the data recorded from the sensors.
     Provides methods to analyze, manage and persist Samples.
+
+    The arrays derived from the data, such as the gradient, are computed once and cached until
+    the data is replaced, as all the methods that modify the sample do. The cached arrays are
+    read-only, and the data must not be modified in place.
+
+    Samples are copy-on-write: share returns a Sample that uses a read-only view of the same data and
+    the same cache without copying them, and a shared Sample gets its own data the first time it is modified.
     """
 
-    def __init__(self, data, gesture_id=None):
-        self.data = sp.array(data)  # Convert the data to a Numpy array
+    def __init__(self, data, gesture_id=None, device_id=None, axes=None, copy=True):
+        """
+        :param copy: if False and data is already an array, it's used without copying it,
+                     as the caller hands over its ownership
+        """
+        # Convert the data to a Numpy array
+        self.data = sp.array(data) if copy else np.asarray(data)
 
         # Check that data is a 2-dimensional array
         if self.data.ndim != 2:
@@ -23,6 +45,80 @@ class Sample(object):
 
         self.gesture_id = gesture_id
 
+        # Id of the device that recorded the sample, set by the sample manager of the device
+        self.device_id = device_id
+
+        # Indexes of the axis of the device contained in the data, None if the data contains all of them.
+        # Set by the sample managers attached to a DataReader that reads only some axis.
+        self.axes = axes
+
+        # Name of the file the sample has been saved to, set by the FileGestureRecorder
+        self.filename = None
+
+        # Index in the stream of the frame following the last one of the sample,
+        # set by the StreamSampleManager
+        self.end_frame = None
+
+    @property
+    def data(self):
+        """
+        2-dimensional array ( frames x axis ) containing the sample data
+        """
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        # The derived arrays of the old data are not valid anymore
+        self._data = value
+        self._cache = {}
+
+    def share(self):
+        """
+        Return a Sample with the same data, the same cached arrays and the same attributes, without
+        copying them. The returned Sample gets a read-only view of the data, while this Sample keeps
+        its own array unchanged: the methods that modify a sample replace its data, so the changes made
+        to the returned Sample are never visible from this one.
+        Use make_writable before modifying the data of the returned Sample in place.
+        """
+        view = self._data.view()
+        view.setflags(write=False)
+
+        # Copy the attributes without calling the constructor, that would copy the data
+        shared = object.__new__(type(self))
+        shared.__dict__.update(self.__dict__)
+        shared._data = view
+
+        return shared
+
+    def make_writable(self):
+        """
+        Make the data writable, copying it if it is read-only, so that it can be modified in place.
+        The cached arrays are discarded, as they could become invalid.
+        """
+        if not self._data.flags.writeable:
+            self.data = np.array(self._data)
+        else:
+            self._cache = {}
+
+    def get_derived(self, name, compute):
+        """
+        Return the array derived from the data with the given name, computing it only the first time.
+
+        :param name: name of the derived array in the cache
+        :param compute: function that computes the array, or a tuple of arrays, from the data
+        :return: the read-only cached array
+        """
+        if name not in self._cache:
+            value = compute()
+
+            # The cached arrays are shared by all the callers, so they can't be modified
+            for array in (value if isinstance(value, tuple) else (value,)):
+                array.setflags(write=False)
+
+            self._cache[name] = value
+
+        return self._cache[name]
+
     def save_to_file(self, file_path):
         """
         Save the sample to a file using the JSON format.
@@ -119,6 +215,37 @@ class Sample(object):
             # Calculate the new interpolated data and reshape it.
             self.data = f(x_new).reshape(-1, 1)
 
+    @staticmethod
+    def get_scale_matrix(input_frames, n_frames=50, n_axis=2):
+        """
+        Return the matrix M that scales the frames of a sample data as scale_frames does,
+        so that the scaled data is M.dot(data). Useful to scale many samples with the same
+        number of frames using a single matrix multiplication.
+
+        :param input_frames: number of frames of the original data, at least 2.
+        :param n_frames: final number of frames.
+        :param n_axis: number of axis. As in scale_frames, samples with a single axis
+                       are scaled with a zero-order hold instead of a linear interpolation.
+        """
+        # Positions of the new frames in the original data
+        x_new = np.linspace(0, input_frames - 1, n_frames)
+
+        matrix = np.zeros((n_frames, input_frames))
+        rows = np.arange(n_frames)
+
+        if n_axis > 1:
+            # Linear interpolation between the two nearest frames
+            left = np.minimum(np.floor(x_new).astype(int), input_frames - 2)
+            weight = x_new - left
+            matrix[rows, left] = 1 - weight
+            matrix[rows, left + 1] = weight
+        else:
+            # Zero-order hold, the previous frame is repeated
+            index = np.searchsorted(np.arange(input_frames), x_new, side="right") - 1
+            matrix[rows, np.clip(index, 0, input_frames - 1)] = 1
+
+        return matrix
+
     def framelen(self):
         """
         :return: the number of frames of the sample 
@@ -138,7 +265,7 @@ class Sample(object):
         :param window: rolling mean window
         :return: 
         """
-        self.data = pd.rolling_mean(self.data, window, min_periods=1)
+        self.data = pd.DataFrame(self.data).rolling(window, min_periods=1).mean().values
 
     def normalize_frames(self):
         """
@@ -178,7 +305,13 @@ class Sample(object):
 
     def gradient(self):
         """
-        Return a numpy array containing the gradient of the sample data
+        Return a read-only numpy array containing the gradient of the sample data
+        """
+        return self.get_derived("gradient", self.compute_gradient)
+
+    def compute_gradient(self):
+        """
+        Calculate the gradient of the sample data
         """
         # Check the number of axis
         if self.data.shape[1] > 1:  # More than 1 axis
@@ -191,27 +324,37 @@ class Sample(object):
             # Calculate the gradient and reshape the result
             return sp.gradient(reshaped).reshape(-1, 1)
 
+    def fft_magnitude(self):
+        """
+        Return a read-only array containing the magnitude of the real FFT of each axis
+        """
+        return self.get_derived("fft_magnitude", lambda: np.abs(np.fft.rfft(self.data, axis=0)))
+
+    def axis_stats(self):
+        """
+        Return a tuple of read-only arrays ( mean, std, min, max ), containing the statistics of each axis
+        """
+        return self.get_derived("axis_stats", lambda: (self.data.mean(axis=0), self.data.std(axis=0),
+                                                       self.data.min(axis=0), self.data.max(axis=0)))
+
     def fft(self, append=True):
         """
         Calculates the FFT of the sample data and replace the original data with it.
         """
-        # Calculate the real FFT transform
-        fourier = np.fft.rfft(self.data, axis=0)
+        # Get the absolute value of the real FFT transform
+        absolute = self.fft_magnitude()
 
-        if fourier.shape[0] > 10:
+        if absolute.shape[0] > 10:
             # Delete the first term, it's usually too big and covers the other terms
-            fourier = fourier[10:]
-
-        # Calculate the absolute value ( complex number argument )
-        absolute = sp.absolute(fourier)
+            absolute = absolute[10:]
 
         # If append=True, append the fourier transform to the data, if not replace the data
         if append:
             # Append the fft
             self.data = np.append(self.data, absolute, axis=0)
         else:
-            # Replace the data
-            self.data = absolute
+            # Replace the data with a copy, the cached array is read-only
+            self.data = np.array(absolute)
 
     def plot(self, block=True):
         """
@@ -282,9 +425,10 @@ class CallbackManager(object):
             # If not set, call the default callback
             self.default_callback(gesture_id)
 
-    def receive_gesture(self, gesture_id):
+    def receive_gesture(self, gesture_id, confidence=None):
         """
-        Called by a predictor when a new gesture is available
+        Called by a predictor when a new gesture is available.
+        The confidence of the prediction, if any, is not used by the CallbackManager.
         """
         # If verbose is set, print a notification when a gesture arrives
         if self.verbose:
@@ -295,3 +439,342 @@ class CallbackManager(object):
 
     def default_callback(self, gesture_id):
         pass
+
+
+class OverflowPolicy:
+    """
+    What an AsyncCallbackManager does when the backlog of a worker is full
+    """
+    DROP_NEWEST = "drop_newest"  # The new gesture is discarded
+    DROP_OLDEST = "drop_oldest"  # The oldest waiting gesture is discarded
+    BLOCK = "block"  # The caller waits until there is space in the backlog
+
+
+class AsyncCallbackManager(CallbackManager):
+    """
+    CallbackManager that calls the callbacks in a pool of worker threads, so that the thread
+    that reads the data and makes the predictions never waits for the user code.
+    Each gesture_id is always dispatched by the same worker, so the callbacks of the same
+    gesture are called in the order the gestures were received.
+    """
+
+    def __init__(self, workers=2, max_backlog=100, overflow_policy=OverflowPolicy.DROP_OLDEST,
+                 callback_timeout=None, verbose=False):
+        """
+        :param workers: number of worker threads.
+        :param max_backlog: maximum number of gestures waiting to be dispatched by each worker.
+        :param overflow_policy: one of the OverflowPolicy values, used when a backlog is full.
+        :param callback_timeout: if set, callbacks that run for more than these seconds are
+                                 counted as slow in the metrics ( and printed if verbose ).
+        :param verbose: if true, print the received gestures and the slow callbacks.
+        """
+        CallbackManager.__init__(self, verbose=verbose)
+
+        self.max_backlog = max_backlog
+        self.overflow_policy = overflow_policy
+        self.callback_timeout = callback_timeout
+
+        # Lock that protects the metrics
+        self.lock = threading.Lock()
+        self.reset_metrics()
+
+        # Create a queue for each worker
+        self.queues = [queue.Queue(maxsize=max_backlog) for i in range(workers)]
+
+        # Time when each worker started the current callback, None if idle
+        self.running_since = [None] * workers
+
+        # Start the workers, each one with the queue it reads
+        self.workers = []
+        for index in range(workers):
+            worker = threading.Thread(target=self.worker_loop, args=(index, self.queues[index]))
+            worker.daemon = True
+            worker.start()
+            self.workers.append((worker, self.queues[index]))
+
+    def reset_metrics(self):
+        """
+        Reset the dispatch metrics
+        """
+        with self.lock:
+            self.dispatched = 0
+            self.dropped = 0
+            self.errors = 0
+            self.slow_callbacks = 0
+            self.total_latency = 0.0
+            self.max_latency = 0.0
+            self.total_duration = 0.0
+            self.max_duration = 0.0
+
+    def get_metrics(self):
+        """
+        Return a dictionary containing the dispatch metrics.
+        The latency is the time, in seconds, between the reception of a gesture and the call
+        of its callback, the duration is the time spent in the callback.
+        """
+        now = time.time()
+
+        with self.lock:
+            dispatched = max(self.dispatched, 1)
+
+            return {'dispatched': self.dispatched, 'dropped': self.dropped, 'errors': self.errors,
+                    'slow_callbacks': self.slow_callbacks,
+                    'average_latency': self.total_latency / dispatched, 'max_latency': self.max_latency,
+                    'average_duration': self.total_duration / dispatched, 'max_duration': self.max_duration,
+                    'backlog': sum(q.qsize() for q in self.queues),
+                    'running_too_long': sum(1 for start in self.running_since
+                                            if start is not None and self.callback_timeout is not None
+                                            and now - start > self.callback_timeout)}
+
+    def get_queue(self, gesture_id):
+        """
+        Return the queue of the worker that dispatches the given gesture_id
+        """
+        return self.queues[hash(gesture_id) % len(self.queues)]
+
+    def receive_gesture(self, gesture_id, confidence=None):
+        """
+        Called by a predictor when a new gesture is available.
+        The gesture is added to the backlog of a worker and the method returns immediately,
+        unless the backlog is full and the overflow policy is BLOCK.
+        """
+        # If verbose is set, print a notification when a gesture arrives
+        if self.verbose:
+            print("Received gesture: " + gesture_id)
+
+        item = (gesture_id, time.time())
+        target_queue = self.get_queue(gesture_id)
+
+        if self.overflow_policy == OverflowPolicy.BLOCK:
+            target_queue.put(item)
+            return
+
+        while True:
+            try:
+                target_queue.put_nowait(item)
+                return
+            except queue.Full:
+                with self.lock:
+                    self.dropped += 1
+
+                # The new gesture is discarded
+                if self.overflow_policy == OverflowPolicy.DROP_NEWEST:
+                    return
+
+                # Discard the oldest gesture to make space for the new one
+                try:
+                    target_queue.get_nowait()
+                    target_queue.task_done()
+                except queue.Empty:
+                    pass
+
+    def worker_loop(self, index, worker_queue):
+        """
+        Endless loop executed by each worker, dispatches the gestures in its queue
+        """
+        while True:
+            item = worker_queue.get()
+
+            # None is used to stop the worker
+            if item is None:
+                worker_queue.task_done()
+                break
+
+            gesture_id, received_time = item
+
+            start = time.time()
+            self.running_since[index] = start
+
+            # An error in a callback must not stop the worker
+            failed = False
+            try:
+                self.notify_gesture(gesture_id)
+            except Exception:
+                failed = True
+                if self.verbose:
+                    traceback.print_exc()
+
+            end = time.time()
+            self.running_since[index] = None
+
+            latency = start - received_time
+            duration = end - start
+            is_slow = self.callback_timeout is not None and duration > self.callback_timeout
+
+            with self.lock:
+                self.dispatched += 1
+                self.errors += int(failed)
+                self.slow_callbacks += int(is_slow)
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+                self.total_duration += duration
+                self.max_duration = max(self.max_duration, duration)
+
+            if is_slow and self.verbose:
+                print("Slow callback for gesture {gesture}: {duration:.3f}s".format(gesture=gesture_id,
+                                                                                    duration=duration))
+
+            worker_queue.task_done()
+
+    def wait(self):
+        """
+        Wait until all the received gestures have been dispatched
+        """
+        for worker_queue in self.queues:
+            worker_queue.join()
+
+    def stop(self):
+        """
+        Dispatch the waiting gestures and stop the workers
+        """
+        # Send the stop marker through the queue each worker actually reads
+        for worker, worker_queue in self.workers:
+            worker_queue.put(None)
+
+        for worker, worker_queue in self.workers:
+            worker.join()
+
+
+class GestureSmoother(object):
+    """
+    Stage between a predictor and its CallbackManagers that removes the duplicate and
+    flickering predictions produced by overlapping windows or split gestures.
+    Attach it to a predictor as a CallbackManager, and attach the real CallbackManagers to it.
+
+    A gesture is forwarded when it reaches the majority of the last vote_size predictions,
+    if at least min_interval seconds have passed since the same gesture was forwarded.
+    When the predictions carry a confidence, a new gesture must have a confidence of at least
+    enter_threshold to be counted, while the gesture currently held by the majority stays
+    counted down to exit_threshold.
+    With a vote_size of 1, every accepted prediction is forwarded.
+    Each prediction is processed in constant time.
+    """
+    def __init__(self, vote_size=1, min_interval=0.0, enter_threshold=None, exit_threshold=None,
+                 clock=time.time):
+        """
+        :param vote_size: number of recent predictions used for the majority vote.
+        :param min_interval: minimum number of seconds between two notifications of the same gesture.
+                             It can be a dictionary that associates an interval to each gesture_id.
+        :param enter_threshold: minimum confidence of a prediction of a gesture not currently held.
+        :param exit_threshold: minimum confidence of a prediction of the gesture currently held.
+                               If None, it is equal to enter_threshold.
+        :param clock: function that returns the current time in seconds.
+        """
+        if exit_threshold is not None and enter_threshold is not None and exit_threshold > enter_threshold:
+            raise ValueError("The exit threshold must be lower or equal to the enter threshold.")
+
+        self.vote_size = vote_size
+        self.min_interval = min_interval
+        self.enter_threshold = enter_threshold
+        self.exit_threshold = exit_threshold if exit_threshold is not None else enter_threshold
+        self.clock = clock
+
+        # Number of votes needed to reach the majority
+        self.majority = vote_size // 2 + 1
+
+        self.callbacks = []
+
+        # Statistics
+        self.received = 0
+        self.forwarded = 0
+
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the received predictions
+        """
+        # Last predictions and the number of votes of each gesture. A rejected prediction is None
+        self.votes = deque()
+        self.counts = {}
+
+        # Gesture that currently holds the majority
+        self.held_gesture = None
+
+        # Time of the last notification of each gesture
+        self.last_notified = {}
+
+    def attach_callback_manager(self, manager):
+        """
+        Attach a CallbackManager that receives the smoothed gestures
+        """
+        self.callbacks.append(manager)
+
+    def detach_callback_manager(self, manager):
+        """
+        Detach the CallbackManager from the GestureSmoother
+        """
+        self.callbacks.remove(manager)
+
+    def get_min_interval(self, gesture_id):
+        """
+        Return the minimum interval associated with the given gesture_id
+        """
+        if isinstance(self.min_interval, dict):
+            return self.min_interval.get(gesture_id, 0.0)
+
+        return self.min_interval
+
+    def accept_confidence(self, gesture_id, confidence):
+        """
+        Return True if a prediction with the given confidence can vote for the gesture
+        """
+        if confidence is None or self.enter_threshold is None:
+            return True
+
+        if gesture_id == self.held_gesture:
+            return confidence >= self.exit_threshold
+
+        return confidence >= self.enter_threshold
+
+    def add_vote(self, gesture_id):
+        """
+        Add a vote for the gesture, removing the oldest one if the votes are more than vote_size.
+        Return the number of votes of the gesture.
+        """
+        if len(self.votes) == self.vote_size:
+            oldest = self.votes.popleft()
+            self.counts[oldest] -= 1
+
+        self.votes.append(gesture_id)
+        self.counts[gesture_id] = self.counts.get(gesture_id, 0) + 1
+
+        # The held gesture lost the majority
+        if self.held_gesture is not None and self.counts[self.held_gesture] < self.majority:
+            self.held_gesture = None
+
+        return self.counts[gesture_id]
+
+    def receive_gesture(self, gesture_id, confidence=None):
+        """
+        Called by a predictor when a new gesture is available
+        """
+        self.received += 1
+
+        if gesture_id is not None and not self.accept_confidence(gesture_id, confidence):
+            gesture_id = None
+
+        count = self.add_vote(gesture_id)
+
+        if gesture_id is None or count < self.majority:
+            return
+
+        # With more than one vote, the gesture is notified only when it reaches the majority
+        if self.vote_size > 1 and gesture_id == self.held_gesture:
+            return
+
+        self.held_gesture = gesture_id
+
+        now = self.clock()
+        last_notified = self.last_notified.get(gesture_id)
+        if last_notified is not None and now - last_notified < self.get_min_interval(gesture_id):
+            return
+
+        self.last_notified[gesture_id] = now
+        self.forwarded += 1
+
+        for callback in self.callbacks:
+            if confidence is None:
+                callback.receive_gesture(gesture_id)
+            else:
+                callback.receive_gesture(gesture_id, confidence)
@@ -1,13 +1,52 @@
+from __future__ import print_function
+import os
+import time
+import zlib
 import joblib
+import numpy as np
+from collections import deque
 from sklearn import svm
 from sklearn import neural_network
+from sklearn import linear_model
+from sklearn import kernel_approximation
 from sklearn.model_selection import GridSearchCV
 from sklearn.model_selection import train_test_split
-from pygarl.abstracts import AbstractClassifier
+from sklearn.pipeline import Pipeline
+from pygarl.abstracts import AbstractClassifier, Receiver
+from pygarl.base import Sample
+from pygarl.dtw import dtw_distance, envelope, lb_kim, lb_keogh
 from sklearn.metrics import confusion_matrix
 
 
-class SVMClassifier(AbstractClassifier):
+def softmax(scores):
+    """
+    Convert a matrix of scores to probabilities, normalizing each row with the softmax function
+    """
+    exponentials = np.exp(scores - scores.max(axis=1, keepdims=True))
+    return exponentials / exponentials.sum(axis=1, keepdims=True)
+
+
+class SklearnProbabilityMixin(object):
+    """
+    Implements predict_linearized_proba for the classifiers that keep a trained
+    scikit-learn model with predict_proba in self.clf
+    """
+    def predict_linearized_proba(self, x):
+        """
+        Return the probabilities of each gesture for a batch of linearized samples
+
+        :param x: 2-dimensional array, each row is a linearized sample
+        :return: 2-dimensional array, the columns follow the order of self.gestures
+        """
+        probabilities = np.zeros((len(x), len(self.gestures)))
+
+        # The model columns correspond to the internal ids seen during the training
+        probabilities[:, self.clf.classes_] = self.clf.predict_proba(x)
+
+        return probabilities
+
+
+class SVMClassifier(SklearnProbabilityMixin, AbstractClassifier):
     def __init__(self, params=None, n_jobs=8, test_size=0.35, *args, **kwargs):
         AbstractClassifier.__init__(self, *args, **kwargs)
 
@@ -126,7 +165,7 @@ class SVMClassifier(AbstractClassifier):
         self.clf = attributes['clf']
 
 
-class MLPClassifier(AbstractClassifier):
+class MLPClassifier(SklearnProbabilityMixin, AbstractClassifier):
     def __init__(self, params=None, n_jobs=8, test_size=0.35, *args, **kwargs):
         AbstractClassifier.__init__(self, *args, **kwargs)
 
@@ -244,3 +283,1070 @@ class MLPClassifier(AbstractClassifier):
 
         # Load specific attributes
         self.clf = attributes['clf']
+
+
+class ApproxKernelSVMClassifier(AbstractClassifier):
+    """
+    Linear SVM trained on an approximation of the RBF kernel feature map, computed with the
+    Nystroem method or with random Fourier features.
+    The training time grows almost linearly with the number of samples, and a prediction is
+    a product with fixed-size matrices, that doesn't depend on the size of the dataset.
+    The probabilities are estimated with the softmax of the SVM decision function.
+    """
+    def __init__(self, params=None, n_jobs=8, test_size=0.35, feature_map="nystroem", n_components=300,
+                 *args, **kwargs):
+        """
+        :param params: parameters grid used by the GridSearchCV, the names are prefixed with
+                       "features__" for the feature map and "svm__" for the LinearSVC.
+        :param feature_map: "nystroem" or "rff" ( random Fourier features ).
+        :param n_components: dimension of the approximated feature space.
+        """
+        AbstractClassifier.__init__(self, *args, **kwargs)
+
+        # Variables that will hold the training data
+        self.x_data = []
+        self.y_data = []
+
+        # If no parameters are passed, use the default ones
+        if params is None:
+            params = {'features__gamma': [0.001, 0.01, 0.1], 'svm__C': [0.01, 0.1, 1]}
+
+        # Set the classifier parameters
+        self.params = params
+        self.n_jobs = n_jobs
+        self.test_size = test_size
+        self.feature_map = feature_map
+        self.n_components = n_components
+
+        # Set the verbosity level based on the value of self.verbose
+        verbosity = 0
+        if self.verbose:
+            verbosity = 10
+
+        # Initialize the feature map
+        if feature_map == "nystroem":
+            features = kernel_approximation.Nystroem(kernel="rbf", n_components=n_components, random_state=0)
+        elif feature_map == "rff":
+            features = kernel_approximation.RBFSampler(n_components=n_components, random_state=0)
+        else:
+            raise ValueError("{feature_map} is not a valid feature map".format(feature_map=feature_map))
+
+        # Initialize the model
+        self.pipeline = Pipeline([('features', features), ('svm', svm.LinearSVC())])
+
+        # Initialize the GridSearchCV
+        self.clf = GridSearchCV(self.pipeline, self.params, verbose=verbosity, n_jobs=self.n_jobs)
+
+    def load_sample_data(self, sample):
+        """
+        Process and load a sample before feeding it to the training phase
+
+        :param sample: the loaded Sample
+        """
+        # Transform the data matrix of the sample in a one-dimensional array
+        linearized_sample = sample.get_linearized(one_dimensional=True)
+
+        # Get the internal id of the gesture
+        internal_id = self.get_internal_id_from_gesture_id(sample.gesture_id)
+
+        # Add the sample data to the list
+        self.x_data.append(linearized_sample)
+        self.y_data.append(internal_id)
+
+    def train_model(self):
+        """
+        Train the model using a Grid Search with cross-validation
+
+        :return: the score of the best combination of parameters
+        """
+        # The Nystroem map can't have more components than training samples
+        if self.feature_map == "nystroem":
+            n_train = int(len(self.x_data) * (1 - self.test_size))
+            self.pipeline.set_params(features__n_components=min(self.n_components, n_train))
+
+        # Split the dataset into two subset, one used for training and one for testing
+        X_train, X_test, Y_train, Y_test = train_test_split(self.x_data, self.y_data,
+                                                            test_size=self.test_size, random_state=0)
+
+        # Start the training process
+        self.clf.fit(X_train, Y_train)
+
+        # Calculates the score of the best estimator found.
+        score = self.clf.score(X_test, Y_test)
+
+        # Set the model as trained
+        self.is_trained = True
+
+        # Calculates the confusion matrix
+        Y_predicted = self.clf.predict(X_test)
+        self.confusion_matrix = confusion_matrix(Y_test, Y_predicted)
+
+        # If verbose is True, print the best model found
+        if self.verbose:
+            print(self.clf.best_estimator_)
+            # Print the confusion matrix
+            print("Confusion Matrix:")
+            print(self.confusion_matrix)
+
+        return score
+
+    def predict_sample(self, sample):
+        """
+        Return the predicted gesture_id of the specified sample
+
+        :param sample: sample used to predict the gesture
+        :return: a string containing the "gesture_id"
+        """
+        # Predict the gesture id with the trained model
+        internal_id = self.clf.predict(sample.get_linearized())
+
+        # Convert the internal_id to the gesture_id string
+        return self.gestures[internal_id[0]]
+
+    def predict_linearized_proba(self, x):
+        """
+        Return the probabilities of each gesture for a batch of linearized samples
+
+        :param x: 2-dimensional array, each row is a linearized sample
+        :return: 2-dimensional array, the columns follow the order of self.gestures
+        """
+        scores = self.clf.decision_function(x)
+
+        # With two classes, the decision function is the score of the second one
+        if scores.ndim == 1:
+            scores = np.column_stack((-scores, scores))
+
+        # The gestures never seen during the training have a null probability
+        probabilities = np.zeros((len(x), len(self.gestures)))
+        probabilities[:, self.clf.classes_] = softmax(scores)
+
+        return probabilities
+
+    def get_attributes(self):
+        """
+        Return a dictionary containing the needed attributes to save the classifier
+        """
+        # Get the saves attributes from the Parent Classifier
+        attributes = super(ApproxKernelSVMClassifier, self).get_attributes()
+
+        # Add the Specific attributes of the classifier
+        attributes.update({'clf': self.clf})
+
+        return attributes
+
+    def load_attributes(self, attributes):
+        """
+        Load the specified attributes in the classifier.
+        :param attributes: a dictionary containing the attributes
+        """
+        # Load the parent attributes
+        super(ApproxKernelSVMClassifier, self).load_attributes(attributes)
+
+        # Load specific attributes
+        self.clf = attributes['clf']
+
+
+class OnlineClassifier(AbstractClassifier, Receiver):
+    """
+    Incremental classifier, made of one binary linear model for each gesture ( one-vs-rest ),
+    trained with Stochastic Gradient Descent.
+    Once trained, the model can be updated with new samples and new gestures using partial_fit,
+    without retraining it from scratch.
+    It can also be attached as a receiver to a FileGestureRecorder, to learn the samples as they
+    are recorded.
+    """
+    # Losses of the SGD models that provide probability estimates
+    PROBABILITY_LOSSES = ("modified_huber", "log_loss", "log")
+
+    def __init__(self, loss="modified_huber", alpha=1e-4, n_epochs=5, batch_size=32, test_size=0.35,
+                 replay_size=50, checkpoint_path=None, checkpoint_every=100, *args, **kwargs):
+        """
+        :param loss: loss function of the SGD models. The default "modified_huber" also
+                     provides probability estimates.
+        :param alpha: regularization term of the SGD models.
+        :param n_epochs: number of passes over the dataset made by train_model.
+        :param batch_size: number of samples in each mini-batch used by train_model.
+        :param test_size: fraction of the dataset kept aside to calculate the score.
+        :param replay_size: number of recent samples remembered for each gesture. They are used
+                            as negative examples when a new gesture is added to a trained model.
+        :param checkpoint_path: if set, the model is periodically saved to this path while learning.
+        :param checkpoint_every: number of learned samples between two checkpoints.
+        """
+        AbstractClassifier.__init__(self, *args, **kwargs)
+
+        # Variables that will hold the training data
+        self.x_data = []
+        self.y_data = []
+
+        # Set the classifier parameters
+        self.loss = loss
+        self.alpha = alpha
+        self.n_epochs = n_epochs
+        self.batch_size = batch_size
+        self.test_size = test_size
+        self.replay_size = replay_size
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+
+        # Binary models, one for each gesture. The index represents the internal id
+        self.estimators = []
+
+        # Recent linearized samples of each gesture. The index represents the internal id
+        self.replay = []
+
+        # Number of samples learned since the last checkpoint
+        self.samples_since_checkpoint = 0
+
+        # Upper bound of the memory used by the data during the last streaming training
+        self.memory_bound = None
+
+    def create_estimator(self):
+        """
+        Return a new binary model used to recognize a single gesture
+        """
+        return linear_model.SGDClassifier(loss=self.loss, alpha=self.alpha, random_state=0)
+
+    def add_gesture(self, gesture_id):
+        """
+        Add a new gesture to the classifier, creating the corresponding binary model.
+        If the classifier already learned other gestures, the new model is initialized using
+        the remembered samples as negative examples.
+
+        :param gesture_id: the new gesture_id
+        :return: the internal id of the gesture
+        """
+        # Add the gesture_id to the list, if not already present
+        if gesture_id not in self.gestures:
+            self.gestures.append(gesture_id)
+
+        # Create the missing models, one for each gesture
+        while len(self.estimators) < len(self.gestures):
+            estimator = self.create_estimator()
+
+            # Use the remembered samples of the other gestures as negative examples
+            remembered = [x for samples in self.replay for x in samples]
+            if len(remembered) > 0:
+                estimator.partial_fit(np.array(remembered), np.zeros(len(remembered), dtype=int),
+                                      classes=[0, 1])
+
+            self.estimators.append(estimator)
+            self.replay.append(deque(maxlen=self.replay_size))
+
+        return self.get_internal_id_from_gesture_id(gesture_id)
+
+    def load_sample_data(self, sample):
+        """
+        Process and load a sample before feeding it to the training phase
+
+        :param sample: the loaded Sample
+        """
+        # Transform the data matrix of the sample in a one-dimensional array
+        linearized_sample = sample.get_linearized(one_dimensional=True)
+
+        # Get the internal id of the gesture
+        internal_id = self.get_internal_id_from_gesture_id(sample.gesture_id)
+
+        # Add the sample data to the list
+        self.x_data.append(linearized_sample)
+        self.y_data.append(internal_id)
+
+    def partial_fit_linearized(self, x, gesture_ids):
+        """
+        Update the models with a mini-batch of already processed and linearized samples.
+
+        :param x: 2-dimensional array, each row is a linearized sample
+        :param gesture_ids: list containing the gesture_id of each row
+        """
+        x = np.asarray(x, dtype=float)
+
+        # Get the internal ids, adding the gestures that were never seen before
+        y = np.array([self.add_gesture(gesture_id) for gesture_id in gesture_ids])
+
+        # Update each binary model, the samples of the other gestures are the negative examples
+        for internal_id, estimator in enumerate(self.estimators):
+            estimator.partial_fit(x, (y == internal_id).astype(int), classes=[0, 1])
+
+        # Remember the most recent samples of each gesture.
+        # Rows are copied because x could be a reused buffer
+        for row, internal_id in zip(x, y):
+            self.replay[internal_id].append(np.array(row))
+
+        # The model can now be used to make predictions
+        self.is_trained = True
+
+        # Save a checkpoint if enough samples have been learned
+        self.samples_since_checkpoint += len(y)
+        if self.checkpoint_path is not None and self.samples_since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def partial_fit(self, samples):
+        """
+        Update the model with the given samples. The samples are processed with the classifier
+        middlewares, normalization and scaling before being learned.
+        Gestures that were never seen before are added to the model.
+
+        :param samples: a list of Samples, each one must have a gesture_id
+        """
+        x = []
+        gesture_ids = []
+
+        for sample in samples:
+            # The gesture_id is needed to learn the sample
+            if sample.gesture_id is None:
+                raise ValueError("The Sample must have a gesture_id to be learned.")
+
+            # Process a view of the sample, so that the original is left untouched
+            processed = self.preprocess_sample(sample.share())
+
+            x.append(processed.get_linearized(one_dimensional=True))
+            gesture_ids.append(sample.gesture_id)
+
+        # Learn the processed samples
+        if len(x) > 0:
+            self.partial_fit_linearized(x, gesture_ids)
+
+    def receive_sample(self, sample):
+        """
+        Learn a sample received from a Sender, for example a FileGestureRecorder
+        """
+        self.partial_fit([sample])
+
+        # Mark the saved file as learned, so that update_from_dataset doesn't learn it again
+        if sample.filename is not None:
+            if self.samples_filenames is None:
+                self.samples_filenames = []
+            self.samples_filenames.append(sample.filename)
+
+    def update_from_dataset(self, dataset_path=None):
+        """
+        Learn the samples contained in the dataset directory that have not been learned yet.
+        Useful to update a model with the samples recorded after the last training.
+
+        :param dataset_path: the dataset directory. If None, the classifier dataset_path is used.
+        :return: the number of learned samples
+        """
+        if dataset_path is None:
+            dataset_path = self.dataset_path
+
+        # If the dataset is not defined, samples can't be loaded so raise an exception
+        if dataset_path is None:
+            raise ValueError("dataset_path must be defined to update the model.")
+
+        if self.samples_filenames is None:
+            self.samples_filenames = []
+
+        # Get the files that have not been learned yet, the checkpoints are not samples
+        learned = set(self.samples_filenames)
+        if self.checkpoint_path is not None:
+            learned.update(os.path.basename(f) for f in (self.checkpoint_path, self.checkpoint_path + ".tmp"))
+        new_filenames = [f for f in sorted(os.listdir(dataset_path))
+                         if os.path.isfile(os.path.join(dataset_path, f)) and f not in learned]
+
+        # Load and learn the new samples in mini-batches, so that only one batch is kept in memory
+        for start in range(0, len(new_filenames), self.batch_size):
+            batch = new_filenames[start:start + self.batch_size]
+            self.partial_fit([Sample.load_from_file(os.path.join(dataset_path, f)) for f in batch])
+
+        # Mark the files as learned
+        self.samples_filenames.extend(new_filenames)
+
+        return len(new_filenames)
+
+    def is_test_filename(self, filename):
+        """
+        Return True if the sample file belongs to the held-out subset.
+        The choice depends only on the filename, so the split is stable across epochs
+        and runs and doesn't require the dataset to be loaded in memory.
+        """
+        return zlib.crc32(filename.encode("utf-8")) % 1000 < self.test_size * 1000
+
+    def iter_chunks(self, filenames, chunk_size):
+        """
+        Generator that loads the dataset in chunks of at most chunk_size samples.
+        Each chunk is written in the same preallocated array, so the memory used
+        doesn't depend on the dataset size.
+
+        :return: tuples ( x, gesture_ids ), x is a view of the chunk array
+        """
+        chunk = None
+        gesture_ids = []
+
+        for sample in self.iter_samples(filenames):
+            linearized_sample = sample.get_linearized(one_dimensional=True)
+
+            # Allocate the chunk array when the number of features is known
+            if chunk is None:
+                chunk = np.empty((chunk_size, linearized_sample.size))
+
+            chunk[len(gesture_ids)] = linearized_sample
+            gesture_ids.append(sample.gesture_id)
+
+            # When the chunk is full, return it and start a new one
+            if len(gesture_ids) == chunk_size:
+                yield chunk, gesture_ids
+                gesture_ids = []
+
+        # Return the last partial chunk
+        if len(gesture_ids) > 0:
+            yield chunk[:len(gesture_ids)], gesture_ids
+
+    def get_memory_bound(self, chunk_size, n_features):
+        """
+        Return an upper bound, in bytes, of the memory used by the data during the streaming training:
+        the chunk array, the remembered samples and the models coefficients.
+        The bound is calculated from the sizes of the arrays, not measured. It doesn't include the
+        lists of filenames, that grow with the number of files, nor the samples used to fit the
+        trainable middlewares.
+        """
+        n_gestures = len(self.gestures)
+        item_size = np.dtype(float).itemsize
+
+        chunk_bytes = chunk_size * n_features * item_size
+        replay_bytes = n_gestures * self.replay_size * n_features * item_size
+        model_bytes = n_gestures * (n_features + 1) * item_size
+        confusion_bytes = n_gestures * n_gestures * item_size
+
+        return chunk_bytes + replay_bytes + model_bytes + confusion_bytes
+
+    def train_streaming(self, chunk_size=None, fit_size=None):
+        """
+        Train the model from scratch reading the dataset from disk one chunk at a time,
+        useful when the dataset doesn't fit in memory.
+        A held-out subset of the files is used to calculate the score, without loading it in memory.
+        The trainable middlewares not yet fitted are fitted first, on a pass over at most fit_size
+        training samples, that are kept in memory during the fitting.
+        After the training, self.memory_bound contains the upper bound, in bytes, of the memory used
+        by the data ( see get_memory_bound ).
+
+        :param chunk_size: number of samples loaded at the same time. Default is batch_size.
+        :param fit_size: maximum number of samples used to fit the trainable middlewares.
+                         If None, all the training samples are used.
+        :return: the score of the model on the held-out subset
+        """
+        if chunk_size is None:
+            chunk_size = self.batch_size
+
+        # Load only the filenames and the gestures, not the data
+        self.load_samples_filenames()
+        self.load_gestures_ids()
+
+        # Split the files in training and held-out subsets
+        train_filenames = [f for f in self.samples_filenames if not self.is_test_filename(f)]
+        test_filenames = [f for f in self.samples_filenames if self.is_test_filename(f)]
+
+        # Start from empty models
+        self.estimators = []
+        self.replay = []
+
+        random_state = np.random.RandomState(0)
+        n_features = 0
+
+        # The trainable middlewares must be fitted before the chunks can be transformed
+        if any(not middleware.is_fitted for middleware in self.trainable_middlewares):
+            fit_filenames = [train_filenames[i] for i in random_state.permutation(len(train_filenames))[:fit_size]]
+            self.fit_trainable_middlewares(self.iter_samples(fit_filenames, trainable=False))
+
+        for epoch in range(self.n_epochs):
+            # Shuffle the order of the files at each epoch
+            order = random_state.permutation(len(train_filenames))
+
+            for x, gesture_ids in self.iter_chunks([train_filenames[i] for i in order], chunk_size):
+                n_features = x.shape[1]
+                self.partial_fit_linearized(x, gesture_ids)
+
+            if self.verbose:
+                print("EPOCH", epoch + 1, "of", self.n_epochs)
+
+        # Calculate the confusion matrix on the held-out subset, one chunk at a time
+        n_gestures = len(self.gestures)
+        self.confusion_matrix = np.zeros((n_gestures, n_gestures), dtype=int)
+
+        for x, gesture_ids in self.iter_chunks(test_filenames, chunk_size):
+            y_predicted = self.predict_linearized(x)
+            for gesture_id, internal_id in zip(gesture_ids, y_predicted):
+                self.confusion_matrix[self.get_internal_id_from_gesture_id(gesture_id), internal_id] += 1
+
+        # Calculate the score
+        total = self.confusion_matrix.sum()
+        score = float(np.trace(self.confusion_matrix)) / total if total > 0 else 0.0
+
+        self.memory_bound = self.get_memory_bound(chunk_size, n_features)
+
+        # If verbose is True, print the confusion matrix and the memory bound
+        if self.verbose:
+            print("Confusion Matrix:")
+            print(self.confusion_matrix)
+            print("PEAK DATA MEMORY BOUND (bytes):", self.memory_bound)
+
+        return score
+
+    def train_model(self):
+        """
+        Train the model from scratch, making n_epochs passes over the loaded dataset
+
+        :return: the score of the model on the test subset
+        """
+        # Split the dataset into two subset, one used for training and one for testing
+        X_train, X_test, Y_train, Y_test = train_test_split(self.x_data, self.y_data,
+                                                            test_size=self.test_size, random_state=0)
+        X_train = np.array(X_train)
+        Y_train = np.array(Y_train)
+
+        # Start from empty models
+        self.estimators = []
+        self.replay = []
+
+        random_state = np.random.RandomState(0)
+
+        for epoch in range(self.n_epochs):
+            # Shuffle the training samples at each epoch
+            order = random_state.permutation(len(Y_train))
+
+            # Learn the samples in mini-batches
+            for start in range(0, len(order), self.batch_size):
+                batch = order[start:start + self.batch_size]
+                self.partial_fit_linearized(X_train[batch], [self.gestures[i] for i in Y_train[batch]])
+
+            if self.verbose:
+                print("EPOCH", epoch + 1, "of", self.n_epochs)
+
+        # Calculates the score and the confusion matrix
+        Y_predicted = self.predict_linearized(X_test)
+        score = np.mean(Y_predicted == np.array(Y_test))
+        self.confusion_matrix = confusion_matrix(Y_test, Y_predicted, labels=range(len(self.gestures)))
+
+        # If verbose is True, print the confusion matrix
+        if self.verbose:
+            print("Confusion Matrix:")
+            print(self.confusion_matrix)
+
+        return score
+
+    def predict_linearized(self, x):
+        """
+        Return the internal ids predicted for the given linearized samples
+
+        :param x: 2-dimensional array, each row is a linearized sample
+        """
+        # Calculate the confidence score of each binary model
+        scores = np.column_stack([estimator.decision_function(x) for estimator in self.estimators])
+
+        # The gesture with the highest score is the predicted one
+        return np.argmax(scores, axis=1)
+
+    def predict_linearized_proba(self, x):
+        """
+        Return the probabilities of each gesture for a batch of linearized samples.
+        The probabilities of the binary models are normalized to sum to one.
+        If the loss doesn't provide probability estimates, the softmax of the binary models
+        scores is returned instead.
+
+        :param x: 2-dimensional array, each row is a linearized sample
+        :return: 2-dimensional array, the columns follow the order of self.gestures
+        """
+        if self.loss not in self.PROBABILITY_LOSSES:
+            return softmax(np.column_stack([estimator.decision_function(x) for estimator in self.estimators]))
+
+        probabilities = np.column_stack([estimator.predict_proba(x)[:, 1] for estimator in self.estimators])
+
+        # If no binary model recognizes the sample, every gesture is equally likely
+        totals = probabilities.sum(axis=1, keepdims=True)
+        uniform = np.full_like(probabilities, 1.0 / probabilities.shape[1])
+
+        return np.where(totals > 0, probabilities / np.where(totals > 0, totals, 1), uniform)
+
+    def predict_sample(self, sample):
+        """
+        Return the predicted gesture_id of the specified sample
+
+        :param sample: sample used to predict the gesture
+        :return: a string containing the "gesture_id"
+        """
+        # Predict the internal id using the linearized sample
+        internal_id = self.predict_linearized(sample.get_linearized())[0]
+
+        # Convert the internal_id to the gesture_id string
+        return self.gestures[internal_id]
+
+    def checkpoint(self):
+        """
+        Save the current model to the checkpoint_path.
+        The model is written to a temporary file first, so that an interrupted checkpoint
+        doesn't corrupt the previous one.
+        """
+        temp_path = self.checkpoint_path + ".tmp"
+        self.save_model(temp_path)
+
+        # Atomically replace the previous checkpoint
+        os.replace(temp_path, self.checkpoint_path)
+
+        self.samples_since_checkpoint = 0
+
+    def get_attributes(self):
+        """
+        Return a dictionary containing the needed attributes to save the classifier
+        """
+        # Get the saves attributes from the Parent Classifier
+        attributes = super(OnlineClassifier, self).get_attributes()
+
+        # Add the Specific attributes of the classifier
+        attributes.update({'estimators': self.estimators, 'replay': self.replay,
+                           'samples_filenames': self.samples_filenames,
+                           'loss': self.loss, 'alpha': self.alpha})
+
+        return attributes
+
+    def load_attributes(self, attributes):
+        """
+        Load the specified attributes in the classifier.
+        :param attributes: a dictionary containing the attributes
+        """
+        # Load the parent attributes
+        super(OnlineClassifier, self).load_attributes(attributes)
+
+        # Load specific attributes
+        self.estimators = attributes['estimators']
+        self.replay = attributes['replay']
+        self.samples_filenames = attributes['samples_filenames']
+        self.loss = attributes['loss']
+        self.alpha = attributes['alpha']
+
+
+class DTWClassifier(AbstractClassifier):
+    """
+    k-Nearest Neighbours classifier that compares samples using Dynamic Time Warping,
+    constrained by a Sakoe-Chiba band. It handles gestures performed at different speeds.
+    To keep the prediction fast with many templates, the candidates are sorted and pruned
+    using the LB_Kim and LB_Keogh lower bounds ( the templates envelopes are calculated in
+    the training phase ) and the DTW computation is abandoned as soon as it can't improve
+    the current neighbours.
+    LB_Keogh requires samples of the same length, so autoscale_size should be set.
+    """
+    def __init__(self, n_neighbors=1, window=0.1, test_size=0.35, accelerated=True, *args, **kwargs):
+        """
+        :param n_neighbors: number of neighbours that vote the predicted gesture.
+        :param window: width of the Sakoe-Chiba band. If it is a float, it represents
+                       the fraction of the sample length, if it is an int the number of frames.
+        :param test_size: fraction of the dataset kept aside to calculate the score.
+        :param accelerated: if True and numba is installed, use the compiled DTW kernel.
+        """
+        AbstractClassifier.__init__(self, *args, **kwargs)
+
+        # Variables that will hold the training data
+        self.x_data = []
+        self.y_data = []
+
+        # Set the classifier parameters
+        self.n_neighbors = n_neighbors
+        self.window = window
+        self.test_size = test_size
+        self.accelerated = accelerated
+
+        # Templates data and internal ids, populated by train_model
+        self.templates = []
+        self.labels = None
+
+        # Stacked templates and their envelopes, available only if all the templates
+        # have the same length
+        self.stacked_templates = None
+        self.upper = None
+        self.lower = None
+
+        # Number of full DTW computations made by the last prediction
+        self.last_dtw_count = 0
+
+    def load_sample_data(self, sample):
+        """
+        Process and load a sample before feeding it to the training phase
+
+        :param sample: the loaded Sample
+        """
+        # Get the internal id of the gesture
+        internal_id = self.get_internal_id_from_gesture_id(sample.gesture_id)
+
+        # Add the sample data to the list, keeping the frames structure
+        self.x_data.append(np.array(sample.data, dtype=float))
+        self.y_data.append(internal_id)
+
+    def get_window(self, n_frames):
+        """
+        Return the width of the Sakoe-Chiba band, in frames, for a sample of n_frames
+        """
+        if isinstance(self.window, float):
+            return int(np.ceil(self.window * n_frames))
+
+        return int(self.window)
+
+    def set_templates(self, templates, labels):
+        """
+        Set the templates used to make predictions, precomputing their envelopes.
+
+        :param templates: list of 2-dimensional arrays
+        :param labels: list of internal ids, one for each template
+        """
+        self.templates = list(templates)
+        self.labels = np.array(labels)
+
+        # The lower bounds can be vectorized only if all the templates have the same shape
+        if len(set(template.shape for template in self.templates)) == 1:
+            self.stacked_templates = np.stack(self.templates)
+            self.upper, self.lower = envelope(self.stacked_templates,
+                                              self.get_window(self.stacked_templates.shape[1]))
+        else:
+            self.stacked_templates = None
+            self.upper = None
+            self.lower = None
+
+    def train_model(self):
+        """
+        Calculate the score on a held-out subset of the dataset, then use all the samples as templates
+
+        :return: the score on the held-out subset
+        """
+        # Split the dataset into two subset, one used for training and one for testing
+        X_train, X_test, Y_train, Y_test = train_test_split(self.x_data, self.y_data,
+                                                            test_size=self.test_size, random_state=0)
+
+        # Use the training subset as templates
+        self.set_templates(X_train, Y_train)
+        self.is_trained = True
+
+        # Calculates the score and the confusion matrix
+        Y_predicted = [self.predict_internal_id(x) for x in X_test]
+        score = np.mean(np.array(Y_predicted) == np.array(Y_test))
+        self.confusion_matrix = confusion_matrix(Y_test, Y_predicted, labels=range(len(self.gestures)))
+
+        # If verbose is True, print the confusion matrix
+        if self.verbose:
+            print("Confusion Matrix:")
+            print(self.confusion_matrix)
+
+        # All the samples become templates
+        self.set_templates(self.x_data, self.y_data)
+
+        return score
+
+    def get_neighbors(self, query):
+        """
+        Return the indexes and DTW distances of the nearest templates to the query
+
+        :param query: 2-dimensional array ( frames x axis )
+        :return: list of tuples ( distance, template index ), sorted by distance
+        """
+        query = np.asarray(query, dtype=float)
+        window = self.get_window(query.shape[0])
+
+        # Calculate the lower bound of every template in a vectorized way
+        query_envelope = None
+        if self.stacked_templates is not None:
+            lower_bounds = lb_kim(query, self.stacked_templates)
+
+            # LB_Keogh is valid only for samples with the same length
+            if self.stacked_templates.shape[1:] == query.shape:
+                lower_bounds = np.maximum(lower_bounds, lb_keogh(query, self.upper, self.lower))
+                query_envelope = envelope(query, window)
+        else:
+            lower_bounds = np.array([lb_kim(query, template[np.newaxis])[0] for template in self.templates])
+
+        neighbors = []
+        best_so_far = np.inf
+        self.last_dtw_count = 0
+
+        # Visit the candidates from the most promising one
+        for index in np.argsort(lower_bounds, kind="mergesort"):
+            # The remaining candidates have a greater lower bound, so they can't be neighbours
+            if lower_bounds[index] >= best_so_far:
+                break
+
+            template = self.templates[index]
+
+            # Reversed LB_Keogh: distance of the template from the query envelope
+            if query_envelope is not None:
+                if lb_keogh(template, query_envelope[0], query_envelope[1]) >= best_so_far:
+                    continue
+
+            distance = dtw_distance(query, template, window, best_so_far, self.accelerated)
+            self.last_dtw_count += 1
+
+            if distance < best_so_far:
+                # Keep only the n_neighbors nearest templates
+                neighbors.append((distance, index))
+                neighbors.sort()
+                neighbors = neighbors[:self.n_neighbors]
+
+                # Once there are enough neighbours, the farthest one is the threshold
+                if len(neighbors) == self.n_neighbors:
+                    best_so_far = neighbors[-1][0]
+
+        return neighbors
+
+    def predict_internal_id(self, query):
+        """
+        Return the internal id voted by the nearest templates to the query
+        """
+        neighbors = self.get_neighbors(query)
+
+        # Count the votes, ties are resolved in favour of the gesture with the nearest templates
+        votes = {}
+        for distance, index in neighbors:
+            count, total_distance = votes.get(self.labels[index], (0, 0.0))
+            votes[self.labels[index]] = (count + 1, total_distance + distance)
+
+        return max(votes, key=lambda label: (votes[label][0], -votes[label][1]))
+
+    def predict_sample_proba(self, sample):
+        """
+        Return the fraction of neighbours that voted each gesture
+
+        :param sample: processed sample
+        :return: an array containing a probability for each gesture, in the same order of self.gestures
+        """
+        probabilities = np.zeros(len(self.gestures))
+
+        neighbors = self.get_neighbors(sample.data)
+        for distance, index in neighbors:
+            probabilities[self.labels[index]] += 1.0 / len(neighbors)
+
+        return probabilities
+
+    def predict_sample(self, sample):
+        """
+        Return the predicted gesture_id of the specified sample
+
+        :param sample: sample used to predict the gesture
+        :return: a string containing the "gesture_id"
+        """
+        # Predict the internal id using the sample data
+        internal_id = self.predict_internal_id(sample.data)
+
+        # Convert the internal_id to the gesture_id string
+        return self.gestures[internal_id]
+
+    def get_attributes(self):
+        """
+        Return a dictionary containing the needed attributes to save the classifier
+        """
+        # Get the saves attributes from the Parent Classifier
+        attributes = super(DTWClassifier, self).get_attributes()
+
+        # Add the Specific attributes of the classifier
+        attributes.update({'templates': self.templates, 'labels': self.labels,
+                           'n_neighbors': self.n_neighbors, 'window': self.window})
+
+        return attributes
+
+    def load_attributes(self, attributes):
+        """
+        Load the specified attributes in the classifier.
+        :param attributes: a dictionary containing the attributes
+        """
+        # Load the parent attributes
+        super(DTWClassifier, self).load_attributes(attributes)
+
+        # Load specific attributes
+        self.n_neighbors = attributes['n_neighbors']
+        self.window = attributes['window']
+
+        # Set the templates, calculating the envelopes
+        self.set_templates(attributes['templates'], attributes['labels'])
+
+
+class DistilledClassifier(AbstractClassifier):
+    """
+    Compact model trained to mimic the probabilities of a bigger trained classifier ( the teacher ),
+    for example an SVMClassifier with many support vectors, at a fraction of the prediction cost.
+    The student is a small neural network ( "mlp" ) or a linear model on random Fourier features ( "rff" ),
+    trained on the teacher log-probabilities of the dataset samples and of jittered copies of them.
+    The teacher preprocessing and gestures are used, so the two models receive the same linearized samples.
+    Once trained, the model is saved and loaded as any other classifier, without the teacher.
+    """
+    def __init__(self, teacher=None, student="mlp", n_augmented=5, noise=0.05, hidden_layer_sizes=(20,),
+                 n_components=300, gamma=None, test_size=0.35, random_state=0, *args, **kwargs):
+        """
+        :param teacher: trained classifier that implements predict_linearized_proba, needed for the training.
+        :param student: type of the compact model, "mlp" or "rff".
+        :param n_augmented: number of jittered copies of each training sample.
+        :param noise: standard deviation of the jitter, relative to the standard deviation of each feature.
+        :param hidden_layer_sizes: hidden layers of the "mlp" student.
+        :param n_components: number of random Fourier features of the "rff" student.
+        :param gamma: RBF kernel coefficient of the "rff" student, if None 1 / n_features is used.
+        :param test_size: fraction of the dataset used to compare the student with the teacher.
+        """
+        # The student must receive the samples processed as the teacher does
+        if teacher is not None:
+            kwargs.setdefault('autonormalize', teacher.autonormalize)
+            kwargs.setdefault('autoscale_size', teacher.autoscale_size)
+            kwargs.setdefault('middlewares', teacher.middlewares)
+            kwargs.setdefault('trainable_middlewares', teacher.trainable_middlewares)
+            kwargs.setdefault('axes', teacher.axes)
+
+        AbstractClassifier.__init__(self, *args, **kwargs)
+
+        if student not in ("mlp", "rff"):
+            raise ValueError("{student} is not a valid student model".format(student=student))
+
+        self.teacher = teacher
+        self.student = student
+        self.n_augmented = n_augmented
+        self.noise = noise
+        self.hidden_layer_sizes = hidden_layer_sizes
+        self.n_components = n_components
+        self.gamma = gamma
+        self.test_size = test_size
+        self.random_state = random_state
+
+        # Use the same gesture order of the teacher, so the probabilities columns match
+        if teacher is not None:
+            self.gestures = list(teacher.gestures)
+
+        # Variables that will hold the training data
+        self.x_data = []
+        self.y_data = []
+
+        # Trained student model and the comparison with the teacher
+        self.clf = None
+        self.report = None
+
+    def load_sample_data(self, sample):
+        """
+        Process and load a sample before feeding it to the training phase
+
+        :param sample: the loaded Sample
+        """
+        self.x_data.append(sample.get_linearized(one_dimensional=True))
+        self.y_data.append(self.get_internal_id_from_gesture_id(sample.gesture_id))
+
+    def create_student(self, n_features):
+        """
+        Create the regression model that predicts the teacher log-probabilities
+        """
+        if self.student == "mlp":
+            return neural_network.MLPRegressor(hidden_layer_sizes=self.hidden_layer_sizes, solver="lbfgs",
+                                               max_iter=1000, random_state=self.random_state)
+
+        gamma = self.gamma if self.gamma is not None else 1.0 / n_features
+
+        return Pipeline([
+            ('features', kernel_approximation.RBFSampler(gamma=gamma, n_components=self.n_components,
+                                                         random_state=self.random_state)),
+            ('linear', linear_model.Ridge(alpha=1e-3)),
+        ])
+
+    def augment(self, x):
+        """
+        Return the samples followed by n_augmented jittered copies of them
+        """
+        random_state = np.random.RandomState(self.random_state)
+
+        scale = self.noise * x.std(axis=0)
+        copies = [x]
+        for i in range(self.n_augmented):
+            copies.append(x + random_state.randn(*x.shape) * scale)
+
+        return np.vstack(copies)
+
+    @staticmethod
+    def get_latency(model, x, repeat=5):
+        """
+        Return the average time, in seconds, needed by the model to predict the probabilities of one sample
+        """
+        start = time.time()
+        for i in range(repeat):
+            for row in x:
+                model.predict_linearized_proba(row.reshape(1, -1))
+
+        return (time.time() - start) / (repeat * len(x))
+
+    def train_model(self):
+        """
+        Train the student to mimic the teacher probabilities and compare the two models
+        on a subset of the dataset that isn't used for the training.
+
+        :return: the accuracy of the student on the test subset
+        """
+        if self.teacher is None:
+            raise ValueError("A trained teacher is needed to train the student.")
+
+        x_data = np.array(self.x_data)
+        y_data = np.array(self.y_data)
+
+        X_train, X_test, Y_train, Y_test = train_test_split(x_data, y_data, test_size=self.test_size,
+                                                            random_state=self.random_state)
+
+        # The student learns the teacher log-probabilities, the softmax converts them back
+        X_augmented = self.augment(X_train)
+        targets = np.log(np.clip(self.teacher.predict_linearized_proba(X_augmented), 1e-6, 1))
+
+        self.clf = self.create_student(X_augmented.shape[1])
+        self.clf.fit(X_augmented, targets)
+
+        self.is_trained = True
+
+        # Compare the student with the teacher
+        teacher_predicted = np.argmax(self.teacher.predict_linearized_proba(X_test), axis=1)
+        student_predicted = np.argmax(self.predict_linearized_proba(X_test), axis=1)
+
+        teacher_latency = self.get_latency(self.teacher, X_test)
+        student_latency = self.get_latency(self, X_test)
+
+        self.report = {
+            'teacher_accuracy': float(np.mean(teacher_predicted == Y_test)),
+            'student_accuracy': float(np.mean(student_predicted == Y_test)),
+            'agreement': float(np.mean(teacher_predicted == student_predicted)),
+            'teacher_latency': teacher_latency,
+            'student_latency': student_latency,
+            'speedup': teacher_latency / student_latency if student_latency > 0 else np.inf,
+        }
+
+        self.confusion_matrix = confusion_matrix(Y_test, student_predicted)
+
+        if self.verbose:
+            print("Distillation report:")
+            for key in sorted(self.report):
+                print(key, self.report[key])
+
+        return self.report['student_accuracy']
+
+    def predict_linearized_proba(self, x):
+        """
+        Return the probabilities of each gesture for a batch of linearized samples
+
+        :param x: 2-dimensional array, each row is a linearized sample
+        :return: 2-dimensional array, the columns follow the order of self.gestures
+        """
+        scores = self.clf.predict(x)
+
+        # With a single gesture the regressor returns a one-dimensional array
+        return softmax(scores.reshape(len(x), -1))
+
+    def predict_sample(self, sample):
+        """
+        Return the predicted gesture_id of the specified sample
+
+        :param sample: sample used to predict the gesture
+        :return: a string containing the "gesture_id"
+        """
+        probabilities = self.predict_linearized_proba(sample.get_linearized())
+
+        return self.gestures[int(np.argmax(probabilities[0]))]
+
+    def get_attributes(self):
+        """
+        Return a dictionary containing the needed attributes to save the classifier
+        """
+        attributes = super(DistilledClassifier, self).get_attributes()
+
+        attributes.update({'clf': self.clf, 'student': self.student, 'report': self.report})
+
+        return attributes
+
+    def load_attributes(self, attributes):
+        """
+        Load the specified attributes in the classifier.
+        :param attributes: a dictionary containing the attributes
+        """
+        super(DistilledClassifier, self).load_attributes(attributes)
+
+        self.clf = attributes['clf']
+        self.student = attributes['student']
+        self.report = attributes['report']
@@ -0,0 +1,272 @@
+"""
+Declarative configuration of the pipelines.
+A specification describes a data reader and a list of branches, each made of a chain of stages
+( frame middlewares, a sample manager, middlewares and a final predictor or recorder ) and the
+callbacks of its gestures. The branches starting with the same stages, with the same parameters,
+share them, so that each distinct step is executed once for every frame.
+
+Example of a JSON specification:
+
+{
+    "reader": {"type": "SerialDataReader", "params": {"serial_port": "COM6", "expected_axis": 6}},
+    "branches": [
+        {
+            "stages": [
+                {"type": "StreamSampleManager", "params": {"window": 20, "step": 20}},
+                {"type": "GradientThresholdMiddleware", "params": {"threshold": 40, "group": true}},
+                {"type": "ClassifierPredictor",
+                 "params": {"classifier": {"type": "SVMClassifier", "params": {"model_path": "model.svm"},
+                                           "load": true}}}
+            ],
+            "callbacks": {"tap": "mymodule.receive_tap"}
+        }
+    ]
+}
+
+Each object is described by its "type", the name of a pygarl class or the dotted path of any class,
+and its "params". The parameters that are objects themselves are created once for each distinct
+description, and the objects with "load" set to true are loaded after being created.
+"""
+import importlib
+import json
+import os
+from pygarl.abstracts import AbstractDataReader, AbstractSampleManager, Sender
+from pygarl.pipeline import Pipeline
+
+# TOML specifications are supported only if a TOML parser is available
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+# Modules searched for the types specified without the module
+SEARCHED_MODULES = [
+    "pygarl.data_readers",
+    "pygarl.sample_managers",
+    "pygarl.middlewares",
+    "pygarl.predictors",
+    "pygarl.recorders",
+    "pygarl.classifiers",
+    "pygarl.base",
+]
+
+
+def resolve_name(name):
+    """
+    Return the class, or function, with the given name.
+    A dotted path is imported, a simple name is searched in the pygarl modules.
+    """
+    if "." in name:
+        module_name, attribute = name.rsplit(".", 1)
+        return getattr(importlib.import_module(module_name), attribute)
+
+    for module_name in SEARCHED_MODULES:
+        # The modules whose dependencies are not installed are skipped
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            continue
+
+        if hasattr(module, name):
+            return getattr(module, name)
+
+    raise ValueError("{name} is not a valid type".format(name=name))
+
+
+def get_key(spec):
+    """
+    Return a string that identifies the specification of an object, equal for equal specifications
+    """
+    return json.dumps(spec, sort_keys=True)
+
+
+def load_spec(file_path):
+    """
+    Load a specification from a JSON or TOML file, based on the extension
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+
+    if extension == ".toml":
+        if tomllib is None:
+            raise ImportError("A TOML parser is needed to load {path}, install tomli".format(path=file_path))
+
+        with open(file_path, "rb") as spec_file:
+            return tomllib.load(spec_file)
+
+    with open(file_path, "r") as spec_file:
+        return json.load(spec_file)
+
+
+class PipelineSpec(object):
+    """
+    Builds the objects described by a specification and connects them.
+    The stages of the branches form a tree: a stage is shared by all the branches whose chains,
+    up to that stage, have the same specifications.
+    """
+    def __init__(self, spec):
+        """
+        :param spec: dictionary containing the "reader", the "branches" and, optionally, "compile".
+                     If "compile" is true, the stages following each sample manager are compiled
+                     in a Pipeline.
+        """
+        self.spec = spec
+
+        self.reader = None
+
+        # Distinct stages, in the order they have been created
+        self.stages = []
+
+        # For each branch, the list of its stages
+        self.branches = []
+
+        # Callback manager of each branch
+        self.callback_managers = []
+
+        # Objects created for the parameters, by specification
+        self.objects = {}
+
+        # Tree of the created stages: each node associates the key of a stage to a tuple ( stage, children )
+        self.tree = {}
+
+    @classmethod
+    def from_file(cls, file_path):
+        """
+        Create a PipelineSpec from a JSON or TOML file
+        """
+        return cls(load_spec(file_path))
+
+    def create(self, spec):
+        """
+        Create the object described by the specification, creating its parameters
+        """
+        if "type" not in spec:
+            raise ValueError("The specification of an object must contain its type")
+
+        object_class = resolve_name(spec["type"])
+
+        params = {name: self.get_value(value) for name, value in spec.get("params", {}).items()}
+        created = object_class(**params)
+
+        if spec.get("load", False):
+            created.load()
+
+        return created
+
+    def get_value(self, value):
+        """
+        Return the value of a parameter, creating the objects it describes.
+        Equal descriptions produce the same object.
+        """
+        if isinstance(value, dict):
+            if "type" in value:
+                key = get_key(value)
+
+                if key not in self.objects:
+                    self.objects[key] = self.create(value)
+
+                return self.objects[key]
+
+            return {name: self.get_value(item) for name, item in value.items()}
+
+        if isinstance(value, list):
+            return [self.get_value(item) for item in value]
+
+        return value
+
+    @staticmethod
+    def connect(previous, stage):
+        """
+        Attach the stage to the previous one, based on the kind of the previous stage
+        """
+        if isinstance(previous, AbstractDataReader):
+            previous.attach_manager(stage)
+        elif isinstance(previous, Sender):
+            previous.attach_receiver(stage)
+        else:
+            raise ValueError("{stage} can't be followed by other stages".format(stage=type(previous).__name__))
+
+    def add_branch(self, branch):
+        """
+        Create the stages of a branch that are not shared with the previous ones, and its callbacks
+        """
+        if not branch.get("stages"):
+            raise ValueError("A branch must contain at least a stage")
+
+        previous = self.reader
+        node = self.tree
+        stages = []
+
+        for stage_spec in branch["stages"]:
+            key = get_key(stage_spec)
+
+            if key in node:
+                # The same chain has already been created by a previous branch
+                stage, node = node[key]
+            else:
+                stage = self.create(stage_spec)
+                self.connect(previous, stage)
+                self.stages.append(stage)
+
+                node[key] = (stage, {})
+                node = node[key][1]
+
+            stages.append(stage)
+            previous = stage
+
+        self.branches.append(stages)
+
+        # Attach the callbacks to the last stage
+        if "callbacks" in branch or "callback_manager" in branch:
+            callback_manager = self.create(branch.get("callback_manager", {"type": "CallbackManager"}))
+
+            for gesture_id, callback in branch.get("callbacks", {}).items():
+                callback_manager.attach_callback(gesture_id, resolve_name(callback))
+
+            if not hasattr(previous, "attach_callback_manager"):
+                raise ValueError("The callbacks can be attached only to a predictor")
+
+            previous.attach_callback_manager(callback_manager)
+            self.callback_managers.append(callback_manager)
+
+    def build(self):
+        """
+        Create and connect all the objects of the specification
+
+        :return: the PipelineSpec itself
+        """
+        if "reader" not in self.spec:
+            raise ValueError("The specification must contain a reader")
+
+        self.reader = self.create(self.spec["reader"])
+
+        for branch in self.spec.get("branches", []):
+            self.add_branch(branch)
+
+        if self.spec.get("compile", False):
+            # Replace the stages following each sample manager with a single compiled function
+            for stage in self.stages:
+                if isinstance(stage, AbstractSampleManager):
+                    pipeline = Pipeline.from_receivers(stage)
+                    stage.receivers = [pipeline]
+
+        return self
+
+    def get_shared_count(self):
+        """
+        Return the number of stages that would have been created without sharing them
+        """
+        return sum(len(stages) for stages in self.branches) - len(self.stages)
+
+    def mainloop(self):
+        """
+        Open the reader and read the data until the end of the stream
+        """
+        self.reader.open()
+
+        try:
+            self.reader.mainloop()
+        finally:
+            self.reader.close()
@@ -1,16 +1,27 @@
 import serial
 
+import os
+import selectors
+import stat
 import sys
+import time
 
-from pygarl.abstracts import AbstractDataReader, ControlSignal
+from pygarl.abstracts import AbstractDataReader
 
 
 class SerialDataReader(AbstractDataReader):
     """
     Used to get the data needed to make a sample from a serial connection
     """
-    def __init__(self, serial_port, baud_rate=38400, timeout=1, expected_axis=6, verbose=False):
-        AbstractDataReader.__init__(self)
+    def __init__(self, serial_port, baud_rate=38400, timeout=1, expected_axis=6, verbose=False, axes=None,
+                 decimation=1):
+        """
+        :param expected_axis: number of values of each data line
+        :param axes: list of the indexes of the axis to read, if None all the axis are read
+        :param decimation: if greater than 1, only one frame every decimation frames is notified,
+                           after an anti-aliasing filter
+        """
+        AbstractDataReader.__init__(self, axes=axes, decimation=decimation)
 
         self.serial_port = serial_port
         self.baud_rate = baud_rate
@@ -46,6 +57,12 @@ class SerialDataReader(AbstractDataReader):
         # Destroy the serial object
         self.serial = None
 
+    def fileno(self):
+        """
+        Return the file descriptor of the serial connection, used by the MultiplexDataReader
+        """
+        return self.serial.fileno()
+
     def mainloop(self):
         """
         Endless loop that waits for data from the serial connection and dispatch events when they occur
@@ -70,55 +87,7 @@ class SerialDataReader(AbstractDataReader):
                     print(line)
 
                 # Analyze the received data, dispatching the correct event based on the content
-                if line == "STARTING BATCH":
-                    # Batch started, dispatch the START event
-                    self.notify_signal(ControlSignal.START)
-                elif line == "CLOSING BATCH":
-                    # Batch closed, dispatch the STOP event
-                    self.notify_signal(ControlSignal.STOP)
-                elif line.startswith("START") and line.endswith("END"):
-                    # Data line, parse the data
-                    # A data line should have this format
-                    # START -36 1968 16060 -108 258 -136 END
-
-                    # Get the values by splitting the line
-                    value_list = line.split(" ")
-
-                    # Excluding START and END, there should be at least one value
-                    # ( so the total length should be 2 + number of expected axis ).
-                    if len(value_list) == (2 + self.expected_axis):
-                        # Get the values contained in the list, by removing the first and last element ( START and END )
-                        string_values = value_list[1:-1]
-
-                        # Convert the values from string to float
-                        values = []
-
-                        # If true, the data line will be invalidated
-                        has_errors = False
-
-                        for value in string_values:
-                            # Make sure that the character can be converted to float
-                            try:
-                                fvalue = float(value)  # Convert the string
-                                values.append(fvalue)  # Add to the values array
-                            except ValueError:  # Conversion error, mark the data line as wrong
-                                has_errors = True
-
-                        # Before sending the values, make sure they are error free
-                        if not has_errors:
-                            # Dispatch the DATA event, sending the values
-                            self.notify_data(values)
-                        else:
-                            # An error occurred, dispatch the ERROR event
-                            self.notify_signal(ControlSignal.ERROR)
-                    else:  # An error occurred, dispatch the ERROR event
-                        self.notify_signal(ControlSignal.ERROR)
-                elif line == "":  # This could be a timeout
-                    # Dispatch the TIMEOUT event
-                    self.notify_signal(ControlSignal.TIMEOUT)
-                else:  # This must be an error
-                    # Dispatch the ERROR event
-                    self.notify_signal(ControlSignal.ERROR)
+                self.dispatch_line(line, expected_axis=self.expected_axis)
         except KeyboardInterrupt:  # When Ctrl+C is pressed, the loop terminates
             print('CLOSED MAINLOOP!')
 
@@ -127,8 +96,13 @@ class FileDataReader(AbstractDataReader):
     """
     Used to simulate a data connection by reading the values from a file
     """
-    def __init__(self, file_path, verbose=False):
-        AbstractDataReader.__init__(self)
+    def __init__(self, file_path, verbose=False, axes=None, decimation=1):
+        """
+        :param axes: list of the indexes of the axis to read, if None all the axis are read
+        :param decimation: if greater than 1, only one frame every decimation frames is notified,
+                           after an anti-aliasing filter
+        """
+        AbstractDataReader.__init__(self, axes=axes, decimation=decimation)
 
         self.file_path = file_path
         self.verbose = verbose
@@ -161,6 +135,12 @@ class FileDataReader(AbstractDataReader):
         # Destroy the file object
         self.file = None
 
+    def fileno(self):
+        """
+        Return the file descriptor of the file, used by the MultiplexDataReader
+        """
+        return self.file.fileno()
+
     def mainloop(self):
         """
         Loop that reads file lines and dispatch events when they occur
@@ -189,53 +169,282 @@ class FileDataReader(AbstractDataReader):
                     print(line)
 
                 # Analyze the received data, dispatching the correct event based on the content
-                if line == "STARTING BATCH":
-                    # Batch started, dispatch the START event
-                    self.notify_signal(ControlSignal.START)
-                elif line == "CLOSING BATCH":
-                    # Batch closed, dispatch the STOP event
-                    self.notify_signal(ControlSignal.STOP)
-                elif line.startswith("START") and line.endswith("END"):
-                    # Data line, parse the data
-                    # A data line should have this format
-                    # START -36 1968 16060 -108 258 -136 END
-
-                    # Get the values by splitting the line
-                    value_list = line.split(" ")
-
-                    # Check the value number
-                    if len(value_list) > 2:
-                        # Get the values contained in the list, by removing the first and last element ( START and END )
-                        string_values = value_list[1:-1]
-
-                        # Convert the values from string to float
-                        values = []
-
-                        # If true, the data line will be invalidated
-                        has_errors = False
-
-                        for value in string_values:
-                            # Make sure that the character can be converted to float
-                            try:
-                                fvalue = float(value)  # Convert the string
-                                values.append(fvalue)  # Add to the values array
-                            except ValueError:  # Conversion error, mark the data line as wrong
-                                has_errors = True
-
-                        # Before sending the values, make sure they are error free
-                        if not has_errors:
-                            # Dispatch the DATA event, sending the values
-                            self.notify_data(values)
-                        else:
-                            # An error occurred, dispatch the ERROR event
-                            self.notify_signal(ControlSignal.ERROR)
-                    else:  # An error occurred, dispatch the ERROR event
-                        self.notify_signal(ControlSignal.ERROR)
-                elif line == "":  # This could be a timeout
-                    # Dispatch the TIMEOUT event
-                    self.notify_signal(ControlSignal.TIMEOUT)
-                else:  # This must be an error
-                    # Dispatch the ERROR event
-                    self.notify_signal(ControlSignal.ERROR)
+                self.dispatch_line(line)
+        except KeyboardInterrupt:  # When Ctrl+C is pressed, the loop terminates
+            print('CLOSED MAINLOOP!')
+
+
+class DeviceChannel(object):
+    """
+    Manager attached by the MultiplexDataReader to the reader of each device,
+    that forwards the frames and the signals to the multiplexer
+    """
+    def __init__(self, multiplexer, device_id):
+        self.multiplexer = multiplexer
+        self.device_id = device_id
+
+    def receive_data(self, data):
+        self.multiplexer.receive_device_data(self.device_id, data)
+
+    def receive_signal(self, signal):
+        self.multiplexer.receive_device_signal(self.device_id, signal)
+
+
+class MultiplexDataReader(AbstractDataReader):
+    """
+    Reads several devices in a single loop, waiting on all their connections at once.
+    Each device has its own reader, a SerialDataReader or a FileDataReader, that parses its lines,
+    so the managers of a single device are attached to its reader.
+    The managers attached to the MultiplexDataReader receive fused frames, made of the values of
+    all the devices: every time the reference device sends a frame or, if a reference rate is set,
+    at a fixed rate, the last frame received from each device is used ( zero-order hold ).
+    The fused frames are sent only after every device has sent at least a frame.
+    At a reference rate, the ticks are driven by the timeout of the wait on the devices, so they are sent
+    even when no device sends data. If the loop stalls for more than a tick, the missed ticks are
+    skipped, counted in missed_ticks, and a single fused frame is sent.
+    """
+    def __init__(self, readers, reference_device=None, reference_rate=None, read_size=4096, clock=time.time,
+                 verbose=False):
+        """
+        :param readers: dictionary that associates the id of each device to its reader.
+                        The readers are opened and closed by the MultiplexDataReader.
+        :param reference_device: id of the device whose frames trigger the fused frames, and whose
+                                 signals are forwarded. By default, the first device.
+        :param reference_rate: if set, the fused frames are sent at this rate in Hz, instead of when
+                               the reference device sends a frame
+        :param read_size: maximum number of bytes read from a device at once
+        :param clock: function that returns the current time in seconds, used to timestamp the frames
+        """
+        AbstractDataReader.__init__(self)
+
+        if len(readers) == 0:
+            raise ValueError("At least a device is needed")
+
+        self.readers = readers
+        self.device_ids = list(readers.keys())
+        self.reference_device = reference_device if reference_device is not None else self.device_ids[0]
+        self.reference_rate = reference_rate
+        self.read_size = read_size
+        self.clock = clock
+        self.verbose = verbose
+
+        if self.reference_device not in readers:
+            raise ValueError("{device} is not a valid device".format(device=self.reference_device))
+
+        # Attach a channel to each reader, to receive the frames with the id of the device
+        for device_id, reader in readers.items():
+            reader.attach_manager(DeviceChannel(self, device_id))
+
+        self.selector = None
+        self.devices = {}
+        self.regular_files = set()
+
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the frames received so far
+        """
+        # Last frame received from each device
+        self.last_frames = {}
+
+        # Time of the next fused frame, if a reference rate is set
+        self.next_tick = None
+
+        # Number of fused frames skipped because the loop was late
+        self.missed_ticks = 0
+
+        # Number of frames received from each device
+        self.frame_counts = {device_id: 0 for device_id in self.device_ids}
+
+    def attach_device_manager(self, device_id, manager):
+        """
+        Attach a manager to the frames of a single device.
+        The samples of a sample manager without a device_id are tagged with the id of the device.
+        """
+        if getattr(manager, "device_id", False) is None:
+            manager.device_id = device_id
+
+        self.readers[device_id].attach_manager(manager)
+
+    def open(self):
+        """
+        Open the connections of all the devices
+        """
+        if self.selector is not None:
+            raise RuntimeError("The devices are already opened")
+
+        self.selector = selectors.DefaultSelector()
+
+        # Id of the device and partial line received, for each file descriptor being read
+        self.devices = {}
+
+        # Regular files can't be waited on with epoll, they are always ready to be read
+        self.regular_files = set()
+
+        for device_id, reader in self.readers.items():
+            reader.open()
+
+            fd = reader.fileno()
+            self.devices[fd] = (device_id, bytearray())
+
+            if stat.S_ISREG(os.fstat(fd).st_mode):
+                self.regular_files.add(fd)
+            else:
+                self.selector.register(fd, selectors.EVENT_READ)
+
+        self.reset()
+
+    def close(self):
+        """
+        Close the connections of all the devices
+        """
+        if self.selector is None:
+            raise RuntimeError("The devices are not open, so they can't be closed.")
+
+        self.selector.close()
+        self.selector = None
+
+        for reader in self.readers.values():
+            reader.close()
+
+    def dispatch_device_line(self, device_id, line):
+        """
+        Let the reader of the device parse a line
+        """
+        line = line.decode("utf-8", "replace").rstrip("\r")
+
+        if self.verbose:
+            print(device_id, line)
+
+        # Empty lines are not timeouts, the devices are not read with a timeout
+        if line:
+            reader = self.readers[device_id]
+            reader.dispatch_line(line, expected_axis=getattr(reader, "expected_axis", None))
+
+    def poll(self, timeout=None):
+        """
+        Wait until at least a device has sent some data, and dispatch the complete lines received
+
+        :param timeout: maximum time to wait in seconds, if None wait until some data is available.
+                        At a reference rate, the wait ends at the next tick at the latest.
+        :return: the number of devices that have been read
+        """
+        ready = list(self.regular_files)
+
+        if self.reference_rate is not None:
+            self.notify_due_ticks()
+
+            tick_timeout = max(0.0, self.next_tick - self.clock())
+            timeout = tick_timeout if timeout is None else min(timeout, tick_timeout)
+
+        if self.selector.get_map():
+            # Don't wait if a regular file can be read
+            events = self.selector.select(0 if ready else timeout)
+            ready.extend(key.fd for key, mask in events)
+
+        for fd in ready:
+            device_id, partial_line = self.devices[fd]
+
+            try:
+                chunk = os.read(fd, self.read_size)
+            except OSError:  # A closed pseudo-terminal raises an error instead of returning no data
+                chunk = b""
+
+            if not chunk:
+                # The device has been disconnected, dispatch the last line
+                del self.devices[fd]
+
+                if fd in self.regular_files:
+                    self.regular_files.remove(fd)
+                else:
+                    self.selector.unregister(fd)
+
+                if partial_line:
+                    self.dispatch_device_line(device_id, bytes(partial_line))
+                continue
+
+            partial_line.extend(chunk)
+            lines = partial_line.split(b"\n")
+
+            # The last element is the beginning of the next line
+            partial_line[:] = lines.pop()
+
+            for line in lines:
+                self.dispatch_device_line(device_id, line)
+
+        if self.reference_rate is not None:
+            self.notify_due_ticks()
+
+        return len(ready)
+
+    def receive_device_data(self, device_id, data):
+        """
+        Called when a device sends a frame, updates the fused frame
+        """
+        self.frame_counts[device_id] += 1
+
+        if self.reference_rate is not None:
+            # Send the fused frame due before this frame, with the previous values
+            self.notify_due_ticks()
+
+            self.last_frames[device_id] = data
+        else:
+            self.last_frames[device_id] = data
+
+            if device_id == self.reference_device:
+                self.notify_fused_frame()
+
+    def notify_due_ticks(self):
+        """
+        Send the fused frame of the reference rate tick, if it is due.
+        The ticks missed while the loop was late are skipped.
+        """
+        current_time = self.clock()
+        period = 1.0 / self.reference_rate
+
+        # The first tick is one period after the start
+        if self.next_tick is None:
+            self.next_tick = current_time + period
+            return
+
+        if current_time < self.next_tick:
+            return
+
+        # Number of ticks that are due, besides the next one
+        missed = int((current_time - self.next_tick) * self.reference_rate)
+        self.missed_ticks += missed
+
+        self.notify_fused_frame()
+        self.next_tick += (missed + 1) * period
+
+    def receive_device_signal(self, device_id, signal):
+        """
+        Called when a device sends a signal, only the signals of the reference device are forwarded
+        """
+        if device_id == self.reference_device:
+            self.notify_signal(signal)
+
+    def notify_fused_frame(self):
+        """
+        Notify the last frame of each device, concatenated, if every device has sent a frame
+        """
+        if len(self.last_frames) < len(self.device_ids):
+            return
+
+        frame = []
+        for device_id in self.device_ids:
+            frame.extend(self.last_frames[device_id])
+
+        self.notify_data(frame)
+
+    def mainloop(self):
+        """
+        Loop that reads all the devices, until all of them are disconnected
+        """
+        # Enclosed in a try block to intercept a Ctrl+C press
+        try:
+            while self.devices:
+                self.poll()
         except KeyboardInterrupt:  # When Ctrl+C is pressed, the loop terminates
             print('CLOSED MAINLOOP!')
@@ -0,0 +1,317 @@
+"""
+Dynamic Time Warping primitives used by the DTWClassifier and the SpringPredictor.
+Samples are compared using the squared euclidean distance between frames, constrained
+by a Sakoe-Chiba band. The lower bounds can be computed for many templates at once
+and are used to discard candidates before running the full DTW.
+"""
+import numpy as np
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
+
+# The accelerated DTW kernel is available only if numba is installed
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def get_band_limits(i, n, m, window):
+    """
+    Return the first and last column of the Sakoe-Chiba band for the row i
+    of a n x m DTW matrix.
+    """
+    # Center of the band, following the diagonal of the matrix
+    if n > 1:
+        center = int(round(i * (m - 1) / float(n - 1)))
+    else:
+        center = 0
+
+    return max(0, center - window), min(m - 1, center + window)
+
+
+def dtw_distance_numpy(query, template, window, best_so_far=np.inf):
+    """
+    Calculate the DTW distance between two samples data, computing one row of the
+    matrix at a time with vectorized operations.
+    The computation is abandoned as soon as the distance can't be lower than best_so_far.
+
+    :param query: 2-dimensional array ( frames x axis )
+    :param template: 2-dimensional array ( frames x axis )
+    :param window: width of the Sakoe-Chiba band, in frames
+    :param best_so_far: if the distance exceeds this value, the computation is abandoned
+    :return: the DTW distance, or inf if the computation has been abandoned
+    """
+    n = query.shape[0]
+    m = template.shape[0]
+
+    # The band must be wide enough to reach the last cell
+    window = max(window, abs(n - m))
+
+    previous = np.full(m, np.inf)
+    current = np.full(m, np.inf)
+
+    for i in range(n):
+        start, end = get_band_limits(i, n, m, window)
+
+        # Cost of the cells of the row inside the band
+        cost = np.sum((template[start:end + 1] - query[i]) ** 2, axis=1)
+        cumulative_cost = np.cumsum(cost)
+
+        current.fill(np.inf)
+
+        if i == 0:
+            # The first row can be reached only with horizontal steps
+            current[start:end + 1] = cumulative_cost
+        else:
+            # Best value between the vertical and the diagonal step for each cell
+            best_previous = previous[start:end + 1].copy()
+            if start > 0:
+                best_previous = np.minimum(best_previous, previous[start - 1:end])
+            else:
+                best_previous[1:] = np.minimum(best_previous[1:], previous[start:end])
+
+            # The horizontal steps are resolved with a cumulative minimum:
+            # D[j] = S[j] + min_{k <= j} ( best_previous[k] - S[k - 1] )
+            shifted_cost = np.concatenate(([0.0], cumulative_cost[:-1]))
+            current[start:end + 1] = cumulative_cost + np.minimum.accumulate(best_previous - shifted_cost)
+
+        # Every warping path crosses each row, so the row minimum is a lower bound
+        if current[start:end + 1].min() > best_so_far:
+            return np.inf
+
+        previous, current = current, previous
+
+    return previous[m - 1]
+
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _dtw_distance_numba(query, template, window, best_so_far):
+        n = query.shape[0]
+        m = template.shape[0]
+        n_axis = query.shape[1]
+
+        window = max(window, abs(n - m))
+
+        previous = np.full(m, np.inf)
+        current = np.full(m, np.inf)
+
+        for i in range(n):
+            if n > 1:
+                center = int(round(i * (m - 1) / float(n - 1)))
+            else:
+                center = 0
+            start = max(0, center - window)
+            end = min(m - 1, center + window)
+
+            current[:] = np.inf
+            row_minimum = np.inf
+
+            for j in range(start, end + 1):
+                cost = 0.0
+                for axis in range(n_axis):
+                    difference = template[j, axis] - query[i, axis]
+                    cost += difference * difference
+
+                if i == 0 and j == 0:
+                    best = 0.0
+                else:
+                    best = np.inf
+                    if j > 0:
+                        best = min(best, current[j - 1])
+                    if i > 0:
+                        best = min(best, previous[j])
+                        if j > 0:
+                            best = min(best, previous[j - 1])
+
+                current[j] = cost + best
+                row_minimum = min(row_minimum, current[j])
+
+            if row_minimum > best_so_far:
+                return np.inf
+
+            previous, current = current, previous
+
+        return previous[m - 1]
+
+
+def dtw_distance(query, template, window, best_so_far=np.inf, accelerated=True):
+    """
+    Calculate the DTW distance between two samples data.
+    If numba is installed and accelerated is True, a compiled kernel is used,
+    otherwise the vectorized NumPy implementation is used.
+    See dtw_distance_numpy for the parameters.
+    """
+    if accelerated and numba is not None:
+        return _dtw_distance_numba(np.ascontiguousarray(query, dtype=float),
+                                   np.ascontiguousarray(template, dtype=float),
+                                   int(window), float(best_so_far))
+
+    return dtw_distance_numpy(query, template, window, best_so_far)
+
+
+def envelope(data, window):
+    """
+    Calculate the upper and lower envelope of samples data, used by LB_Keogh.
+
+    :param data: array ( frames x axis ) or stacked arrays ( samples x frames x axis )
+    :param window: width of the Sakoe-Chiba band, in frames
+    :return: tuple ( upper, lower ), with the same shape of data
+    """
+    # The frames axis is the second to last one
+    frames_axis = data.ndim - 2
+    size = 2 * window + 1
+
+    upper = maximum_filter1d(data, size=size, axis=frames_axis, mode="nearest")
+    lower = minimum_filter1d(data, size=size, axis=frames_axis, mode="nearest")
+
+    return upper, lower
+
+
+def lb_kim(query, templates):
+    """
+    Lower bound of the DTW distance based on the first and last frames, which are always aligned.
+
+    :param query: array ( frames x axis )
+    :param templates: stacked arrays ( samples x frames x axis )
+    :return: array containing the lower bound for each template
+    """
+    bound = np.sum((templates[:, 0] - query[0]) ** 2, axis=1)
+
+    # With a single frame the first and last cells are the same one
+    if query.shape[0] > 1 and templates.shape[1] > 1:
+        bound += np.sum((templates[:, -1] - query[-1]) ** 2, axis=1)
+
+    return bound
+
+
+def lb_keogh(query, upper, lower):
+    """
+    LB_Keogh lower bound of the DTW distance: the distance of the query from the envelope
+    of each template. The query and the templates must have the same number of frames.
+
+    :param query: array ( frames x axis )
+    :param upper: upper envelopes ( samples x frames x axis ) or ( frames x axis )
+    :param lower: lower envelopes, same shape of upper
+    :return: array containing the lower bound for each envelope
+    """
+    above = np.maximum(query - upper, 0)
+    below = np.maximum(lower - query, 0)
+
+    # Sum over all the frames and axis
+    return np.sum(above ** 2 + below ** 2, axis=(-2, -1))
+
+
+class SpringMatcher(object):
+    """
+    Streaming subsequence DTW ( SPRING algorithm ) for a single template.
+    Each received frame updates one column of the DTW matrix, so a frame costs
+    O(template length), and the best match between the template and a subsequence
+    of the stream is reported as soon as no following frame can improve it.
+    """
+    def __init__(self, template, threshold):
+        """
+        :param template: 2-dimensional array ( frames x axis )
+        :param threshold: maximum DTW distance of a match, divided by the template length
+        """
+        self.template = np.asarray(template, dtype=float)
+        self.threshold = threshold
+
+        # Maximum distance of a match
+        self.epsilon = threshold * self.template.shape[0]
+
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the stream received so far
+        """
+        m = self.template.shape[0]
+
+        # Index of the next frame
+        self.time = 0
+
+        # Last column of the DTW matrix and the starting frame of each path.
+        # The first element represents the "star" row, that allows a match to start anywhere
+        self.distances = np.full(m + 1, np.inf)
+        self.distances[0] = 0
+        self.starts = np.zeros(m + 1, dtype=int)
+
+        # Best match found and not yet reported
+        self.best_distance = np.inf
+        self.best_start = None
+        self.best_end = None
+
+    def update(self, frame):
+        """
+        Update the DTW column with a new frame
+
+        :param frame: array containing a value for each axis
+        :return: a tuple ( start frame, end frame, distance ) if a match is confirmed, None otherwise
+        """
+        t = self.time
+        self.time += 1
+
+        # Cost of aligning the frame with each template frame
+        cost = np.sum((self.template - frame) ** 2, axis=1)
+        cumulative_cost = np.cumsum(cost)
+
+        # Every path coming from the star row starts at the current frame
+        previous = self.distances
+        previous_starts = self.starts
+        previous_starts[0] = t
+
+        # Best value between the diagonal and the horizontal step for each cell
+        use_diagonal = previous[:-1] <= previous[1:]
+        best_previous = np.where(use_diagonal, previous[:-1], previous[1:])
+        best_starts = np.where(use_diagonal, previous_starts[:-1], previous_starts[1:])
+
+        # The vertical steps are resolved with a cumulative minimum, the first value
+        # represents the path starting from the star row of the current column
+        values = np.concatenate(([0.0], best_previous - np.concatenate(([0.0], cumulative_cost[:-1]))))
+        minimums = np.minimum.accumulate(values)
+
+        # Index of the value that produced each minimum, to track the starting frames
+        indexes = np.maximum.accumulate(np.where(values == minimums, np.arange(values.size), 0))
+        candidate_starts = np.concatenate(([t], best_starts))
+
+        distances = np.empty_like(previous)
+        distances[0] = 0
+        distances[1:] = cumulative_cost + minimums[1:]
+
+        starts = candidate_starts[indexes]
+        starts[0] = t
+
+        match = None
+
+        # Report the best match if no current path can improve it anymore
+        if self.best_distance <= self.epsilon:
+            if np.all((distances[1:] >= self.best_distance) | (starts[1:] > self.best_end)):
+                match = (self.best_start, self.best_end, self.best_distance)
+
+                # Paths overlapping the reported match can't produce another one
+                distances[1:][starts[1:] <= self.best_end] = np.inf
+                self.best_distance = np.inf
+
+        # Check if the template is matched by a subsequence ending at the current frame
+        if distances[-1] <= self.epsilon and distances[-1] < self.best_distance:
+            self.best_distance = distances[-1]
+            self.best_start = starts[-1]
+            self.best_end = t
+
+        self.distances = distances
+        self.starts = starts
+
+        return match
+
+    def flush(self):
+        """
+        Report the best match not yet confirmed, for example at the end of the stream
+
+        :return: a tuple ( start frame, end frame, distance ) or None
+        """
+        if self.best_distance <= self.epsilon:
+            match = (self.best_start, self.best_end, self.best_distance)
+            self.best_distance = np.inf
+            return match
+
+        return None
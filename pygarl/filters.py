@@ -0,0 +1,106 @@
+"""
+Stateful digital filters for streams of frames.
+The filters are implemented as cascades of second-order sections, that are numerically
+stable even for high orders, and keep their state between calls, so that filtering a stream
+frame by frame, or block by block, gives the same result as filtering the whole signal at once.
+"""
+import numpy as np
+from scipy import signal
+
+
+class SOSFilter(object):
+    """
+    IIR filter made of second-order sections, applied independently to each axis.
+    The state of each section is kept in the direct form II transposed, so each frame
+    costs O(number of sections), vectorized over the axis.
+    """
+    def __init__(self, sos):
+        """
+        :param sos: array ( sections x 6 ) of second-order sections coefficients,
+                    as returned by the scipy.signal filter design functions with output="sos".
+        """
+        self.sos = np.atleast_2d(np.asarray(sos, dtype=float))
+
+        if self.sos.ndim != 2 or self.sos.shape[1] != 6:
+            raise ValueError("The second-order sections must be an array with 6 columns")
+
+        # Normalize the coefficients, so that a0 is 1 for every section
+        self.sos = self.sos / self.sos[:, 3:4]
+
+        # Numerator and denominator coefficients of each section
+        self.b = self.sos[:, :3]
+        self.a = self.sos[:, 3:]
+
+        # State of the filter ( sections x 2 x axis ), allocated when the first frame is received
+        self.zi = None
+
+    @classmethod
+    def design(cls, btype, cutoff, fs, order=4):
+        """
+        Create a Butterworth filter
+
+        :param btype: "lowpass", "highpass" or "bandpass"
+        :param cutoff: cutoff frequency in Hz, or a tuple ( low, high ) for a bandpass filter
+        :param fs: sampling frequency of the frames in Hz
+        :param order: order of the filter
+        """
+        if btype not in ("lowpass", "highpass", "bandpass"):
+            raise ValueError("{btype} is not a valid filter type".format(btype=btype))
+
+        nyquist = fs / 2.0
+        normalized_cutoff = np.asarray(cutoff, dtype=float) / nyquist
+
+        if np.any(normalized_cutoff <= 0) or np.any(normalized_cutoff >= 1):
+            raise ValueError("The cutoff frequencies must be between 0 and fs / 2")
+
+        return cls(signal.butter(order, normalized_cutoff, btype=btype, output="sos"))
+
+    def reset(self):
+        """
+        Forget the state of the filter, the next frame is filtered as the first one of a new signal
+        """
+        self.zi = None
+
+    def process_frame(self, frame):
+        """
+        Filter a single frame
+
+        :param frame: array containing a value for each axis
+        :return: array containing the filtered value of each axis
+        """
+        x = np.asarray(frame, dtype=float)
+
+        if self.zi is None:
+            self.zi = np.zeros((self.sos.shape[0], 2, x.size))
+
+        zi = self.zi
+        for section in range(self.sos.shape[0]):
+            b0, b1, b2 = self.b[section]
+            a0, a1, a2 = self.a[section]
+            state = zi[section]
+
+            # Direct form II transposed
+            y = b0 * x + state[0]
+            state[0] = b1 * x - a1 * y + state[1]
+            state[1] = b2 * x - a2 * y
+
+            x = y
+
+        return x
+
+    def process_block(self, frames):
+        """
+        Filter a block of consecutive frames, continuing from the state left by the previous ones
+
+        :param frames: array ( frames x axis )
+        :return: array ( frames x axis ) containing the filtered frames
+        """
+        frames = np.asarray(frames, dtype=float)
+
+        if self.zi is None:
+            self.zi = np.zeros((self.sos.shape[0], 2, frames.shape[1]))
+
+        # Filtering along the first axis, scipy uses the same state layout ( sections x 2 x axis )
+        filtered, self.zi = signal.sosfilt(self.sos, frames, axis=0, zi=self.zi)
+
+        return filtered
@@ -1,7 +1,10 @@
 from __future__ import print_function
 from pygarl.base import Sample
-from pygarl.abstracts import AbstractMiddleware
+from pygarl.abstracts import AbstractMiddleware, AbstractTrainableMiddleware, AbstractFrameMiddleware, ControlSignal
+from pygarl.filters import SOSFilter
 import numpy as np
+from sklearn.decomposition import PCA
+from sklearn.feature_selection import SelectKBest, f_classif
 
 
 class GradientThresholdMiddleware(AbstractMiddleware):
@@ -57,14 +60,12 @@ class GradientThresholdMiddleware(AbstractMiddleware):
         Add the given sample to the buffer to group them.
         :param sample: Sample to add.
         """
-        # Get a copy of the sample data
-        sample_data = np.array(sample.data, copy=True)
-
+        # The sample data is never modified in place, so it can be referenced without copying it
         # If buffer is empty, it becomes equal to the sample data
         if self.buffer is None:
-            self.buffer = sample_data
+            self.buffer = sample.data
         else:  # buffer is not empty, concatenate the new sample data
-            self.buffer = np.concatenate((self.buffer, sample_data))
+            self.buffer = np.concatenate((self.buffer, sample.data))
 
     def delete_buffer(self):
         """
@@ -127,14 +128,15 @@ class GradientThresholdMiddleware(AbstractMiddleware):
                     # If this sample has not crossed the threshold it means that the grouped sample
                     # is finished and can be returned.
 
-                    # Copy the buffer
-                    grouped_data = np.copy(self.buffer)
+                    grouped_data = self.buffer
 
                     # Delete the buffer
                     self.delete_buffer()
 
-                    # Create a new sample with the grouped data
-                    new_sample = Sample(data=grouped_data, gesture_id=sample.gesture_id)
+                    # Create a new sample with the grouped data, without copying it: the buffer is
+                    # never modified in place and the trimming replaces the data
+                    new_sample = Sample(data=grouped_data, gesture_id=sample.gesture_id, device_id=sample.device_id,
+                                        axes=sample.axes, copy=False)
 
                     # Trim the sample data if autotrim is enabled
                     if self.autotrim:
@@ -219,6 +221,313 @@ class TrimmerMiddleware(AbstractMiddleware):
         return sample
 
 
+class FeatureExtractionMiddleware(AbstractMiddleware):
+    """
+    Replace the sample with a fixed-length vector of statistical features, computed for all
+    the axis at once. The resulting sample has a single frame, so that a classifier trains on
+    tens of features instead of the hundreds of values of the linearized sample.
+    The classifier using it should not set autonormalize and autoscale_size.
+
+    Available features, in the order they are concatenated:
+    - mean, std, min, max: statistics of each axis
+    - energy: mean of the squared values of each axis
+    - zcr: zero-crossing rate of each axis, after removing its mean
+    - peaks: number of local maxima of each axis higher than mean + peak_threshold * std
+    - bands: energy of n_bands equal frequency bands of each axis
+    - corr: correlation between each pair of axis
+    """
+    AVAILABLE_FEATURES = ("mean", "std", "min", "max", "energy", "zcr", "peaks", "bands", "corr")
+
+    def __init__(self, features=None, n_bands=4, peak_threshold=1.0):
+        """
+        :param features: list of the features to compute, by default all the available ones.
+        :param n_bands: number of frequency bands used by the "bands" feature.
+        :param peak_threshold: minimum height of a peak, in standard deviations above the mean.
+        """
+        # Call the base constructor
+        AbstractMiddleware.__init__(self)
+
+        if features is None:
+            features = self.AVAILABLE_FEATURES
+
+        for feature in features:
+            if feature not in self.AVAILABLE_FEATURES:
+                raise ValueError("{feature} is not a valid feature".format(feature=feature))
+
+        # Keep the features in the documented order
+        self.features = [feature for feature in self.AVAILABLE_FEATURES if feature in features]
+        self.n_bands = n_bands
+        self.peak_threshold = peak_threshold
+
+    def extract_features(self, data):
+        """
+        Return the features of the given data as a one-dimensional array.
+        The statistics and the spectrum cached by a Sample are reused.
+
+        :param data: a Sample, or an array ( frames x axis )
+        """
+        sample = data if isinstance(data, Sample) else Sample(data=np.asarray(data, dtype=float))
+        data = sample.data
+        n_frames, n_axis = data.shape
+
+        mean, std, minimum, maximum = sample.axis_stats()
+        centered = data - mean
+
+        values = []
+
+        if "mean" in self.features:
+            values.append(mean)
+        if "std" in self.features:
+            values.append(std)
+        if "min" in self.features:
+            values.append(minimum)
+        if "max" in self.features:
+            values.append(maximum)
+        if "energy" in self.features:
+            values.append(np.mean(data ** 2, axis=0))
+        if "zcr" in self.features:
+            crossings = np.sum(np.signbit(centered[1:]) != np.signbit(centered[:-1]), axis=0)
+            values.append(crossings / float(max(n_frames - 1, 1)))
+        if "peaks" in self.features:
+            is_peak = (data[1:-1] > data[:-2]) & (data[1:-1] >= data[2:]) & \
+                      (data[1:-1] > mean + self.peak_threshold * std)
+            values.append(np.sum(is_peak, axis=0).astype(float))
+        if "bands" in self.features:
+            # Normalized so that the energy doesn't depend on the sample length.
+            # Removing the mean only changes the first bin, so the cached spectrum can be used
+            power = sample.fft_magnitude() ** 2 / n_frames ** 2
+            power[0] = 0
+            # Split the spectrum in bands, the last ones are empty if there are less bins than bands
+            edges = np.linspace(0, power.shape[0], self.n_bands + 1).astype(int)
+            cumulative = np.concatenate((np.zeros((1, n_axis)), np.cumsum(power, axis=0)))
+            values.append((cumulative[edges[1:]] - cumulative[edges[:-1]]).ravel())
+        if "corr" in self.features:
+            # Correlation of each pair of axis, zero if an axis is constant
+            covariance = centered.T.dot(centered) / n_frames
+            norms = np.outer(std, std)
+            correlation = np.divide(covariance, norms, out=np.zeros_like(covariance), where=norms > 0)
+            values.append(correlation[np.triu_indices(n_axis, k=1)])
+
+        return np.concatenate(values)
+
+    def process_sample(self, sample):
+        """
+        Replace the sample with its features
+        """
+        return Sample(data=self.extract_features(sample)[np.newaxis], gesture_id=sample.gesture_id,
+                      device_id=sample.device_id, copy=False)
+
+    def get_n_features(self, n_axis):
+        """
+        Return the number of features extracted from a sample with n_axis axis
+        """
+        return self.extract_features(np.zeros((3, n_axis))).size
+
+
+class PCAMiddleware(AbstractTrainableMiddleware):
+    """
+    Project the linearized samples on their principal components, learned from the dataset.
+    If whiten is True, the components are also scaled to unit variance.
+    Use it as a trainable middleware of a classifier.
+    """
+    def __init__(self, n_components=20, whiten=False):
+        """
+        :param n_components: number of components to keep. If it is a float between 0 and 1,
+                             the number of components needed to explain that fraction of variance.
+        :param whiten: if True, scale the components to unit variance.
+        """
+        # Call the base constructor
+        AbstractTrainableMiddleware.__init__(self)
+
+        # Set the parameters
+        self.n_components = n_components
+        self.whiten = whiten
+
+        self.pca = None
+
+    def fit_linearized(self, x, y):
+        """
+        Learn the principal components of the linearized samples
+        """
+        # There can't be more components than samples or features
+        n_components = self.n_components
+        if isinstance(n_components, int):
+            n_components = min(n_components, x.shape[0], x.shape[1])
+
+        self.pca = PCA(n_components=n_components, whiten=self.whiten)
+        self.pca.fit(x)
+
+    def transform_linearized(self, x):
+        """
+        Project the linearized samples on the principal components
+        """
+        return self.pca.transform(x)
+
+
+class WelfordNormalizationMiddleware(AbstractTrainableMiddleware):
+    """
+    Standardize each axis with the mean and standard deviation of the whole dataset, instead of
+    the statistics of each sample, so that the absolute amplitude of the gestures is preserved.
+    The statistics are computed in a single streaming pass over the samples ( Welford's algorithm ),
+    saved in the model and applied as a single multiply-add.
+    If adaptation_rate is set, the statistics follow the live stream, updated with each processed sample.
+    Use it as a trainable middleware of a classifier, in place of autonormalize.
+    """
+    def __init__(self, adaptation_rate=None):
+        """
+        :param adaptation_rate: weight of each processed sample in the updated statistics, between 0 and 1.
+                                If None, the statistics learned from the dataset never change.
+        """
+        # Call the base constructor
+        AbstractTrainableMiddleware.__init__(self)
+
+        self.adaptation_rate = adaptation_rate
+
+        # Statistics of each axis
+        self.count = 0
+        self.mean = None
+        self.m2 = None  # Sum of the squared differences from the mean
+        self.variance = None
+
+        # Coefficients of the normalization, data * scale + offset
+        self.scale = None
+        self.offset = None
+
+    def update(self, data):
+        """
+        Add the frames of a sample to the statistics, combining its mean and variance with the current ones
+        """
+        data = np.asarray(data, dtype=float)
+        n = data.shape[0]
+        if n == 0:
+            return
+
+        mean = data.mean(axis=0)
+        m2 = np.sum((data - mean) ** 2, axis=0)
+
+        if self.count == 0:
+            self.count, self.mean, self.m2 = n, mean, m2
+            return
+
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * n / float(total)
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * n / float(total)
+        self.count = total
+
+    def update_coefficients(self):
+        """
+        Compute the coefficients of the normalization from the current mean and variance
+        """
+        std = np.sqrt(self.variance)
+        # The constant axis are only centered
+        std[std == 0] = 1
+
+        self.scale = 1.0 / std
+        self.offset = -self.mean * self.scale
+
+    def fit(self, samples):
+        """
+        Compute the statistics of each axis, one sample at a time
+        """
+        self.count = 0
+        for sample in samples:
+            self.update(sample.data)
+
+        if self.count == 0:
+            raise ValueError("The middleware can't be fitted without frames")
+
+        self.variance = self.m2 / self.count
+        self.update_coefficients()
+
+        self.is_fitted = True
+
+    def adapt(self, data):
+        """
+        Move the statistics towards the ones of the given frames, with exponential forgetting
+        """
+        rate = self.adaptation_rate
+
+        # The models saved before the variance was kept have only the scale
+        if getattr(self, "variance", None) is None:
+            self.variance = 1.0 / (self.scale ** 2)
+
+        self.mean = (1 - rate) * self.mean + rate * data.mean(axis=0)
+        self.variance = (1 - rate) * self.variance + rate * np.mean((data - self.mean) ** 2, axis=0)
+
+        self.update_coefficients()
+
+    def normalize(self, data):
+        """
+        Return the normalized frames
+        """
+        normalized = np.multiply(data, self.scale)
+        normalized += self.offset
+        return normalized
+
+    def transform_linearized(self, x):
+        """
+        Normalize a batch of linearized samples, each made of frames with the same axis
+        """
+        return self.normalize(x.reshape(len(x), -1, self.scale.size)).reshape(len(x), -1)
+
+    def transform_sample(self, sample):
+        """
+        Return the sample with normalized frames
+        """
+        if not self.is_fitted:
+            raise ValueError("The middleware must be fitted before processing a sample")
+
+        return Sample(data=self.normalize(sample.data), gesture_id=sample.gesture_id, device_id=sample.device_id,
+                      axes=sample.axes, copy=False)
+
+    def process_sample(self, sample):
+        """
+        Normalize the sample, updating the statistics first if the adaptation is enabled
+        """
+        if self.adaptation_rate is not None and self.is_fitted:
+            self.adapt(np.asarray(sample.data, dtype=float))
+
+        return self.transform_sample(sample)
+
+
+class SelectKBestMiddleware(AbstractTrainableMiddleware):
+    """
+    Keep the k values of the linearized samples that best separate the gestures,
+    according to a univariate test ( by default the ANOVA F-value ).
+    Use it as a trainable middleware of a classifier.
+    """
+    def __init__(self, k=20, score_func=f_classif):
+        """
+        :param k: number of values to keep.
+        :param score_func: function that scores each value, as in sklearn.feature_selection.
+        """
+        # Call the base constructor
+        AbstractTrainableMiddleware.__init__(self)
+
+        # Set the parameters
+        self.k = k
+        self.score_func = score_func
+
+        # Indexes of the selected values
+        self.selected = None
+
+    def fit_linearized(self, x, y):
+        """
+        Select the values with the highest scores
+        """
+        selector = SelectKBest(self.score_func, k=min(self.k, x.shape[1]))
+        selector.fit(x, y)
+
+        self.selected = selector.get_support(indices=True)
+
+    def transform_linearized(self, x):
+        """
+        Keep only the selected values
+        """
+        return x[:, self.selected]
+
+
 class LengthThresholdMiddleware(AbstractMiddleware):
     """
     Let pass the samples that are between min_len and max_len, block the others.
@@ -289,4 +598,47 @@ class PlotterMiddleware(AbstractMiddleware):
         # Plot the sample
         sample.plot(self.blocking)
 
-        return sample
\ No newline at end of file
+        return sample
+
+
+class SOSFilterMiddleware(AbstractFrameMiddleware):
+    """
+    Filters the raw frames of a DataReader with a Butterworth filter made of second-order sections,
+    before they are grouped into samples. The state of the filter is kept between frames, so
+    there are no artifacts at the edges of the samples and each frame costs O(1).
+    Attach it to a DataReader as a manager, and attach the SampleManagers to it.
+    """
+    def __init__(self, btype="lowpass", cutoff=10.0, fs=100.0, order=4, sos=None, reset_on_stop=False):
+        """
+        :param btype: "lowpass", "highpass" or "bandpass"
+        :param cutoff: cutoff frequency in Hz, or a tuple ( low, high ) for a bandpass filter
+        :param fs: sampling frequency of the frames in Hz
+        :param order: order of the filter
+        :param sos: if set, second-order sections coefficients used instead of the Butterworth design.
+        :param reset_on_stop: if True, the filter state is reset when a STOP signal is received,
+                              for example when each batch of the DataReader is an independent recording.
+        """
+        # Call the base constructor
+        AbstractFrameMiddleware.__init__(self)
+
+        if sos is not None:
+            self.filter = SOSFilter(sos)
+        else:
+            self.filter = SOSFilter.design(btype, cutoff, fs, order)
+
+        self.reset_on_stop = reset_on_stop
+
+    def process_data(self, data):
+        """
+        Filter the frame
+        """
+        return self.filter.process_frame(data)
+
+    def receive_signal(self, signal):
+        """
+        Forward the signal, resetting the filter if needed
+        """
+        if self.reset_on_stop and signal == ControlSignal.STOP:
+            self.filter.reset()
+
+        AbstractFrameMiddleware.receive_signal(self, signal)
@@ -1,6 +1,7 @@
 from __future__ import print_function
 from pygarl.abstracts import *
 from pygarl.base import Sample
+import numpy as np
 
 
 class MockSampleManager(AbstractSampleManager):
@@ -13,9 +14,11 @@ class MockSampleManager(AbstractSampleManager):
 
         self.received_data = None
         self.received_signal = None
+        self.received_frames = []
 
     def receive_data(self, data):
         self.received_data = data
+        self.received_frames.append(data)
 
     def receive_signal(self, signal):
         self.received_signal = signal
@@ -116,9 +119,52 @@ class MockCallbackManager(object):
     """
     def __init__(self):
         self.received_gesture = None
+        self.received_gestures = []
+        self.received_confidence = None
 
-    def receive_gesture(self, gesture_id):
+    def receive_gesture(self, gesture_id, confidence=None):
         """
         When this function is called, set self.received_gesture
         """
         self.received_gesture = gesture_id
+        self.received_gestures.append(gesture_id)
+        self.received_confidence = confidence
+
+
+class MockThresholdClassifier(AbstractClassifier):
+    """
+    Classifier used for tests, it predicts the "high" gesture when the maximum value
+    of the processed sample is greater than the threshold and "low" otherwise.
+    """
+    def __init__(self, threshold=5, *args, **kwargs):
+        AbstractClassifier.__init__(self, model_path="mock", *args, **kwargs)
+
+        self.threshold = threshold
+        self.gestures = ["low", "high"]
+        self.is_trained = True
+
+    def predict_linearized_proba(self, x):
+        high = (np.max(x, axis=1) > self.threshold).astype(float)
+        return np.column_stack((1 - high, high))
+
+    def predict_sample(self, sample):
+        return self.gestures[int(np.argmax(self.predict_sample_proba(sample)))]
+
+
+class MockConfidencePredictor(AbstractGesturePredictor):
+    """
+    Predictor used for tests, the first frame of the sample contains the index
+    of the predicted gesture and the confidence of the prediction.
+    """
+    def __init__(self, gestures):
+        AbstractGesturePredictor.__init__(self)
+
+        self.gestures = gestures
+        self.calls = 0
+
+    def predict_with_confidence(self, sample):
+        self.calls += 1
+        return self.gestures[int(sample.data[0, 0])], float(sample.data[0, 1])
+
+    def predict(self, sample):
+        return self.predict_with_confidence(sample)[0]
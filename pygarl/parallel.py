@@ -0,0 +1,267 @@
+"""
+Execution of the CPU-heavy stages in a pool of processes.
+The ParallelStage sends the samples received in the main process to worker processes, each one
+holding a copy of the wrapped stage, and delivers the results to the rest of the pipeline, that
+keeps running in the main process. The sample data is exchanged through shared memory slots,
+so only the shape and the position of the data are pickled.
+"""
+import copy
+import os
+import weakref
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+import numpy as np
+from pygarl.base import Sample
+from pygarl.abstracts import AbstractMiddleware, AbstractGesturePredictor
+
+# State of the worker processes, set when they are started
+_worker = {}
+
+
+class GestureCollector(object):
+    """
+    Callback manager of the predictor in a worker process, that keeps the notified gestures
+    so that they can be sent back to the main process
+    """
+    def __init__(self):
+        self.gestures = []
+
+    def receive_gesture(self, gesture_id, confidence=None):
+        self.gestures.append((gesture_id, confidence))
+
+
+def release_resources(executor, memories):
+    """
+    Stop the worker processes and remove the shared memory, called once when the ParallelStage
+    is closed or garbage collected
+    """
+    executor.shutdown()
+
+    for memory in memories:
+        memory.close()
+        try:
+            memory.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def get_slot(memory, slot, slot_size, shape, dtype):
+    """
+    Return an array that uses the given slot of the shared memory as buffer
+    """
+    return np.ndarray(shape, dtype=dtype, buffer=memory.buf, offset=slot * slot_size)
+
+
+def initialize_worker(stage, input_name, output_name, slot_size):
+    """
+    Called when a worker process starts, attaches the shared memory created by the ParallelStage
+    """
+    _worker['stage'] = stage
+
+    # The gestures of a predictor are collected and notified by the main process
+    if isinstance(stage, AbstractGesturePredictor):
+        _worker['collector'] = GestureCollector()
+        stage.callbacks = [_worker['collector']]
+    _worker['input'] = shared_memory.SharedMemory(name=input_name)
+    _worker['output'] = shared_memory.SharedMemory(name=output_name)
+    _worker['slot_size'] = slot_size
+
+
+def process_in_worker(slot, shape, dtype, data, gesture_id, end_frame, device_id, axes):
+    """
+    Process a sample in a worker process.
+    The data is read from the input slot, unless it is too big and has been passed directly.
+
+    :return: for a predictor, the list of the notified tuples ( gesture_id, confidence ). For a middleware,
+             None if the sample
+             has been suppressed, otherwise a tuple ( shape, dtype, data, gesture_id, end_frame, device_id, axes ),
+             where data is None if the processed data has been written in the output slot.
+    """
+    stage = _worker['stage']
+    slot_size = _worker['slot_size']
+
+    if data is None:
+        data = get_slot(_worker['input'], slot, slot_size, shape, dtype)
+
+    # The Sample copies the data, so the slot can be reused as soon as the result is delivered
+    sample = Sample(data=data, gesture_id=gesture_id, device_id=device_id, axes=axes)
+    sample.end_frame = end_frame
+
+    # The predictor receives the sample as usual, so that its own logic decides what is notified
+    if isinstance(stage, AbstractGesturePredictor):
+        collector = _worker['collector']
+        collector.gestures = []
+        stage.receive_sample(sample)
+        return collector.gestures
+
+    processed = stage.process_sample(sample)
+
+    if processed is None:
+        return None
+
+    processed_data = processed.data
+
+    if processed_data.nbytes > slot_size:
+        return processed_data.shape, processed_data.dtype.str, processed_data, processed.gesture_id, \
+            processed.end_frame, processed.device_id, processed.axes
+
+    get_slot(_worker['output'], slot, slot_size, processed_data.shape, processed_data.dtype)[...] = processed_data
+
+    return processed_data.shape, processed_data.dtype.str, None, processed.gesture_id, processed.end_frame, \
+        processed.device_id, processed.axes
+
+
+class ParallelStage(AbstractMiddleware):
+    """
+    Runs a middleware, or a predictor, in a pool of processes.
+    For a middleware, the processed samples are notified to the receivers attached to the ParallelStage.
+    For a predictor, the predicted gestures are notified to the callback managers attached to the predictor.
+
+    Each worker process has its own copy of the stage, so the stage must not depend on the previous
+    samples, as the GradientThresholdMiddleware grouping does.
+    The results are delivered while receiving the following samples, call flush to deliver
+    all the pending ones, for example at the end of the stream.
+    Call close, or use the ParallelStage in a with statement, to stop the workers and release the
+    shared memory. If it's never closed, they are released when the ParallelStage is garbage collected.
+    """
+    def __init__(self, stage, workers=None, ordered=True, slot_size=65536, max_pending=None):
+        """
+        :param stage: middleware or predictor to run in the worker processes
+        :param workers: number of worker processes, if None the number of cores is used
+        :param ordered: if True the results are delivered in the same order of the samples,
+                        otherwise as soon as they are available
+        :param slot_size: size in bytes of the shared memory slot of each sample.
+                          Bigger samples are pickled.
+        :param max_pending: maximum number of samples being processed, when reached the stage waits for
+                            a result before accepting another sample. If None, twice the number of workers.
+        """
+        AbstractMiddleware.__init__(self)
+
+        self.stage = stage
+        self.workers = workers or os.cpu_count() or 1
+        self.ordered = ordered
+        self.slot_size = slot_size
+        self.max_pending = max_pending or 2 * self.workers
+
+        self.is_predictor = isinstance(stage, AbstractGesturePredictor)
+
+        # Slots of the samples sent to the workers and of the processed ones
+        self.input_memory = shared_memory.SharedMemory(create=True, size=self.max_pending * slot_size)
+        self.output_memory = shared_memory.SharedMemory(create=True, size=self.max_pending * slot_size)
+        self.free_slots = list(range(self.max_pending))
+
+        # The workers receive a copy of the stage without the receivers and the callbacks,
+        # that remain in the main process
+        worker_stage = copy.copy(stage)
+        if self.is_predictor:
+            worker_stage.callbacks = []
+        else:
+            worker_stage.receivers = []
+
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=initialize_worker,
+                                            initargs=(worker_stage, self.input_memory.name,
+                                                      self.output_memory.name, slot_size))
+
+        # Tuples ( future, slot ) of the samples being processed, in the order they have been received
+        self.pending = deque()
+
+        # Release the workers and the shared memory even if close is never called
+        self.finalizer = weakref.finalize(self, release_resources, self.executor,
+                                          [self.input_memory, self.output_memory])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def receive_sample(self, sample):
+        """
+        Send the sample to a worker process, delivering the results already available
+        """
+        self.collect()
+
+        # Wait for a free slot
+        while not self.free_slots:
+            self.collect(block=True)
+
+        slot = self.free_slots.pop()
+        data = sample.data
+
+        # The data that doesn't fit in the slot is pickled
+        if data.nbytes <= self.slot_size:
+            get_slot(self.input_memory, slot, self.slot_size, data.shape, data.dtype)[...] = data
+            payload = None
+        else:
+            payload = data
+
+        future = self.executor.submit(process_in_worker, slot, data.shape, data.dtype.str, payload,
+                                      sample.gesture_id, sample.end_frame, sample.device_id, sample.axes)
+        self.pending.append((future, slot))
+
+    def collect(self, block=False):
+        """
+        Deliver the results available
+
+        :param block: if True, wait until at least a result is delivered
+        """
+        if not self.pending:
+            return
+
+        if self.ordered:
+            if block:
+                wait([self.pending[0][0]])
+
+            # The results are delivered only after all the previous ones
+            while self.pending and self.pending[0][0].done():
+                self.deliver(*self.pending.popleft())
+        else:
+            if block:
+                wait([future for future, slot in self.pending], return_when=FIRST_COMPLETED)
+
+            for future, slot in list(self.pending):
+                if future.done():
+                    self.pending.remove((future, slot))
+                    self.deliver(future, slot)
+
+    def deliver(self, future, slot):
+        """
+        Notify the result of a processed sample and free its slot
+        """
+        try:
+            result = future.result()
+        finally:
+            self.free_slots.append(slot)
+
+        if self.is_predictor:
+            for gesture_id, confidence in result:
+                self.stage.notify_callbacks(gesture_id, confidence)
+        elif result is not None:
+            shape, dtype, data, gesture_id, end_frame, device_id, axes = result
+
+            # The data of the slot is copied before the slot is reused, the pickled data is already a copy
+            from_slot = data is None
+            if from_slot:
+                data = get_slot(self.output_memory, slot, self.slot_size, shape, dtype)
+
+            sample = Sample(data=data, gesture_id=gesture_id, device_id=device_id, axes=axes, copy=from_slot)
+            sample.end_frame = end_frame
+
+            self.notify_receivers(sample)
+
+    def flush(self):
+        """
+        Wait for all the samples being processed and deliver their results
+        """
+        while self.pending:
+            self.collect(block=True)
+
+    def close(self):
+        """
+        Deliver the pending results, stop the worker processes and release the shared memory
+        """
+        try:
+            self.flush()
+        finally:
+            self.finalizer()
@@ -0,0 +1,256 @@
+"""
+Compilation of chains and graphs of stages into a single function.
+Without a Pipeline, each stage receives the sample, processes it, checks if it has been suppressed
+and cycles through its receivers. A Pipeline generates the code that calls the process_sample method
+of every middleware directly, so a sample goes through the whole graph with a single call.
+"""
+import time
+from pygarl.abstracts import AbstractMiddleware, Receiver
+
+
+def is_inlinable(stage):
+    """
+    Return True if the stage is a middleware that uses the default receive_sample,
+    so that its process_sample method can be called directly by the compiled code.
+    """
+    return isinstance(stage, AbstractMiddleware) and \
+        getattr(type(stage).receive_sample, "__func__", type(stage).receive_sample) is \
+        getattr(AbstractMiddleware.receive_sample, "__func__", AbstractMiddleware.receive_sample)
+
+
+class Pipeline(Receiver):
+    """
+    Graph of stages compiled into a single function.
+    The middlewares are called with process_sample, and a None result suppresses the sample for the
+    following stages, as it happens when they notify their receivers. The other stages, such as the
+    predictors and the recorders, are called with receive_sample and end their branch of the graph.
+    When a stage has more than one following stage, each of them receives its own view of the sample.
+
+    The Pipeline is a Receiver, so it can be attached to a sample manager in place of the first stages.
+    The stages are bound when the pipeline is compiled: adding a stage compiles it again, while
+    the receivers attached to the middlewares after adding them are ignored.
+    """
+    def __init__(self, timing=False):
+        """
+        :param timing: if True, the compiled code measures the time spent in each stage
+        """
+        Receiver.__init__(self)
+
+        self.timing = timing
+
+        # List of the stages and, for each stage, the indexes of the following ones
+        self.stages = []
+        self.children = []
+
+        # Indexes of the stages that receive the samples of the pipeline
+        self.roots = []
+
+        # Source code of the compiled function, generated when the first sample is received
+        self.source = None
+
+        self.reset_stats()
+
+    @classmethod
+    def chain(cls, stages, timing=False):
+        """
+        Create a pipeline where each stage receives the samples of the previous one
+
+        :param stages: list of stages, all of them but the last must be middlewares
+        """
+        pipeline = cls(timing=timing)
+
+        previous = None
+        for stage in stages:
+            pipeline.add_stage(stage, after=previous)
+            previous = stage
+
+        return pipeline
+
+    @classmethod
+    def from_receivers(cls, sender, timing=False):
+        """
+        Create a pipeline from the graph already built by attaching the receivers, starting
+        from the receivers of the sender, for example a sample manager.
+        The receivers of the middlewares are followed, the other stages end their branch.
+        """
+        pipeline = cls(timing=timing)
+
+        # Stages to visit, together with the stage they follow
+        pending = [(receiver, None) for receiver in sender.receivers]
+
+        while pending:
+            stage, parent = pending.pop(0)
+
+            is_new = pipeline.get_index(stage) is None
+            pipeline.add_stage(stage, after=parent)
+
+            if is_new and is_inlinable(stage):
+                pending.extend((receiver, stage) for receiver in stage.receivers)
+
+        return pipeline
+
+    def get_index(self, stage):
+        """
+        Return the index of the stage in the pipeline, or None if it has not been added
+        """
+        for index, added_stage in enumerate(self.stages):
+            if added_stage is stage:
+                return index
+
+        return None
+
+    def add_stage(self, stage, after=None):
+        """
+        Add a stage to the pipeline
+
+        :param stage: middleware or receiver
+        :param after: stage, or list of stages, whose output is received by the stage.
+                      If None, the stage receives the samples of the pipeline.
+        :return: the added stage
+        """
+        index = self.get_index(stage)
+
+        if index is None:
+            index = len(self.stages)
+            self.stages.append(stage)
+            self.children.append([])
+
+        if after is None:
+            parents = []
+            if index not in self.roots:
+                self.roots.append(index)
+        elif isinstance(after, (list, tuple)):
+            parents = after
+        else:
+            parents = [after]
+
+        for parent in parents:
+            parent_index = self.get_index(parent)
+
+            if parent_index is None:
+                raise ValueError("The previous stage must be added to the pipeline first")
+
+            if not is_inlinable(parent):
+                raise ValueError("{stage} doesn't return the processed samples, so it must be the last stage"
+                                 .format(stage=type(parent).__name__))
+
+            if index not in self.children[parent_index]:
+                self.children[parent_index].append(index)
+
+        # The pipeline must be compiled again, with the statistics of the new stage
+        self.reset_stats()
+
+        return stage
+
+    def reset_stats(self):
+        """
+        Reset the number of calls and the time spent in each stage
+        """
+        self.calls = [0] * len(self.stages)
+        self.durations = [0.0] * len(self.stages)
+
+        # The compiled function updates the lists it has been compiled with, so it must be compiled again
+        self.function = None
+
+    def compile(self):
+        """
+        Generate and compile the function that sends a sample through the whole graph
+
+        :return: the compiled function, that receives a Sample
+        """
+        namespace = {
+            'perf_counter': time.perf_counter,
+            'calls': self.calls,
+            'durations': self.durations,
+        }
+
+        for index, stage in enumerate(self.stages):
+            if is_inlinable(stage):
+                namespace['process_{index}'.format(index=index)] = stage.process_sample
+            else:
+                namespace['receive_{index}'.format(index=index)] = stage.receive_sample
+
+        # Counter used to give a different name to the output of each call
+        self.variables_count = 0
+
+        lines = ["def run_pipeline(sample):"]
+        self.generate_stages(self.roots, "sample", 1, [], lines)
+
+        if len(lines) == 1:
+            lines.append("    pass")
+
+        self.source = "\n".join(lines) + "\n"
+
+        exec(compile(self.source, "<pygarl pipeline>", "exec"), namespace)
+        self.function = namespace['run_pipeline']
+
+        return self.function
+
+    def generate_stages(self, indexes, argument, depth, path, lines):
+        """
+        Append to lines the code that sends the argument to the given stages
+        """
+        for index in indexes:
+            # Each stage of a branch receives its own view of the sample
+            stage_argument = argument + ".share()" if len(indexes) > 1 else argument
+
+            self.generate_stage(index, stage_argument, depth, path, lines)
+
+    def generate_stage(self, index, argument, depth, path, lines):
+        """
+        Append to lines the code that calls a stage and, if it's a middleware, the following stages
+        when the sample has not been suppressed
+        """
+        if index in path:
+            raise ValueError("The stages of the pipeline contain a cycle")
+
+        indent = "    " * depth
+        inlinable = is_inlinable(self.stages[index])
+
+        if inlinable:
+            variable = "sample_{count}".format(count=self.variables_count)
+            self.variables_count += 1
+
+            call = "{variable} = process_{index}({argument})".format(variable=variable, index=index,
+                                                                      argument=argument)
+        else:
+            variable = None
+            call = "receive_{index}({argument})".format(index=index, argument=argument)
+
+        if self.timing:
+            lines.append(indent + "start = perf_counter()")
+            lines.append(indent + call)
+            lines.append(indent + "durations[{index}] += perf_counter() - start".format(index=index))
+            lines.append(indent + "calls[{index}] += 1".format(index=index))
+        else:
+            lines.append(indent + call)
+
+        # A suppressed sample doesn't reach the following stages
+        if inlinable and self.children[index]:
+            lines.append(indent + "if {variable} is not None:".format(variable=variable))
+            self.generate_stages(self.children[index], variable, depth + 1, path + [index], lines)
+
+    def receive_sample(self, sample):
+        if self.function is None:
+            self.compile()
+
+        self.function(sample)
+
+    def get_stats(self):
+        """
+        Return a list containing, for each stage, the number of calls and the time spent in it.
+        The time of the stages called with receive_sample includes the time of their receivers.
+        Available only if the pipeline has been created with timing=True.
+        """
+        stats = []
+        for index, stage in enumerate(self.stages):
+            calls = self.calls[index]
+
+            stats.append({
+                'stage': type(stage).__name__,
+                'calls': calls,
+                'total_time': self.durations[index],
+                'average_latency': self.durations[index] / calls if calls > 0 else 0.0,
+            })
+
+        return stats
@@ -0,0 +1,15 @@
+from __future__ import print_function
+from pygarl.config import PipelineSpec
+
+
+def run_pipeline(spec_file):
+    """
+    Build the pipeline described by a JSON or TOML specification and start reading the data
+    """
+    print("LOADING PIPELINE:", spec_file)
+
+    pipeline = PipelineSpec.from_file(spec_file).build()
+
+    print("STAGES:", len(pipeline.stages), "SHARED:", pipeline.get_shared_count())
+
+    pipeline.mainloop()
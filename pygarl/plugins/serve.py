@@ -0,0 +1,36 @@
+from __future__ import print_function
+from pygarl.classifiers import SVMClassifier, MLPClassifier, OnlineClassifier, DistilledClassifier, \
+    ApproxKernelSVMClassifier, DTWClassifier
+from pygarl.server import GestureServer
+
+# Classifiers that can be served, by name
+CLASSIFIERS = {
+    "svm": SVMClassifier,
+    "mlp": MLPClassifier,
+    "approx": ApproxKernelSVMClassifier,
+    "online": OnlineClassifier,
+    "dtw": DTWClassifier,
+    "distilled": DistilledClassifier,
+}
+
+
+def serve_model(model_file, classifier="svm", address=None, window=20, step=10, workers=2, batch_size=16,
+                max_latency=0.005):
+    """
+    Load a model and serve its predictions on a local socket, until Ctrl+C is pressed
+
+    :param address: path of a Unix domain socket, or a tuple ( host, port ) for TCP
+    """
+    if classifier not in CLASSIFIERS:
+        raise ValueError("{classifier} is not a valid classifier".format(classifier=classifier))
+
+    print("LOADING MODEL:", model_file)
+
+    model = CLASSIFIERS[classifier](model_path=model_file)
+    model.load()
+
+    print("GESTURES:", ", ".join(str(gesture) for gesture in model.gestures))
+
+    server = GestureServer(model, address, window=window, step=step, workers=workers, batch_size=batch_size,
+                           max_latency=max_latency, verbose=True)
+    server.serve_forever()
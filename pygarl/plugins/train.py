@@ -1,5 +1,6 @@
 from __future__ import print_function
-from pygarl.classifiers import SVMClassifier, MLPClassifier
+from pygarl.classifiers import SVMClassifier, MLPClassifier, OnlineClassifier, DistilledClassifier, \
+    ApproxKernelSVMClassifier
 import sys
 
 
@@ -58,6 +59,82 @@ def train_mlp_classifier(dataset_dir, output_file, n_jobs=1):
     train_classifier(classifier=classifier, dataset_dir=dataset_dir, output_file=output_file, n_jobs=n_jobs)
 
 
+def train_approx_svm_classifier(dataset_dir, output_file, n_jobs=1):
+    """
+    Train an SVM model on an approximated RBF kernel from the given dataset and save it to a file.
+    """
+    # Create the classifier
+    classifier = ApproxKernelSVMClassifier(dataset_path=dataset_dir, verbose=True, n_jobs=n_jobs,
+                                           autoscale_size=50)
+
+    # Train the classifier
+    train_classifier(classifier=classifier, dataset_dir=dataset_dir, output_file=output_file, n_jobs=n_jobs)
+
+
+def train_online_classifier(dataset_dir, output_file, n_jobs=1):
+    """
+    Train an incremental model from the given dataset and save it to a file.
+    The dataset is read from disk in chunks, so it doesn't need to fit in memory.
+    The model can be later updated with new samples without retraining it from scratch.
+    """
+    # Create the classifier
+    classifier = OnlineClassifier(dataset_path=dataset_dir, verbose=True, autonormalize=True,
+                                  autoscale_size=50)
+
+    print("Training the model...")
+
+    # Train the model reading the dataset in chunks and obtain the score
+    score = classifier.train_streaming()
+
+    print("FINAL SCORE:", score)
+
+    print("Saving the model to the output file:", output_file)
+
+    classifier.save_model(output_file)
+
+    print("DONE")
+
+
+def update_online_classifier(dataset_dir, model_file):
+    """
+    Update an incremental model with the samples of the dataset that it has not learned yet.
+    """
+    # Load the existing model
+    classifier = OnlineClassifier(model_path=model_file, verbose=True)
+    classifier.load()
+
+    # Learn the new samples
+    count = classifier.update_from_dataset(dataset_dir)
+    print("LEARNED SAMPLES:", count)
+
+    # Save the updated model
+    classifier.save_model(model_file)
+
+    print("DONE")
+
+
+def distill_classifier(dataset_dir, teacher_file, output_file, teacher_classifier="svm", student="mlp"):
+    """
+    Train a compact model that mimics a trained model and save it to a file,
+    printing the comparison of the accuracy and latency of the two models.
+    """
+    # Load the teacher model
+    if teacher_classifier == "svm":
+        teacher = SVMClassifier(model_path=teacher_file)
+    elif teacher_classifier == "mlp":
+        teacher = MLPClassifier(model_path=teacher_file)
+    else:
+        raise ValueError("{classifier} is not a valid classifier".format(classifier=teacher_classifier))
+
+    teacher.load()
+
+    # Create the student, that uses the same preprocessing of the teacher
+    classifier = DistilledClassifier(teacher=teacher, student=student, dataset_path=dataset_dir, verbose=True)
+
+    # Train the classifier
+    train_classifier(classifier=classifier, dataset_dir=dataset_dir, output_file=output_file)
+
+
 # If launched directly, parse the parameters from sys
 if __name__ == '__main__':
     train_svm_classifier(sys.argv[0], sys.argv[1], 8)
@@ -1,8 +1,62 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
 from pygarl.base import Sample
-from pygarl.abstracts import AbstractGesturePredictor
+from pygarl.abstracts import AbstractGesturePredictor, ControlSignal, get_axes_columns
+from pygarl.dtw import SpringMatcher
+import numpy as np
 import scipy as sp
 
 
+def select_new_frames(sample, consumed_frames):
+    """
+    Return the frames of a sample sent by a StreamSampleManager that follow the
+    consumed_frames already processed, and the new number of consumed frames.
+    Consecutive windows overlap, and the partial window sent on STOP can contain
+    only frames that have already been processed.
+    """
+    frames = sample.data
+    new_frames = min(max(0, sample.end_frame - consumed_frames), frames.shape[0])
+
+    return frames[frames.shape[0] - new_frames:], max(consumed_frames, sample.end_frame)
+
+
+def predict_batch(classifier, samples):
+    """
+    Return a tuple ( gesture_id, confidence ) for each sample.
+    If the classifier estimates the probabilities and the processed samples have the same length,
+    they are classified with a single call.
+    """
+    # The samples are processed once, also when they must be classified one at a time
+    processed = [classifier.preprocess_sample(sample.share()) for sample in samples]
+    rows = [sample.get_linearized(one_dimensional=True) for sample in processed]
+
+    if len(set(row.size for row in rows)) == 1:
+        try:
+            probabilities = classifier.predict_linearized_proba(np.array(rows))
+        except NotImplementedError:
+            probabilities = None
+
+        if probabilities is not None:
+            internal_ids = np.argmax(probabilities, axis=1)
+            return [(classifier.gestures[internal_id], float(row[internal_id]))
+                    for internal_id, row in zip(internal_ids, probabilities)]
+
+    return [classifier.predict_sample_with_confidence(sample) for sample in processed]
+
+
+def get_modification_time(file_path):
+    """
+    Return the modification time of a file, or None if it doesn't exist
+    """
+    try:
+        return os.stat(file_path).st_mtime_ns
+    except OSError:
+        return None
+
+
 class HighestAxisPredictor(AbstractGesturePredictor):
     """
     Return the Axis index with the greatest value.
@@ -46,13 +100,43 @@ class HighestAxisPredictor(AbstractGesturePredictor):
 class ClassifierPredictor(AbstractGesturePredictor):
     """
     Uses a Classifier to predict at which gesture the sample belongs to.
+
+    The classifier can be replaced while the predictor is running: reload_model loads a new model in a
+    background thread and then swaps it in, and watch_model reloads the model when its file changes.
+    Each prediction keeps a reference to the classifier it started with, so the predictions in
+    progress finish on the old model.
+    A new model can also be loaded as a shadow: it classifies a copy of the live samples in a background
+    thread, its disagreements with the live model are counted and promote_shadow makes it live.
     """
-    # TODO: Tests
-    def __init__(self, classifier):
+    def __init__(self, classifier, with_confidence=False, max_shadow_backlog=256):
+        """
+        :param classifier: a trained classifier
+        :param with_confidence: if True, the probability of the predicted gesture is notified
+                                to the callbacks, for example to be used by a GestureSmoother.
+        :param max_shadow_backlog: maximum number of samples waiting to be classified by the shadow model,
+                                   when reached the following samples are not compared.
+        """
         AbstractGesturePredictor.__init__(self)
 
         # Set the parameters
         self.classifier = classifier
+        self.with_confidence = with_confidence
+        self.max_shadow_backlog = max_shadow_backlog
+
+        # Number of times the classifier has been replaced
+        self.model_version = 0
+
+        # Exception raised by the last background reload, None if it succeeded
+        self.reload_error = None
+
+        # The threads, and the queue of the shadow model, are created only when needed,
+        # so that the predictor can be copied to other processes
+        self.shadow = None
+        self.shadow_queue = None
+        self.shadow_thread = None
+        self.shadow_stats = None
+        self.watch_thread = None
+        self.watch_stop = None
 
     def predict(self, sample):
         """
@@ -60,4 +144,1120 @@ class ClassifierPredictor(AbstractGesturePredictor):
         :param sample: sample to predict
         :return: a string containing the gesture_id
         """
-        return self.classifier.predict(sample)
+        # The classifier is read once, so the prediction finishes on it even if it is replaced meanwhile
+        gesture_id = self.classifier.predict(sample)
+
+        if self.shadow is not None:
+            self.send_to_shadow(sample, gesture_id)
+
+        return gesture_id
+
+    def predict_with_confidence(self, sample):
+        """
+        Predict the received sample, returning a tuple ( gesture_id, confidence ).
+        The confidence is None if with_confidence is False.
+        """
+        if self.with_confidence:
+            gesture_id, confidence = self.classifier.predict_with_confidence(sample)
+
+            if self.shadow is not None:
+                self.send_to_shadow(sample, gesture_id)
+
+            return gesture_id, confidence
+
+        return self.predict(sample), None
+
+    def swap_classifier(self, classifier):
+        """
+        Replace the classifier used for the following predictions
+        """
+        self.classifier = classifier
+        self.model_version += 1
+
+    def load_classifier(self, model_path=None):
+        """
+        Create and load a classifier of the same type of the current one
+
+        :param model_path: path of the model file, if None the model path of the current classifier is used
+        """
+        if model_path is None:
+            model_path = self.classifier.model_path
+
+        classifier = type(self.classifier)(model_path=model_path)
+        classifier.load()
+
+        return classifier
+
+    def reload_model(self, model_path=None, shadow=False, wait=False):
+        """
+        Load a model in a background thread and use it when it's ready, without stopping the predictions.
+        If the loading fails, the current classifier is kept and the exception is saved in reload_error.
+
+        :param model_path: path of the model file, if None the model path of the current classifier is used
+        :param shadow: if True, the new model is started as a shadow instead of replacing the live one
+        :param wait: if True, wait until the model is loaded
+        :return: the loading thread
+        """
+        thread = threading.Thread(target=self.load_in_background, args=(model_path, shadow))
+        thread.daemon = True
+        thread.start()
+
+        if wait:
+            thread.join()
+
+        return thread
+
+    def load_in_background(self, model_path, shadow):
+        try:
+            classifier = self.load_classifier(model_path)
+        except Exception as error:
+            self.reload_error = error
+            return
+
+        self.reload_error = None
+
+        if shadow:
+            self.start_shadow(classifier)
+        else:
+            self.swap_classifier(classifier)
+
+    def watch_model(self, model_path=None, interval=1.0, shadow=False):
+        """
+        Reload the model every time its file is modified, checking it every interval seconds.
+        The model is reloaded once its modification time has been stable for an interval,
+        so that a file still being written is not loaded.
+
+        :param model_path: path of the model file, if None the model path of the current classifier is used
+        :param shadow: if True, the modified models are started as shadows instead of replacing the live one
+        """
+        if self.watch_thread is not None:
+            raise RuntimeError("The model is already being watched")
+
+        if model_path is None:
+            model_path = self.classifier.model_path
+
+        self.watch_stop = threading.Event()
+        self.watch_thread = threading.Thread(target=self.watch_loop, args=(model_path, interval, shadow))
+        self.watch_thread.daemon = True
+        self.watch_thread.start()
+
+    def watch_loop(self, model_path, interval, shadow):
+        loaded_time = get_modification_time(model_path)
+        previous_time = loaded_time
+
+        while not self.watch_stop.wait(interval):
+            modification_time = get_modification_time(model_path)
+
+            if modification_time is not None and modification_time != loaded_time \
+                    and modification_time == previous_time:
+                loaded_time = modification_time
+                self.load_in_background(model_path, shadow)
+
+            previous_time = modification_time
+
+    def stop_watching(self):
+        if self.watch_thread is None:
+            return
+
+        self.watch_stop.set()
+        self.watch_thread.join()
+        self.watch_thread = None
+
+    def start_shadow(self, classifier):
+        """
+        Classify a copy of the following samples with the given classifier too, in a background thread,
+        and count its disagreements with the live classifier. The live predictions are not delayed.
+        """
+        self.stop_shadow()
+
+        self.shadow_stats = {
+            'samples': 0,
+            'disagreements': 0,
+            'dropped': 0,
+            'errors': 0,
+            'total_time': 0.0,
+            # Number of samples for each pair ( live gesture, shadow gesture ) that disagree
+            'pairs': {},
+        }
+        self.shadow_queue = queue.Queue(maxsize=self.max_shadow_backlog)
+        self.shadow_thread = threading.Thread(target=self.shadow_loop, args=(classifier, self.shadow_queue))
+        self.shadow_thread.daemon = True
+        self.shadow_thread.start()
+
+        self.shadow = classifier
+
+    def send_to_shadow(self, sample, gesture_id):
+        try:
+            self.shadow_queue.put_nowait((sample.share(), gesture_id))
+        except queue.Full:
+            # The shadow model is too slow, the sample is not compared
+            self.shadow_stats['dropped'] += 1
+        except AttributeError:
+            # The shadow has been stopped by another thread
+            pass
+
+    def shadow_loop(self, classifier, samples):
+        while True:
+            item = samples.get()
+
+            # None is sent to stop the thread
+            if item is None:
+                return
+
+            sample, live_gesture = item
+
+            stats = self.shadow_stats
+            start_time = time.time()
+
+            try:
+                shadow_gesture = classifier.predict(sample)
+            except Exception:
+                stats['errors'] += 1
+                samples.task_done()
+                continue
+
+            stats['total_time'] += time.time() - start_time
+            stats['samples'] += 1
+
+            if shadow_gesture != live_gesture:
+                stats['disagreements'] += 1
+                pair = (live_gesture, shadow_gesture)
+                stats['pairs'][pair] = stats['pairs'].get(pair, 0) + 1
+
+            samples.task_done()
+
+    def stop_shadow(self):
+        """
+        Stop the shadow model, if any, and return it
+        """
+        shadow = self.shadow
+
+        if shadow is None:
+            return None
+
+        self.shadow = None
+        self.shadow_queue.put(None)
+        self.shadow_thread.join()
+        self.shadow_queue = None
+        self.shadow_thread = None
+
+        return shadow
+
+    def wait_shadow(self):
+        """
+        Wait until the shadow model has classified all the samples sent to it
+        """
+        if self.shadow_queue is not None:
+            self.shadow_queue.join()
+
+    def get_shadow_stats(self):
+        """
+        Return a dictionary with the number of samples compared with the shadow model, the disagreements,
+        their rate, the samples dropped, the failed predictions, the average time of a shadow prediction and the number of
+        disagreements for each pair ( live gesture, shadow gesture ).
+        Return None if no shadow has been started.
+        """
+        if self.shadow_stats is None:
+            return None
+
+        stats = dict(self.shadow_stats)
+        stats['pairs'] = dict(stats['pairs'])
+        stats['disagreement_rate'] = stats['disagreements'] / float(stats['samples']) if stats['samples'] > 0 else 0.0
+        stats['average_time'] = stats['total_time'] / stats['samples'] if stats['samples'] > 0 else 0.0
+
+        return stats
+
+    def promote_shadow(self):
+        """
+        Stop the shadow model and make it the live one
+        """
+        shadow = self.stop_shadow()
+
+        if shadow is None:
+            raise RuntimeError("There is no shadow model to promote")
+
+        self.swap_classifier(shadow)
+
+
+class SpringPredictor(AbstractGesturePredictor):
+    """
+    Spots gestures directly in a stream of frames, using the streaming subsequence DTW ( SPRING ).
+    Every frame updates the DTW column of each template, with no re-scanning of the history,
+    and a gesture is notified to the callbacks as soon as its match is confirmed.
+    It doesn't need a segmentation middleware, so it can detect low-energy gestures too.
+
+    It can be attached to a DataReader as a manager, receiving the raw frames, or to a
+    SampleManager as a receiver.
+    The templates must be in the same unit of the received frames, they are not normalized.
+    """
+    def __init__(self, templates, threshold=1.0, window_step=None, max_matches=100):
+        """
+        :param templates: list of Samples with a gesture_id, more templates can share the same gesture.
+        :param threshold: maximum average squared distance per template frame of a match.
+                          It can be a dictionary that associates a threshold to each gesture_id.
+        :param window_step: when receiving overlapping samples that don't have an end_frame,
+                            set it to the number of new frames of each sample.
+                            If None, all the frames of each received sample are processed.
+                            The samples of a StreamSampleManager are handled automatically.
+        :param max_matches: number of recent matches kept in self.matches
+        """
+        AbstractGesturePredictor.__init__(self)
+
+        self.threshold = threshold
+        self.window_step = window_step
+
+        # Create a matcher for each template
+        self.matchers = []
+        for template in templates:
+            self.matchers.append((template.gesture_id,
+                                  SpringMatcher(template.data, self.get_threshold(template.gesture_id))))
+
+        # Recent matches, as tuples ( gesture_id, start frame, end frame, distance )
+        self.matches = deque(maxlen=max_matches)
+
+        # Last frame of the last match of each gesture, used to report overlapping matches once
+        self.last_match_end = {}
+
+        # True after the first sample has been received
+        self.has_received_windows = False
+
+        # Number of frames of the StreamSampleManager stream already processed
+        self.consumed_frames = 0
+
+    def get_threshold(self, gesture_id):
+        """
+        Return the threshold associated with the given gesture_id
+        """
+        if isinstance(self.threshold, dict):
+            return self.threshold[gesture_id]
+
+        return self.threshold
+
+    def reset(self):
+        """
+        Forget the stream received so far
+        """
+        for gesture_id, matcher in self.matchers:
+            matcher.reset()
+
+        self.last_match_end = {}
+        self.has_received_windows = False
+
+    def process_frame(self, frame):
+        """
+        Update all the templates with a new frame and notify the confirmed matches
+
+        :param frame: list containing a value for each axis
+        """
+        frame = np.asarray(frame, dtype=float)
+
+        for gesture_id, matcher in self.matchers:
+            match = matcher.update(frame)
+
+            if match is not None:
+                self.report_match(gesture_id, match)
+
+    def report_match(self, gesture_id, match):
+        """
+        Record a match and notify the gesture to the callbacks.
+        Matches of the same gesture that overlap the last reported one, found by
+        other templates, are ignored.
+        """
+        start, end, distance = match
+
+        if start <= self.last_match_end.get(gesture_id, -1):
+            return
+
+        self.last_match_end[gesture_id] = end
+        self.matches.append((gesture_id, start, end, distance))
+
+        self.notify_callbacks(gesture_id)
+
+    def receive_data(self, data):
+        """
+        Called from a DataReader when new data is available
+        """
+        self.process_frame(data)
+
+    def receive_signal(self, signal):
+        """
+        Called from a DataReader when a signal is received. The stream is analysed continuously,
+        so the signals are ignored, except OVERRUN: the frames following the lost ones are not
+        contiguous with the previous ones, so the matching restarts.
+        """
+        if signal == ControlSignal.OVERRUN:
+            self.reset()
+
+    def receive_sample(self, sample):
+        """
+        Process the frames of a sample received from a SampleManager
+        """
+        frames = sample.data
+
+        if sample.end_frame is not None:
+            # Process only the frames of the stream that haven't been processed yet
+            frames, self.consumed_frames = select_new_frames(sample, self.consumed_frames)
+        elif self.window_step is not None and self.has_received_windows:
+            # After the first window, only the last window_step frames are new
+            frames = frames[-self.window_step:]
+
+        self.has_received_windows = True
+
+        for frame in frames:
+            self.process_frame(frame)
+
+    def predict(self, sample):
+        """
+        Return the gesture whose template best matches a subsequence of the sample,
+        or None if no template matches. The state of the stream is not modified.
+        """
+        best_gesture = None
+        best_distance = np.inf
+
+        for gesture_id, matcher in self.matchers:
+            # Use a new matcher, so that the stream state is left untouched
+            offline_matcher = SpringMatcher(matcher.template, matcher.threshold)
+
+            matches = [offline_matcher.update(frame) for frame in sample.data]
+            matches.append(offline_matcher.flush())
+
+            for match in matches:
+                # Compare the distances normalized by the template length
+                if match is not None and match[2] / len(matcher.template) < best_distance:
+                    best_distance = match[2] / len(matcher.template)
+                    best_gesture = gesture_id
+
+        return best_gesture
+
+
+class SlidingWindowPredictor(AbstractGesturePredictor):
+    """
+    Spots gestures by classifying every window of a stream of frames with the classifier
+    probabilities, without an energy-based segmentation.
+    The detections with a confidence above the threshold that overlap in time are merged
+    with a non-maximum suppression, so each gesture is notified once, when the following
+    windows don't overlap it anymore.
+
+    To keep the throughput high, the windows are classified in batches with a single call to the
+    classifier and the frames are converted only once, even if they belong to many windows.
+    If the classifier has no middlewares, the normalization and scaling are also made on the whole
+    batch, with the scaling matrix computed once.
+
+    It replaces the StreamSampleManager: attach it to a DataReader as a manager. It can also receive
+    the samples of a StreamSampleManager with the same window and step, in that case only the new
+    frames of each window are used.
+    """
+    def __init__(self, classifier, window=20, step=5, batch_size=8, threshold=0.8, ignored_gestures=None,
+                 target_windows_per_second=None):
+        """
+        :param classifier: a trained classifier that implements predict_linearized_proba
+        :param window: number of frames of each window
+        :param step: number of frames between the start of two consecutive windows
+        :param batch_size: number of windows classified together. Larger batches increase the
+                           throughput, but delay the detections of batch_size * step frames.
+        :param threshold: minimum probability of a detection
+        :param ignored_gestures: list of gesture_ids that are never notified, for example a
+                                 "background" gesture trained with idle data.
+        :param target_windows_per_second: minimum throughput required, checked by meets_target.
+                                          With a step of S frames and a sensor sampling at F Hz,
+                                          the predictor must classify at least F / S windows per second.
+        """
+        AbstractGesturePredictor.__init__(self)
+
+        # Step size must be lower or equal to the window size, if not, raise an exception
+        if step > window:
+            raise ValueError("Step size must be lower or equal to the window size.")
+
+        self.classifier = classifier
+        self.window = window
+        self.step = step
+        self.batch_size = batch_size
+        self.threshold = threshold
+        self.ignored_gestures = ignored_gestures if ignored_gestures is not None else []
+        self.target_windows_per_second = target_windows_per_second
+
+        # Buffer of the received frames, allocated when the first frame is received.
+        # It must contain all the windows waiting to be classified
+        self.capacity = window + step * batch_size
+        self.buffer = None
+        self.buffer_start = 0  # Index in the stream of the first frame in the buffer
+        self.buffer_count = 0  # Number of frames in the buffer
+
+        # Index in the stream of the next window and of the windows waiting to be classified
+        self.next_window_start = 0
+        self.pending_windows = []
+
+        # Detection waiting for the non-maximum suppression, as ( start, end, gesture_id, confidence ),
+        # and the last frame of the detections merged with it
+        self.pending_detection = None
+        self.pending_end = None
+
+        # Matrix used to scale the windows, computed when needed
+        self.scale_matrix = None
+
+        # True after the first sample has been received
+        self.has_received_windows = False
+
+        # Number of frames of the StreamSampleManager stream already processed
+        self.consumed_frames = 0
+
+        # Indexes of the axis of the received frames, None if they contain all the axis.
+        # Set by the DataReader, or by the received samples
+        self.axes = None
+
+        # Statistics used to calculate the throughput
+        self.processed_windows = 0
+        self.processing_time = 0.0
+
+    def receive_data(self, data):
+        """
+        Called from a DataReader when a new frame is available
+        """
+        frame = np.asarray(data, dtype=float)
+
+        # Allocate the buffer, now that the number of axis is known
+        if self.buffer is None:
+            self.buffer = np.empty((self.capacity, frame.size))
+
+        # If the buffer is full, delete the frames that are not needed anymore
+        if self.buffer_count == self.capacity:
+            self.compact_buffer()
+
+        self.buffer[self.buffer_count] = frame
+        self.buffer_count += 1
+
+        # Check if a new window is complete
+        if self.buffer_start + self.buffer_count >= self.next_window_start + self.window:
+            self.pending_windows.append(self.next_window_start)
+            self.next_window_start += self.step
+
+            # Classify the windows when the batch is complete
+            if len(self.pending_windows) >= self.batch_size:
+                self.process_windows()
+
+    def compact_buffer(self):
+        """
+        Delete the frames before the first window that has yet to be classified
+        """
+        if len(self.pending_windows) > 0:
+            first_needed = self.pending_windows[0]
+        else:
+            first_needed = self.next_window_start
+
+        drop = first_needed - self.buffer_start
+        self.buffer[:self.buffer_count - drop] = self.buffer[drop:self.buffer_count]
+        self.buffer_count -= drop
+        self.buffer_start = first_needed
+
+    def receive_signal(self, signal):
+        """
+        Called from a DataReader when a signal is received.
+        When the stream stops or times out, the waiting windows and detections are processed.
+        When frames are lost, the windows restart after the gap.
+        """
+        if signal == ControlSignal.STOP or signal == ControlSignal.TIMEOUT:
+            self.flush()
+        elif signal == ControlSignal.OVERRUN:
+            self.restart_windows()
+
+    def restart_windows(self):
+        """
+        Classify the complete windows, then clear the buffer, so that the next window starts
+        from the next frame and doesn't span the lost frames
+        """
+        self.flush()
+
+        self.buffer_start += self.buffer_count
+        self.buffer_count = 0
+        self.next_window_start = self.buffer_start
+
+        self.has_received_windows = False
+        self.consumed_frames = 0
+
+    def receive_sample(self, sample):
+        """
+        Receive a window from a StreamSampleManager with the same window and step
+        """
+        frames = sample.data
+        self.axes = sample.axes
+
+        if sample.end_frame is not None:
+            # Use only the frames of the stream that haven't been received yet
+            frames, self.consumed_frames = select_new_frames(sample, self.consumed_frames)
+        elif self.has_received_windows:
+            # After the first window, only the last step frames are new
+            frames = frames[-self.step:]
+
+        self.has_received_windows = True
+
+        for frame in frames:
+            self.receive_data(frame)
+
+    def preprocess_windows(self, windows):
+        """
+        Apply the classifier preprocessing to a batch of windows and linearize them
+
+        :param windows: array ( windows x frames x axis )
+        :return: 2-dimensional array, each row is a linearized window
+        """
+        # Middlewares work on single samples, so each window is processed separately
+        if len(self.classifier.middlewares) > 0:
+            rows = []
+            for window in windows:
+                sample = self.classifier.preprocess_sample(Sample(data=window, axes=self.axes))
+                rows.append(sample.get_linearized(one_dimensional=True))
+            return np.array(rows)
+
+        # Keep only the axis used by the classifier
+        if self.classifier.axes is not None:
+            windows = windows[:, :, get_axes_columns(self.classifier.axes, self.axes)]
+
+        # Normalize each axis of each window, as sklearn.preprocessing.scale does
+        if self.classifier.autonormalize:
+            std = windows.std(axis=1, keepdims=True)
+            std[std == 0] = 1
+            windows = (windows - windows.mean(axis=1, keepdims=True)) / std
+
+        # Scale all the windows with the same matrix
+        if self.classifier.autoscale_size is not None:
+            if self.scale_matrix is None:
+                self.scale_matrix = Sample.get_scale_matrix(self.window, self.classifier.autoscale_size,
+                                                            windows.shape[2])
+            windows = np.einsum("nw,bwa->bna", self.scale_matrix, windows)
+
+        rows = windows.reshape(len(windows), -1)
+
+        # The trainable middlewares work on linearized samples, so they can transform the whole batch
+        for middleware in self.classifier.trainable_middlewares:
+            rows = middleware.transform_linearized(rows)
+
+        return rows
+
+    def process_windows(self):
+        """
+        Classify the windows waiting in the buffer and merge the detections
+        """
+        if len(self.pending_windows) == 0:
+            return
+
+        start_time = time.time()
+
+        # Extract the windows from the buffer
+        starts = np.array(self.pending_windows)
+        indexes = (starts - self.buffer_start)[:, np.newaxis] + np.arange(self.window)
+        windows = self.buffer[indexes]
+
+        # Classify all the windows with a single call
+        probabilities = self.classifier.predict_linearized_proba(self.preprocess_windows(windows))
+
+        self.pending_windows = []
+
+        for start, window_probabilities in zip(starts, probabilities):
+            internal_id = int(np.argmax(window_probabilities))
+            confidence = window_probabilities[internal_id]
+            gesture_id = self.classifier.gestures[internal_id]
+
+            if confidence >= self.threshold and gesture_id not in self.ignored_gestures:
+                self.add_detection((start, start + self.window, gesture_id, confidence))
+            elif self.pending_detection is not None and start >= self.pending_end:
+                # The window doesn't overlap the pending detection, so it can't be suppressed anymore
+                self.emit_detection()
+
+        self.processed_windows += len(starts)
+        self.processing_time += time.time() - start_time
+
+    def add_detection(self, detection):
+        """
+        Merge a new detection with the pending one, keeping only the most confident
+        of overlapping detections ( non-maximum suppression ).
+        """
+        if self.pending_detection is not None:
+            if detection[0] < self.pending_end:
+                # Overlapping detections, keep the most confident one
+                if detection[3] > self.pending_detection[3]:
+                    self.pending_detection = detection
+
+                # Extend the group of merged detections
+                self.pending_end = max(self.pending_end, detection[1])
+                return
+
+            # Not overlapping, the pending detection is final
+            self.emit_detection()
+
+        self.pending_detection = detection
+        self.pending_end = detection[1]
+
+    def emit_detection(self):
+        """
+        Notify the pending detection to the callbacks
+        """
+        gesture_id, confidence = self.pending_detection[2:]
+        self.pending_detection = None
+
+        self.notify_callbacks(gesture_id, float(confidence))
+
+    def flush(self):
+        """
+        Classify the windows waiting in the buffer and notify the pending detection
+        """
+        self.process_windows()
+
+        if self.pending_detection is not None:
+            self.emit_detection()
+
+    def windows_per_second(self):
+        """
+        Return the number of windows classified per second of processing time
+        """
+        if self.processing_time == 0:
+            return 0.0
+
+        return self.processed_windows / self.processing_time
+
+    def meets_target(self):
+        """
+        Return True if the measured throughput reaches the target_windows_per_second.
+        If no target has been set, or no window has been classified yet, return True.
+        """
+        if self.target_windows_per_second is None or self.processed_windows == 0:
+            return True
+
+        return self.windows_per_second() >= self.target_windows_per_second
+
+    def predict(self, sample):
+        """
+        Return the gesture_id with the highest probability for the whole sample
+        """
+        probabilities = self.classifier.predict_proba(sample)
+
+        return self.classifier.gestures[int(np.argmax(probabilities))]
+
+
+class CascadePredictor(AbstractGesturePredictor):
+    """
+    Chains predictors or classifiers from the cheapest to the most expensive one.
+    Each stage predicts the sample with a confidence, if the confidence is at least the
+    threshold of the stage the gesture is accepted, otherwise the sample is passed to the next stage.
+    If not even the last stage is confident enough, the sample is rejected and the unknown_gesture
+    is returned ( by default None, that is not notified to the callbacks ).
+
+    A stage can be any object that implements predict_with_confidence, such as a classifier
+    or a predictor. A stage with a threshold of None always accepts its prediction, while
+    a stage that doesn't estimate the confidence never accepts it otherwise.
+    """
+    def __init__(self, stages, unknown_gesture=None):
+        """
+        :param stages: list of tuples ( stage, threshold ), from the cheapest to the most expensive.
+        :param unknown_gesture: gesture_id returned when the sample is rejected by all the stages.
+        """
+        AbstractGesturePredictor.__init__(self)
+
+        if len(stages) == 0:
+            raise ValueError("The cascade must contain at least one stage.")
+
+        self.stages = [stage for stage, threshold in stages]
+        self.thresholds = [threshold for stage, threshold in stages]
+        self.unknown_gesture = unknown_gesture
+
+        self.reset_stats()
+
+    def reset_stats(self):
+        """
+        Reset the statistics of each stage
+        """
+        n_stages = len(self.stages)
+        self.calls = [0] * n_stages  # Samples predicted by each stage
+        self.accepted = [0] * n_stages  # Samples accepted by each stage
+        self.durations = [0.0] * n_stages  # Total prediction time of each stage
+        self.rejected = 0
+
+    def is_accepted(self, index, confidence):
+        """
+        Return True if the stage at the given index accepts a prediction with the given confidence
+        """
+        threshold = self.thresholds[index]
+
+        if threshold is None:
+            return True
+
+        return confidence is not None and confidence >= threshold
+
+    def predict_with_confidence(self, sample):
+        """
+        Predict the sample with the cascade, returning a tuple ( gesture_id, confidence )
+        """
+        for index, stage in enumerate(self.stages):
+            # Each stage receives its own view, as its preprocessing could modify the sample
+            stage_sample = sample.share()
+
+            start = time.time()
+            gesture_id, confidence = stage.predict_with_confidence(stage_sample)
+            self.durations[index] += time.time() - start
+            self.calls[index] += 1
+
+            if self.is_accepted(index, confidence):
+                self.accepted[index] += 1
+                return gesture_id, confidence
+
+        self.rejected += 1
+
+        return self.unknown_gesture, None
+
+    def predict(self, sample):
+        """
+        Predict the sample with the cascade, returning the gesture_id
+        """
+        return self.predict_with_confidence(sample)[0]
+
+    def receive_sample(self, sample):
+        """
+        Predict the sample and notify the gesture to the callbacks, unless it has been rejected
+        """
+        gesture_id, confidence = self.predict_with_confidence(sample)
+
+        if gesture_id is not None:
+            self.notify_callbacks(gesture_id, confidence)
+
+    def get_stats(self):
+        """
+        Return a dictionary with the hit rate and the average latency of each stage, the rejection rate
+        and the time saved, estimated from the average latency of the stages that were skipped.
+        """
+        total = self.calls[0]
+
+        average_latencies = [duration / calls if calls > 0 else 0.0
+                             for duration, calls in zip(self.durations, self.calls)]
+
+        # A sample accepted by a stage skips all the following ones
+        latency_saved = 0.0
+        for index, accepted in enumerate(self.accepted):
+            latency_saved += accepted * sum(average_latencies[index + 1:])
+
+        stages = []
+        for index in range(len(self.stages)):
+            stages.append({
+                'calls': self.calls[index],
+                'accepted': self.accepted[index],
+                'hit_rate': self.accepted[index] / float(total) if total > 0 else 0.0,
+                'average_latency': average_latencies[index],
+            })
+
+        return {
+            'samples': total,
+            'stages': stages,
+            'rejection_rate': self.rejected / float(total) if total > 0 else 0.0,
+            'latency_saved': latency_saved,
+        }
+
+    @staticmethod
+    def get_confidence_threshold(confidences, correct, target_accuracy):
+        """
+        Return the lowest threshold such that the predictions with a confidence greater or equal
+        reach the target accuracy, or inf if no threshold reaches it.
+
+        :param confidences: array containing the confidence of each prediction
+        :param correct: boolean array, True if the prediction is correct
+        :param target_accuracy: minimum accuracy of the accepted predictions
+        """
+        order = np.argsort(-confidences, kind="mergesort")
+        confidences = confidences[order]
+        accuracies = np.cumsum(correct[order]) / np.arange(1.0, len(order) + 1)
+
+        # Only the last prediction of a group with the same confidence is a valid cut
+        valid = np.ones(len(order), dtype=bool)
+        valid[:-1] = confidences[:-1] > confidences[1:]
+
+        candidates = np.flatnonzero(valid & (accuracies >= target_accuracy))
+        if len(candidates) == 0:
+            return np.inf
+
+        return float(confidences[candidates[-1]])
+
+    def tune_thresholds(self, samples, target_accuracy=0.95):
+        """
+        Choose the thresholds of all the stages but the last one, so that each stage accepts as many
+        samples of the dataset as possible while keeping the accuracy of the accepted ones at least
+        target_accuracy. Each stage is tuned with the samples rejected by the previous ones.
+
+        :param samples: list of Samples with the gesture_id
+        :param target_accuracy: minimum accuracy of the predictions accepted by each stage
+        :return: the list of thresholds
+        """
+        remaining = list(samples)
+
+        for index, stage in enumerate(self.stages[:-1]):
+            if len(remaining) == 0:
+                break
+
+            confidences = []
+            correct = []
+            for sample in remaining:
+                gesture_id, confidence = stage.predict_with_confidence(sample.share())
+                confidences.append(confidence if confidence is not None else -np.inf)
+                correct.append(gesture_id == sample.gesture_id)
+
+            confidences = np.array(confidences, dtype=float)
+            threshold = self.get_confidence_threshold(confidences, np.array(correct), target_accuracy)
+            # The stage doesn't estimate the confidence, but its predictions are accurate enough
+            if threshold == -np.inf:
+                threshold = None
+
+            self.thresholds[index] = threshold
+
+            if threshold is None:
+                break
+
+            remaining = [sample for sample, confidence in zip(remaining, confidences) if confidence < threshold]
+
+        return self.thresholds
+
+
+class DeviceState(object):
+    """
+    State of a device whose samples are routed by a RoutingPredictor: its smoother,
+    its calibration, the CallbackManagers of its gestures and its metrics.
+    """
+    def __init__(self, predictor, device_id, smoother=None):
+        self.predictor = predictor
+        self.device_id = device_id
+
+        # The smoother forwards the gestures to the DeviceState
+        self.smoother = smoother
+        if smoother is not None:
+            smoother.attach_callback_manager(self)
+
+        # Calibration applied to the samples: ( data - offset ) * scale, for each axis
+        self.offset = None
+        self.scale = None
+
+        # CallbackManagers that receive only the gestures of this device
+        self.callbacks = []
+
+        # Metrics
+        self.samples = 0
+        self.predictions = 0
+        self.notified = 0
+        self.gesture_counts = {}
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def calibrate_sample(self, sample):
+        """
+        Return a view of the sample with the calibration applied
+        """
+        sample = sample.share()
+
+        if self.offset is not None:
+            sample.data = sample.data - self.offset
+        if self.scale is not None:
+            sample.data = sample.data * self.scale
+
+        return sample
+
+    def receive_prediction(self, gesture_id, confidence, latency):
+        """
+        Update the metrics with a prediction and send it to the smoother, if any
+        """
+        self.predictions += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+        if self.smoother is not None:
+            self.smoother.receive_gesture(gesture_id, confidence)
+        else:
+            self.receive_gesture(gesture_id, confidence)
+
+    def receive_gesture(self, gesture_id, confidence=None):
+        """
+        Called when a gesture of the device must be notified, after the smoothing
+        """
+        self.notified += 1
+        self.gesture_counts[gesture_id] = self.gesture_counts.get(gesture_id, 0) + 1
+
+        self.predictor.dispatch_gesture(self, gesture_id, confidence)
+
+    def get_metrics(self):
+        return {
+            'samples': self.samples,
+            'predictions': self.predictions,
+            'notified': self.notified,
+            'gesture_counts': dict(self.gesture_counts),
+            'average_latency': self.total_latency / self.predictions if self.predictions > 0 else 0.0,
+            'max_latency': self.max_latency,
+        }
+
+
+class RoutingPredictor(AbstractGesturePredictor):
+    """
+    Predicts the samples of many devices with a single classifier, keeping the state of each device
+    separated, based on the device_id of the samples.
+    Each device has its own smoother, calibration and metrics, and its own CallbackManagers, while
+    the CallbackManagers attached to the predictor receive the gestures of all the devices: during the
+    notification, current_device_id contains the id of the device of the gesture.
+
+    The samples are classified in batches, with a single call to the classifier: a batch is classified
+    when it contains batch_size samples, or when its oldest sample has waited max_latency seconds.
+    The waiting time is checked when a sample is received, call poll periodically to respect it
+    when the devices are idle.
+    """
+    def __init__(self, classifier, smoother_factory=None, batch_size=1, max_latency=0.0, clock=time.time):
+        """
+        :param classifier: a trained classifier, shared by all the devices
+        :param smoother_factory: function that returns a new GestureSmoother, called for each device.
+                                 The smoother uses the clock of the predictor.
+                                 If None, the predictions are not smoothed.
+        :param batch_size: maximum number of samples classified together
+        :param max_latency: maximum time in seconds that a sample waits for the batch to be complete
+        :param clock: function that returns the current time in seconds
+        """
+        AbstractGesturePredictor.__init__(self)
+
+        self.classifier = classifier
+        self.smoother_factory = smoother_factory
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.clock = clock
+
+        # State of each device, created when its first sample is received
+        self.devices = {}
+
+        # Tuples ( device state, calibrated sample, arrival time ) waiting to be classified
+        self.queue = []
+
+        # Id of the device whose gesture is being notified
+        self.current_device_id = None
+
+        # Statistics of the batches
+        self.batches = 0
+        self.batched_samples = 0
+
+    def get_device(self, device_id):
+        """
+        Return the state of the device, creating it if needed
+        """
+        if device_id not in self.devices:
+            smoother = None
+            if self.smoother_factory is not None:
+                smoother = self.smoother_factory()
+
+                # The smoother measures the intervals on the same time base of the batches
+                smoother.clock = self.clock
+
+            self.devices[device_id] = DeviceState(self, device_id, smoother=smoother)
+
+        return self.devices[device_id]
+
+    def remove_device(self, device_id):
+        """
+        Forget the state of a device, for example when it disconnects.
+        Its samples waiting to be classified are discarded.
+        """
+        device = self.devices.pop(device_id, None)
+
+        self.queue = [item for item in self.queue if item[0] is not device]
+
+    def attach_device_callback_manager(self, device_id, manager):
+        """
+        Attach a CallbackManager that receives only the gestures of the given device
+        """
+        self.get_device(device_id).callbacks.append(manager)
+
+    def set_calibration(self, device_id, offset=None, scale=None):
+        """
+        Set the calibration of a device, its samples are transformed as ( data - offset ) * scale
+
+        :param offset: value, or array with a value for each axis, subtracted from the data
+        :param scale: value, or array with a value for each axis, that multiplies the data
+        """
+        device = self.get_device(device_id)
+        device.offset = np.asarray(offset, dtype=float) if offset is not None else None
+        device.scale = np.asarray(scale, dtype=float) if scale is not None else None
+
+    def calibrate(self, device_id, samples):
+        """
+        Calibrate a device with samples recorded at rest: the data of the device is centered
+        on their mean and scaled to their standard deviation
+        """
+        frames = np.concatenate([sample.data for sample in samples])
+
+        std = frames.std(axis=0)
+        std[std == 0] = 1
+
+        self.set_calibration(device_id, offset=frames.mean(axis=0), scale=1.0 / std)
+
+    def receive_sample(self, sample):
+        """
+        Add the sample to the batch, classifying the batch if it's complete or its latency budget is exhausted
+        """
+        device = self.get_device(sample.device_id)
+        device.samples += 1
+
+        self.queue.append((device, device.calibrate_sample(sample), self.clock()))
+
+        if len(self.queue) >= self.batch_size:
+            self.flush()
+        else:
+            self.poll()
+
+    def poll(self):
+        """
+        Classify the batch if its oldest sample has waited more than max_latency
+        """
+        if self.queue and self.clock() - self.queue[0][2] >= self.max_latency:
+            self.flush()
+
+    def flush(self):
+        """
+        Classify the samples waiting in the batch and notify their gestures
+        """
+        if not self.queue:
+            return
+
+        batch = self.queue
+        self.queue = []
+
+        predictions = self.predict_batch([sample for device, sample, arrival in batch])
+
+        self.batches += 1
+        self.batched_samples += len(batch)
+
+        now = self.clock()
+        for (device, sample, arrival), (gesture_id, confidence) in zip(batch, predictions):
+            device.receive_prediction(gesture_id, confidence, now - arrival)
+
+    def predict_batch(self, samples):
+        """
+        Return a tuple ( gesture_id, confidence ) for each sample, see predict_batch
+        """
+        return predict_batch(self.classifier, samples)
+
+    def dispatch_gesture(self, device, gesture_id, confidence):
+        """
+        Notify a gesture of a device to its CallbackManagers and to the ones of the predictor
+        """
+        self.current_device_id = device.device_id
+
+        for callback in device.callbacks:
+            if confidence is None:
+                callback.receive_gesture(gesture_id)
+            else:
+                callback.receive_gesture(gesture_id, confidence)
+
+        self.notify_callbacks(gesture_id, confidence)
+
+        self.current_device_id = None
+
+    def predict(self, sample):
+        """
+        Predict a single sample, with the calibration of its device
+        """
+        return self.classifier.predict(self.get_device(sample.device_id).calibrate_sample(sample))
+
+    def get_metrics(self, device_id=None):
+        """
+        Return the metrics of a device or, if device_id is None, a dictionary with the metrics of each device
+        """
+        if device_id is not None:
+            return self.devices[device_id].get_metrics()
+
+        return {device_id: device.get_metrics() for device_id, device in self.devices.items()}
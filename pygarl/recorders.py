@@ -3,13 +3,19 @@ import os
 import uuid
 import time
 import os.path
-from pygarl.abstracts import AbstractGestureRecorder
+from pygarl.abstracts import AbstractGestureRecorder, Sender
 from pygarl.utils import RandomGestureChooser
 
 
-class FileGestureRecorder(AbstractGestureRecorder):
+class FileGestureRecorder(AbstractGestureRecorder, Sender):
+    """
+    Saves the received samples in the target directory.
+    After a sample has been saved, it is forwarded to the attached receivers, so that
+    an OnlineClassifier can be trained with the samples as they are recorded.
+    """
     def __init__(self, target_dir, max_tries=5, verbose=False, forced_gesture_id=None):
         AbstractGestureRecorder.__init__(self)
+        Sender.__init__(self)
 
         # Make sure the directory is valid, if not, raise an exception
         if not os.path.isdir(target_dir):
@@ -83,4 +89,8 @@ class FileGestureRecorder(AbstractGestureRecorder):
         if self.verbose:
             print("SAMPLE SAVED TO FILE:", filename)
 
-        return filename
\ No newline at end of file
+        # Forward the saved sample to the attached receivers, along with its filename
+        sample.filename = filename
+        self.notify_receivers(sample)
+
+        return filename
@@ -0,0 +1,298 @@
+"""
+Transport of a stream of frames between processes through shared memory.
+A process owns the DataReader and writes the frames and the signals in a ring buffer, with a
+SharedRingWriter attached as a manager. Any number of consumer processes read the ring with a
+SharedRingReader, that is a DataReader, so the usual sample managers can be attached to it.
+The ring has a single producer and needs no locks: each record carries its sequence number, and a
+consumer that is slower than the producer detects the frames that have been overwritten.
+"""
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from pygarl.abstracts import AbstractDataReader, ControlSignal
+
+
+class SharedFrameRing(object):
+    """
+    Ring buffer of frames in shared memory.
+    The memory contains a header ( next sequence number, capacity, number of axis, closed flag ),
+    then, for each record, its sequence number, its kind ( DATA or the value of a ControlSignal )
+    and its frame.
+    """
+    # Kind of the records that contain a frame
+    DATA = -1
+
+    HEADER_SIZE = 4
+
+    def __init__(self, name=None, capacity=4096, n_axis=6):
+        """
+        :param name: name of an existing ring to attach to. If None, a new ring is created.
+        :param capacity: number of records of a new ring
+        :param n_axis: number of axis of the frames of a new ring
+        """
+        if name is None:
+            size = (self.HEADER_SIZE + capacity * (2 + n_axis)) * 8
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            self.memory = self.attach(name)
+            self.owner = False
+
+        self.header = np.ndarray(self.HEADER_SIZE, dtype=np.int64, buffer=self.memory.buf)
+
+        if self.owner:
+            self.header[:] = [0, capacity, n_axis, 0]
+
+        self.capacity = int(self.header[1])
+        self.n_axis = int(self.header[2])
+
+        offset = self.HEADER_SIZE * 8
+        self.sequences = np.ndarray(self.capacity, dtype=np.int64, buffer=self.memory.buf, offset=offset)
+        offset += self.capacity * 8
+        self.kinds = np.ndarray(self.capacity, dtype=np.int64, buffer=self.memory.buf, offset=offset)
+        offset += self.capacity * 8
+        self.frames = np.ndarray((self.capacity, self.n_axis), dtype=np.float64, buffer=self.memory.buf,
+                                 offset=offset)
+
+        if self.owner:
+            self.sequences.fill(-1)
+
+    @staticmethod
+    def attach(name):
+        """
+        Attach to an existing shared memory, without taking its ownership where supported.
+        Before Python 3.13 the consumer processes should be started by the producer, otherwise
+        the shared memory could be removed when they end.
+        """
+        try:
+            return shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            return shared_memory.SharedMemory(name=name)
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def get_published(self):
+        """
+        Return the sequence number of the next record, that is the number of records written so far
+        """
+        return int(self.header[0])
+
+    def is_closed(self):
+        return bool(self.header[3])
+
+    def write(self, kind, frame=None):
+        """
+        Write a record, overwriting the oldest one if the ring is full.
+        Must be called by a single process.
+        """
+        sequence = int(self.header[0])
+        slot = sequence % self.capacity
+
+        # Invalidate the record while it's being written
+        self.sequences[slot] = -1
+
+        self.kinds[slot] = kind
+        if frame is not None:
+            self.frames[slot] = frame
+
+        self.sequences[slot] = sequence
+        self.header[0] = sequence + 1
+
+    def read(self, sequence):
+        """
+        Read the record with the given sequence number
+
+        :return: a tuple ( kind, frame ), or None if the record has been overwritten
+        """
+        slot = sequence % self.capacity
+
+        if self.sequences[slot] != sequence:
+            return None
+
+        kind = int(self.kinds[slot])
+        frame = self.frames[slot].copy()
+
+        # The record could have been overwritten while reading it
+        if self.sequences[slot] != sequence:
+            return None
+
+        return kind, frame
+
+    def mark_closed(self):
+        """
+        Tell the consumers that no more records will be written
+        """
+        self.header[3] = 1
+
+    def close(self):
+        """
+        Detach from the shared memory, removing it if the ring has been created by this object
+        """
+        # The arrays must be released before closing the memory
+        self.header = self.sequences = self.kinds = self.frames = None
+
+        self.memory.close()
+
+        if self.owner:
+            self.memory.unlink()
+
+
+class SharedRingWriter(object):
+    """
+    Manager that writes the frames and the signals of a DataReader in a SharedFrameRing
+    """
+    def __init__(self, capacity=4096, n_axis=6):
+        """
+        :param capacity: number of frames and signals kept in the ring
+        :param n_axis: number of axis of the frames
+        """
+        self.ring = SharedFrameRing(capacity=capacity, n_axis=n_axis)
+
+    @property
+    def name(self):
+        """
+        Name of the shared memory, used by the SharedRingReaders to attach to the ring
+        """
+        return self.ring.name
+
+    def receive_data(self, data):
+        if len(data) != self.ring.n_axis:
+            raise ValueError("The frames must have {n} axis".format(n=self.ring.n_axis))
+
+        self.ring.write(SharedFrameRing.DATA, data)
+
+    def receive_signal(self, signal):
+        self.ring.write(signal)
+
+    def close(self):
+        """
+        Tell the readers that the stream is finished and remove the ring
+        """
+        self.ring.mark_closed()
+        self.ring.close()
+
+
+class SharedRingReader(AbstractDataReader):
+    """
+    DataReader that reads the frames and the signals written in a SharedFrameRing by another process.
+    If the reader is too slow and some records are overwritten before being read, the OVERRUN signal
+    is notified and the reading continues from the oldest record available.
+    """
+    def __init__(self, name, poll_interval=0.001, from_oldest=False, axes=None, decimation=1):
+        """
+        :param name: name of the ring, see SharedRingWriter.name
+        :param poll_interval: time in seconds to wait when no new record is available
+        :param from_oldest: if True, start reading from the oldest record in the ring,
+                            otherwise from the records written after opening the reader
+        :param axes: list of the indexes of the axis to read, if None all the axis are read
+        :param decimation: if greater than 1, only one frame every decimation frames is notified,
+                           after an anti-aliasing filter
+        """
+        AbstractDataReader.__init__(self, axes=axes, decimation=decimation)
+
+        self.name = name
+        self.poll_interval = poll_interval
+        self.from_oldest = from_oldest
+
+        self.ring = None
+
+        # Sequence number of the next record to read
+        self.next_sequence = 0
+
+        # Number of overruns and of records lost
+        self.overruns = 0
+        self.lost_records = 0
+
+    def open(self):
+        """
+        Attach to the ring
+        """
+        if self.ring is not None:
+            raise RuntimeError("The reader is already opened")
+
+        self.ring = SharedFrameRing(name=self.name)
+
+        published = self.ring.get_published()
+        if self.from_oldest:
+            self.next_sequence = max(0, published - self.ring.capacity)
+        else:
+            self.next_sequence = published
+
+    def close(self):
+        """
+        Detach from the ring
+        """
+        if self.ring is None:
+            raise RuntimeError("The reader is not open, so it can't be closed.")
+
+        self.ring.close()
+        self.ring = None
+
+    def skip_lost_records(self, published):
+        """
+        Continue from the oldest record not yet overwritten, notifying the OVERRUN signal
+        """
+        oldest = published - self.ring.capacity
+        # A record can be overwritten while reading it, one more record is skipped to leave room for the writer
+        oldest = max(oldest, self.next_sequence) + 1
+
+        self.overruns += 1
+        self.lost_records += oldest - self.next_sequence
+        self.next_sequence = oldest
+
+        self.notify_signal(ControlSignal.OVERRUN)
+
+    def poll(self):
+        """
+        Notify all the records written since the last call
+
+        :return: the number of records read
+        """
+        count = 0
+        published = self.ring.get_published()
+
+        while self.next_sequence < published:
+            if published - self.next_sequence > self.ring.capacity:
+                self.skip_lost_records(published)
+                continue
+
+            record = self.ring.read(self.next_sequence)
+
+            if record is None:
+                published = self.ring.get_published()
+                self.skip_lost_records(published)
+                continue
+
+            self.next_sequence += 1
+            count += 1
+
+            kind, frame = record
+            if kind == SharedFrameRing.DATA:
+                if self.axes is not None:
+                    frame = frame[self.axes]
+
+                self.notify_data(frame)
+            else:
+                self.notify_signal(kind)
+
+        return count
+
+    def mainloop(self):
+        """
+        Loop that reads the ring, until the writer is closed
+        """
+        # Enclosed in a try block to intercept a Ctrl+C press
+        try:
+            while True:
+                # The closed flag is checked before reading, so that the last records are not lost
+                is_closed = self.ring.is_closed()
+
+                if self.poll() == 0:
+                    if is_closed:
+                        break
+
+                    time.sleep(self.poll_interval)
+        except KeyboardInterrupt:  # When Ctrl+C is pressed, the loop terminates
+            print('CLOSED MAINLOOP!')
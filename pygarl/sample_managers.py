@@ -3,9 +3,9 @@ from pygarl.abstracts import ControlSignal, AbstractSampleManager
 
 
 class DiscreteSampleManager(AbstractSampleManager):
-    def __init__(self, min_sample_length=10):
+    def __init__(self, min_sample_length=10, device_id=None):
         # Call the base constructor to initialize buffer and axis
-        AbstractSampleManager.__init__(self)
+        AbstractSampleManager.__init__(self, device_id=device_id)
 
         self.min_sample_length = min_sample_length  # Minimum number of frames for a valid Sample
 
@@ -33,6 +33,9 @@ class DiscreteSampleManager(AbstractSampleManager):
         elif signal == ControlSignal.STOP:
             # When a STOP signal is received, end the sample
             self.end_sample()
+        elif signal == ControlSignal.OVERRUN:
+            # Some frames of the sample have been lost, discard it
+            self.buffer = []
 
     def receive_data(self, data):
         """
@@ -48,16 +51,16 @@ class DiscreteSampleManager(AbstractSampleManager):
         # Notify the receivers only if the sample length is greater than the minimum
         if len(self.buffer) >= self.min_sample_length:
             # Create a sample with the buffer data
-            sample = Sample(data=self.buffer)
+            sample = Sample(data=self.buffer, device_id=self.device_id, axes=self.axes)
             # Notify all the attached receivers
             self.notify_receivers(sample)
 
 
 class StreamSampleManager(AbstractSampleManager):
     # TODO: Documentation
-    def __init__(self, window=20, step=10):
+    def __init__(self, window=20, step=10, device_id=None):
         # Call the base constructor to initialize buffer and axis
-        AbstractSampleManager.__init__(self)
+        AbstractSampleManager.__init__(self, device_id=device_id)
 
         # Step size must be lower or equal to the window size, if not, raise an exception
         if step > window:
@@ -65,6 +68,7 @@ class StreamSampleManager(AbstractSampleManager):
 
         self.window = window  # Determines the size of the window and the sample
         self.step = step  # How much frames should pass between sample packaging
+        self.frame_count = 0  # Number of frames received since the beginning of the stream
 
     def end_sample(self):
         """
@@ -76,12 +80,15 @@ class StreamSampleManager(AbstractSampleManager):
         """
         Called from a DataReader when a signal is received
         If the STOP signal is received, prematurely end the sample, even if the window size
-        has not been reached
+        has not been reached. If the OVERRUN signal is received, the window is restarted.
         """
         # Call the appropriate method based on the received signal
         if signal == ControlSignal.STOP:
             # When a STOP signal is received, end the sample
             self.end_sample()
+        elif signal == ControlSignal.OVERRUN:
+            # The frames in the buffer are not contiguous with the following ones
+            self.buffer = []
 
     def receive_data(self, data):
         """
@@ -89,6 +96,7 @@ class StreamSampleManager(AbstractSampleManager):
         """
         # Add the current data frame to the buffer
         self.buffer.append(data)
+        self.frame_count += 1
 
         # If the window size has been reached by the buffer
         if len(self.buffer) >= self.window:
@@ -107,6 +115,9 @@ class StreamSampleManager(AbstractSampleManager):
         Package the sample with the data in the buffer and notify all the attached receivers
         """
         # Create a sample with the buffer data
-        sample = Sample(data=self.buffer)
+        sample = Sample(data=self.buffer, device_id=self.device_id, axes=self.axes)
+        # Save the position of the sample in the stream, so that the receivers can
+        # skip the frames they have already processed
+        sample.end_frame = self.frame_count
         # Notify all the attached receivers
         self.notify_receivers(sample)
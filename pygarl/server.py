@@ -0,0 +1,794 @@
+"""
+Local inference server, that loads a model once and predicts the gestures of many clients.
+The clients connect through a Unix domain socket or a localhost TCP port and send raw frames,
+that are grouped into windows for each client, or complete samples. The predicted gestures
+are streamed back to the client that sent the sample.
+
+Every message of the protocol is made of a header, containing the type of the message and the
+length of the payload, followed by the payload. The numbers are in network byte order.
+
+    FRAME   client -> server, the float32 values of a frame
+    SAMPLE  client -> server, uint32 number of frames, uint32 number of axis, the float32 values
+    SIGNAL  client -> server, uint8 ControlSignal, forwarded to the windowing of the client
+    HEALTH  client -> server with no payload, server -> client with the JSON metrics of the server
+    GESTURE server -> client, uint32 index of the sample, float32 confidence ( NaN if not available ),
+            followed by the UTF-8 gesture_id
+    ERROR   server -> client, UTF-8 description of an invalid message
+"""
+import json
+import math
+import os
+import queue
+import selectors
+import socket
+import stat
+import struct
+import threading
+import time
+from collections import deque
+import numpy as np
+from pygarl.base import Sample
+from pygarl.abstracts import Receiver
+from pygarl.predictors import predict_batch
+from pygarl.sample_managers import StreamSampleManager
+
+
+class MessageType:
+    """
+    Types of the messages of the protocol
+    """
+    FRAME = 1
+    SAMPLE = 2
+    SIGNAL = 3
+    HEALTH = 4
+    GESTURE = 5
+    ERROR = 6
+
+
+# Type of the message and length of the payload
+HEADER = struct.Struct("!BI")
+
+# Index of the sample and confidence of a gesture
+GESTURE_HEADER = struct.Struct("!If")
+
+# Number of frames and axis of a sample
+SAMPLE_HEADER = struct.Struct("!II")
+
+# Maximum length of a payload, longer messages are considered invalid
+MAX_PAYLOAD = 16 * 1024 * 1024
+
+
+def encode_message(message_type, payload=b""):
+    """
+    Return the bytes of a message
+    """
+    return HEADER.pack(message_type, len(payload)) + payload
+
+
+def decode_messages(buffer):
+    """
+    Extract the complete messages from the beginning of a buffer
+
+    :param buffer: bytearray containing the received bytes, the complete messages are removed from it
+    :return: list of tuples ( message type, payload )
+    """
+    messages = []
+    offset = 0
+
+    while len(buffer) - offset >= HEADER.size:
+        message_type, length = HEADER.unpack_from(buffer, offset)
+
+        if length > MAX_PAYLOAD:
+            raise ValueError("The message is too long")
+
+        if len(buffer) - offset - HEADER.size < length:
+            break
+
+        start = offset + HEADER.size
+        messages.append((message_type, bytes(buffer[start:start + length])))
+        offset = start + length
+
+    del buffer[:offset]
+
+    return messages
+
+
+def encode_frame(values):
+    return encode_message(MessageType.FRAME, np.asarray(values, dtype=">f4").tobytes())
+
+
+def encode_sample(data):
+    """
+    :param data: 2-dimensional array ( frames x axis ) or Sample
+    """
+    if isinstance(data, Sample):
+        data = data.data
+
+    data = np.asarray(data, dtype=">f4")
+
+    return encode_message(MessageType.SAMPLE, SAMPLE_HEADER.pack(*data.shape) + data.tobytes())
+
+
+def encode_gesture(index, gesture_id, confidence):
+    confidence = float("nan") if confidence is None else confidence
+
+    return encode_message(MessageType.GESTURE, GESTURE_HEADER.pack(index, confidence) +
+                          str(gesture_id).encode("utf-8"))
+
+
+def decode_gesture(payload):
+    """
+    :return: a tuple ( index of the sample, gesture_id, confidence )
+    """
+    index, confidence = GESTURE_HEADER.unpack_from(payload)
+    gesture_id = payload[GESTURE_HEADER.size:].decode("utf-8")
+
+    return index, gesture_id, None if math.isnan(confidence) else confidence
+
+
+def create_socket(address):
+    """
+    Create a socket for the address: a path for a Unix domain socket, or a tuple ( host, port ) for TCP
+    """
+    if isinstance(address, str):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    return socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+
+class ClientConnection(Receiver):
+    """
+    Connection of a client to the GestureServer.
+    The frames of the client are grouped into windows by its own StreamSampleManager.
+    The socket is non-blocking: the messages for the client are buffered and written by the network
+    thread of the server when the socket is writable, so that a slow client can't block the workers.
+    """
+    def __init__(self, server, client_socket, client_id):
+        Receiver.__init__(self)
+
+        self.server = server
+        self.socket = client_socket
+        self.socket.setblocking(False)
+        self.client_id = client_id
+
+        # Bytes received that don't make a complete message yet
+        self.buffer = bytearray()
+
+        # Messages received but not processed yet, because the reading of the client is paused
+        self.messages = deque()
+
+        # Bytes waiting to be written to the client, filled by the workers and the network thread
+        self.output = bytearray()
+
+        # Protects the output and the number of pending samples, shared with the workers
+        self.lock = threading.Lock()
+
+        # Number of samples of the client waiting to be classified
+        self.pending_samples = 0
+
+        # Index of the next sample of the client
+        self.sample_index = 0
+
+        # Selector events the socket is registered for, changed only by the network thread
+        self.events = 0
+
+        self.manager = StreamSampleManager(window=server.window, step=server.step, device_id=client_id)
+        self.manager.attach_receiver(self)
+
+        self.is_closed = False
+
+        # True when the output exceeded max_output bytes, the client is then disconnected
+        self.is_overflowed = False
+
+    def receive_sample(self, sample):
+        """
+        Called by the StreamSampleManager when a window is complete
+        """
+        self.server.enqueue(self, sample)
+
+    def receive_message(self, message_type, payload):
+        """
+        Process a message received from the client
+        """
+        if message_type == MessageType.FRAME:
+            self.manager.receive_data(np.frombuffer(payload, dtype=">f4").astype(float))
+        elif message_type == MessageType.SAMPLE:
+            n_frames, n_axis = SAMPLE_HEADER.unpack_from(payload)
+            data = np.frombuffer(payload, dtype=">f4", offset=SAMPLE_HEADER.size)
+
+            if data.size == 0 or data.size != n_frames * n_axis:
+                self.send_error("The sample size doesn't match its data")
+                return
+
+            # The conversion to the native float already copies the data
+            self.server.enqueue(self, Sample(data=data.reshape(n_frames, n_axis).astype(float),
+                                             device_id=self.client_id, copy=False))
+        elif message_type == MessageType.SIGNAL:
+            self.manager.receive_signal(payload[0])
+        elif message_type == MessageType.HEALTH:
+            self.send(encode_message(MessageType.HEALTH, json.dumps(self.server.get_health()).encode("utf-8")))
+        else:
+            self.send_error("{type} is not a valid message type".format(type=message_type))
+
+    def send(self, message):
+        """
+        Add a message to the output of the client, and wake up the network thread to write it.
+        When the output exceeds max_output bytes, the messages are dropped and the client is disconnected.
+        """
+        with self.lock:
+            if self.is_closed or self.is_overflowed:
+                return
+
+            was_empty = not self.output
+            self.output.extend(message)
+
+            if len(self.output) > self.server.max_output:
+                self.is_overflowed = True
+                del self.output[:]
+
+            # If the output wasn't empty, the network thread is already waiting to write it
+            wakeup = was_empty or self.is_overflowed
+
+        if wakeup:
+            self.server.wakeup()
+
+    def send_error(self, description):
+        self.send(encode_message(MessageType.ERROR, description.encode("utf-8")))
+
+    def complete_sample(self, message):
+        """
+        Called by the workers with the gesture, or the error, of a sample of the client
+        """
+        with self.lock:
+            self.pending_samples -= 1
+
+        self.send(message)
+
+    def write(self):
+        """
+        Write as much of the output as the socket accepts
+
+        :return: False if the connection has been closed by the client
+        """
+        with self.lock:
+            try:
+                sent = self.socket.send(self.output)
+            except (BlockingIOError, InterruptedError):
+                return True
+            except OSError:
+                return False
+
+            del self.output[:sent]
+
+        return True
+
+    def is_paused(self):
+        """
+        The reading of the client is paused while it has max_backlog samples waiting to be classified,
+        or half of max_output bytes waiting to be written, so that a client can't fill the memory of the server
+        """
+        with self.lock:
+            return self.pending_samples >= self.server.max_backlog or \
+                len(self.output) >= self.server.max_output // 2
+
+    def get_events(self):
+        """
+        Return the selector events the socket should be registered for
+        """
+        events = 0 if self.is_paused() else selectors.EVENT_READ
+
+        with self.lock:
+            return events | (selectors.EVENT_WRITE if self.output else 0)
+
+    def close(self):
+        with self.lock:
+            self.is_closed = True
+            del self.output[:]
+            self.socket.close()
+
+
+class GestureServer(object):
+    """
+    Serves the predictions of a classifier to the clients connected to a local socket.
+    The samples of all the clients are put in a queue, and a pool of worker threads classifies
+    them in batches: a worker waits up to max_latency seconds to fill a batch of batch_size samples.
+    A single network thread reads and writes the non-blocking sockets of the clients. The reading of a
+    client stops while it has max_backlog samples waiting to be classified, or while it doesn't read
+    its gestures, without slowing down the other clients.
+    """
+    def __init__(self, classifier, address, window=20, step=10, workers=2, batch_size=16, max_latency=0.005,
+                 max_backlog=256, max_output=1024 * 1024, verbose=False):
+        """
+        :param classifier: a trained classifier
+        :param address: path of a Unix domain socket, or a tuple ( host, port ) for a TCP socket
+        :param window: number of frames of the windows made from the frames of each client
+        :param step: number of frames between the start of two consecutive windows
+        :param workers: number of threads that classify the samples
+        :param batch_size: maximum number of samples classified together
+        :param max_latency: maximum time in seconds that a sample waits for the batch to be complete
+        :param max_backlog: maximum number of samples of a client waiting to be classified
+        :param max_output: maximum number of bytes waiting to be written to a client, a client that
+                           exceeds it is disconnected
+        """
+        self.classifier = classifier
+        self.address = address
+        self.window = window
+        self.step = step
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.max_backlog = max_backlog
+        self.max_output = max_output
+        self.verbose = verbose
+
+        # Tuples ( connection, index of the sample, sample, arrival time ) waiting to be classified,
+        # bounded by the max_backlog of each client
+        self.queue = queue.Queue()
+
+        self.listener = None
+        self.selector = None
+        self.threads = []
+        self.stop_event = threading.Event()
+
+        # Connections by client id
+        self.connections = {}
+        self.next_client_id = 0
+
+        # Metrics, updated by the workers
+        self.metrics_lock = threading.Lock()
+        self.start_time = None
+        self.received_samples = 0
+        self.predicted_samples = 0
+        self.failed_samples = 0
+        self.batches = 0
+        self.total_latency = 0.0
+        self.max_latency_seen = 0.0
+
+        # Pipe used to wake up the network thread when there are messages to write or the server is stopped
+        self.wakeup_reader = None
+        self.wakeup_writer = None
+
+    def start(self):
+        """
+        Start listening and processing the samples in background threads
+        """
+        if isinstance(self.address, str):
+            try:
+                mode = os.lstat(self.address).st_mode
+            except FileNotFoundError:
+                mode = None
+
+            # Only a socket left by a previous server can be replaced
+            if mode is not None:
+                if not stat.S_ISSOCK(mode):
+                    raise ValueError("{address} already exists and is not a socket".format(address=self.address))
+
+                os.remove(self.address)
+
+        self.listener = create_socket(self.address)
+        if not isinstance(self.address, str):
+            self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(self.address)
+        self.listener.listen()
+
+        # With the TCP port 0 a free port is assigned
+        self.address = self.listener.getsockname()
+
+        self.wakeup_reader, self.wakeup_writer = os.pipe()
+        os.set_blocking(self.wakeup_reader, False)
+        os.set_blocking(self.wakeup_writer, False)
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.selector.register(self.wakeup_reader, selectors.EVENT_READ)
+
+        self.start_time = time.time()
+        self.stop_event.clear()
+
+        self.threads = [threading.Thread(target=self.network_loop)]
+        self.threads.extend(threading.Thread(target=self.worker_loop) for n in range(self.workers))
+
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+        if self.verbose:
+            print("LISTENING ON", self.address)
+
+        return self
+
+    def serve_forever(self):
+        """
+        Start the server and wait until it's stopped, or Ctrl+C is pressed
+        """
+        self.start()
+
+        try:
+            while not self.stop_event.wait(1):
+                pass
+        except KeyboardInterrupt:  # When Ctrl+C is pressed, the server is stopped
+            print('CLOSED SERVER!')
+        finally:
+            self.stop()
+
+    def stop(self):
+        """
+        Stop the threads and close all the connections, it can be called even if the server isn't started
+        """
+        self.stop_event.set()
+        self.wakeup()
+
+        for thread in self.threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        self.threads = []
+
+        for connection in list(self.connections.values()):
+            connection.close()
+        self.connections = {}
+
+        if self.selector is not None:
+            self.selector.close()
+            self.selector = None
+
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.remove(self.address)
+
+        if self.wakeup_reader is not None:
+            os.close(self.wakeup_reader)
+            os.close(self.wakeup_writer)
+            self.wakeup_reader = None
+            self.wakeup_writer = None
+
+    def wakeup(self):
+        """
+        Wake up the network thread, to update the events of the connections
+        """
+        if self.wakeup_writer is None:
+            return
+
+        try:
+            os.write(self.wakeup_writer, b"x")
+        except BlockingIOError:  # The pipe is full, the network thread is already going to wake up
+            pass
+
+    def enqueue(self, connection, sample):
+        """
+        Add a sample of a client to the queue
+        """
+        index = connection.sample_index
+        connection.sample_index += 1
+
+        with self.metrics_lock:
+            self.received_samples += 1
+
+        with connection.lock:
+            connection.pending_samples += 1
+
+        self.queue.put((connection, index, sample, time.time()))
+
+    def network_loop(self):
+        """
+        Accept the connections, read the messages of the clients and write the messages for them
+        """
+        while not self.stop_event.is_set():
+            for key, mask in self.selector.select():
+                if key.fileobj is self.listener:
+                    self.accept()
+                elif key.fileobj == self.wakeup_reader:
+                    try:
+                        os.read(self.wakeup_reader, 4096)
+                    except BlockingIOError:
+                        pass
+
+                    for connection in list(self.connections.values()):
+                        self.update_events(connection)
+                else:
+                    connection = key.data
+
+                    if connection.is_closed:
+                        continue
+
+                    if mask & selectors.EVENT_WRITE and not connection.write():
+                        self.disconnect(connection)
+                        continue
+
+                    if mask & selectors.EVENT_READ and not self.read_client(connection):
+                        continue
+
+                    self.update_events(connection)
+
+    def accept(self):
+        client_socket, client_address = self.listener.accept()
+
+        connection = ClientConnection(self, client_socket, self.next_client_id)
+        self.connections[connection.client_id] = connection
+        self.next_client_id += 1
+
+        self.update_events(connection)
+
+        if self.verbose:
+            print("CLIENT CONNECTED:", connection.client_id)
+
+    def update_events(self, connection):
+        """
+        Register the socket of a client for the events it's waiting for, or disconnect it
+        if its output overflowed
+        """
+        if connection.is_overflowed:
+            if self.verbose:
+                print("CLIENT OUTPUT OVERFLOW:", connection.client_id)
+
+            self.disconnect(connection)
+            return
+
+        # The messages left by a pause are processed before reading new ones
+        self.process_messages(connection)
+
+        events = connection.get_events()
+
+        if events == connection.events:
+            return
+
+        if not connection.events:
+            self.selector.register(connection.socket, events, connection)
+        elif not events:
+            self.selector.unregister(connection.socket)
+        else:
+            self.selector.modify(connection.socket, events, connection)
+
+        connection.events = events
+
+    def read_client(self, connection):
+        """
+        Read and process the messages of a client
+
+        :return: False if the client has been disconnected
+        """
+        try:
+            chunk = connection.socket.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return True
+        except OSError:
+            chunk = b""
+
+        if not chunk:
+            self.disconnect(connection)
+            return False
+
+        connection.buffer.extend(chunk)
+
+        try:
+            messages = decode_messages(connection.buffer)
+        except ValueError as error:
+            # The messages can't be separated anymore, the error is written if the socket accepts it
+            connection.send_error(str(error))
+            connection.write()
+            self.disconnect(connection)
+            return False
+
+        connection.messages.extend(messages)
+        self.process_messages(connection)
+
+        return True
+
+    def process_messages(self, connection):
+        """
+        Process the received messages of a client, until its reading is paused
+        """
+        while connection.messages and not connection.is_paused():
+            message_type, payload = connection.messages.popleft()
+
+            try:
+                connection.receive_message(message_type, payload)
+            except (struct.error, IndexError, ValueError):
+                connection.send_error("Invalid message")
+
+    def disconnect(self, connection):
+        if connection.events:
+            self.selector.unregister(connection.socket)
+            connection.events = 0
+
+        self.connections.pop(connection.client_id, None)
+        connection.close()
+
+        if self.verbose:
+            print("CLIENT DISCONNECTED:", connection.client_id)
+
+    def get_batch(self):
+        """
+        Wait for a sample and the following ones, until the batch is complete or the
+        first sample has waited max_latency seconds
+
+        :return: list of queue items, empty if no sample has been received
+        """
+        try:
+            batch = [self.queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+
+        deadline = batch[0][3] + self.max_latency
+
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+
+            try:
+                if remaining > 0:
+                    batch.append(self.queue.get(timeout=remaining))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def predict_alone(self, sample):
+        """
+        Classify a single sample
+
+        :return: a tuple ( gesture_id, confidence ), or the exception raised by the classifier
+        """
+        try:
+            return predict_batch(self.classifier, [sample])[0]
+        except Exception as error:
+            return error
+
+    def worker_loop(self):
+        """
+        Classify the batches of samples and send the gestures to the clients
+        """
+        while not self.stop_event.is_set():
+            # The samples of the clients already disconnected are skipped
+            batch = [item for item in self.get_batch() if not item[0].is_closed]
+
+            if not batch:
+                continue
+
+            try:
+                results = predict_batch(self.classifier, [item[2] for item in batch])
+            except Exception:
+                # The samples are classified one by one, so that only the client
+                # of the sample that can't be classified receives the error
+                results = [self.predict_alone(item[2]) for item in batch]
+
+            now = time.time()
+            latencies = [now - item[3] for item, result in zip(batch, results) if not isinstance(result, Exception)]
+
+            # The metrics are updated before sending the gestures, so that they include them
+            with self.metrics_lock:
+                self.batches += 1
+                self.predicted_samples += len(latencies)
+                self.failed_samples += len(batch) - len(latencies)
+                self.total_latency += sum(latencies)
+                self.max_latency_seen = max([self.max_latency_seen] + latencies)
+
+            for (connection, index, sample, arrival), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    message = encode_message(MessageType.ERROR, "Sample {index}: {error}".format(
+                        index=index, error=result).encode("utf-8"))
+                else:
+                    message = encode_gesture(index, *result)
+
+                connection.complete_sample(message)
+
+    def get_health(self):
+        """
+        Return a dictionary with the state and the metrics of the server
+        """
+        with self.metrics_lock:
+            return {
+                'status': "ok",
+                'uptime': time.time() - self.start_time,
+                'clients': len(self.connections),
+                'paused_clients': sum(1 for connection in self.connections.values()
+                                      if not connection.events & selectors.EVENT_READ),
+                'gestures': list(self.classifier.gestures),
+                'queued_samples': self.queue.qsize(),
+                'received_samples': self.received_samples,
+                'predicted_samples': self.predicted_samples,
+                'failed_samples': self.failed_samples,
+                'batches': self.batches,
+                'average_batch_size': (self.predicted_samples + self.failed_samples) / float(self.batches)
+                if self.batches > 0 else 0.0,
+                'average_latency': self.total_latency / self.predicted_samples if self.predicted_samples > 0 else 0.0,
+                'max_latency': self.max_latency_seen,
+            }
+
+
+class GestureClient(object):
+    """
+    Client of a GestureServer
+    """
+    def __init__(self, address, timeout=10):
+        """
+        :param address: path of a Unix domain socket, or a tuple ( host, port ) for a TCP socket
+        :param timeout: maximum time in seconds to wait for a message
+        """
+        self.address = address
+        self.timeout = timeout
+
+        self.socket = None
+        self.buffer = bytearray()
+
+        # Gestures received while waiting for other messages
+        self.gestures = deque()
+
+    def connect(self):
+        self.socket = create_socket(self.address)
+        self.socket.settimeout(self.timeout)
+        self.socket.connect(self.address)
+
+        return self
+
+    def close(self):
+        self.socket.close()
+        self.socket = None
+
+    def send_frame(self, values):
+        self.socket.sendall(encode_frame(values))
+
+    def send_sample(self, data):
+        """
+        :param data: 2-dimensional array ( frames x axis ) or Sample
+        """
+        self.socket.sendall(encode_sample(data))
+
+    def send_signal(self, signal):
+        self.socket.sendall(encode_message(MessageType.SIGNAL, struct.pack("!B", signal)))
+
+    def receive_message(self):
+        """
+        Wait for a message of the server
+
+        :return: a tuple ( message type, payload )
+        """
+        while True:
+            messages = decode_messages(self.buffer)
+
+            if messages:
+                # Put back the following messages
+                for message_type, payload in reversed(messages[1:]):
+                    self.buffer[0:0] = encode_message(message_type, payload)
+
+                return messages[0]
+
+            chunk = self.socket.recv(65536)
+            if not chunk:
+                raise ConnectionError("The server closed the connection")
+
+            self.buffer.extend(chunk)
+
+    def receive_gesture(self):
+        """
+        Wait for a gesture
+
+        :return: a tuple ( index of the sample, gesture_id, confidence )
+        """
+        while not self.gestures:
+            self.handle_message(*self.receive_message())
+
+        return self.gestures.popleft()
+
+    def handle_message(self, message_type, payload):
+        if message_type == MessageType.GESTURE:
+            self.gestures.append(decode_gesture(payload))
+        elif message_type == MessageType.ERROR:
+            raise ValueError(payload.decode("utf-8"))
+
+    def request_health(self):
+        """
+        Return the metrics of the server
+        """
+        self.socket.sendall(encode_message(MessageType.HEALTH))
+
+        while True:
+            message_type, payload = self.receive_message()
+
+            if message_type == MessageType.HEALTH:
+                return json.loads(payload.decode("utf-8"))
+
+            self.handle_message(message_type, payload)
@@ -87,6 +87,77 @@ class AbstractDataReaderTestCase(unittest.TestCase):
         # The mainloop function must be abstract
         self.assertRaises(NotImplementedError, self.abstract_data_reader.mainloop)
 
+    def test_dispatch_line(self):
+        sample_manager = MockSampleManager()
+        self.abstract_data_reader.attach_manager(sample_manager)
+
+        self.abstract_data_reader.dispatch_line("STARTING BATCH")
+        self.assertEqual(sample_manager.received_signal, ControlSignal.START)
+
+        self.abstract_data_reader.dispatch_line("START -36 1968 16060 END")
+        self.assertEqual(sample_manager.received_data, [-36, 1968, 16060])
+
+        # Wrong number of values and values that can't be converted
+        self.abstract_data_reader.dispatch_line("START -36 1968 END", expected_axis=3)
+        self.assertEqual(sample_manager.received_signal, ControlSignal.ERROR)
+        sample_manager.received_signal = None
+        self.abstract_data_reader.dispatch_line("START -36 x 1 END")
+        self.assertEqual(sample_manager.received_signal, ControlSignal.ERROR)
+
+        self.abstract_data_reader.dispatch_line("")
+        self.assertEqual(sample_manager.received_signal, ControlSignal.TIMEOUT)
+
+    def test_axes_selected_at_parse_time(self):
+        data_reader = AbstractDataReader(axes=[2, 0])
+        sample_manager = MockSampleManager()
+        data_reader.attach_manager(sample_manager)
+
+        # The unused value is never converted, so it can't produce an error
+        data_reader.dispatch_line("START 1 unused 3 END")
+        self.assertEqual(sample_manager.received_data, [3, 1])
+        self.assertIsNone(sample_manager.received_signal)
+
+        data_reader.dispatch_line("START 1 2 END")
+        self.assertEqual(sample_manager.received_signal, ControlSignal.ERROR)
+
+    def test_decimation_removes_aliasing(self):
+        data_reader = AbstractDataReader(decimation=4)
+        sample_manager = MockSampleManager()
+        data_reader.attach_manager(sample_manager)
+
+        # A slow and a fast sine wave, the fast one is above the new Nyquist rate
+        t = np.arange(400)
+        frames = np.column_stack((np.sin(2 * np.pi * t / 100.0), np.sin(2 * np.pi * 0.4 * t)))
+        for frame in frames:
+            data_reader.notify_data(frame)
+
+        received = np.array(sample_manager.received_frames)
+        self.assertEqual(received.shape, (100, 2))
+
+        # After the transient, the slow wave is preserved and the fast one is removed
+        self.assertGreater(np.abs(received[50:, 0]).max(), 0.9)
+        self.assertLess(np.abs(received[50:, 1]).max(), 0.05)
+
+    def test_decimation_restarts_with_each_recording(self):
+        data_reader = AbstractDataReader(decimation=4)
+        sample_manager = MockSampleManager()
+        data_reader.attach_manager(sample_manager)
+
+        data_reader.notify_signal(ControlSignal.START)
+        for n in range(10):
+            data_reader.notify_data([float(n)])
+        data_reader.notify_signal(ControlSignal.STOP)
+
+        first_recording = sample_manager.received_frames
+        sample_manager.received_frames = []
+
+        # The second recording is filtered as if it were the first one
+        data_reader.notify_signal(ControlSignal.START)
+        for n in range(10):
+            data_reader.notify_data([float(n)])
+
+        self.assertTrue(np.allclose(sample_manager.received_frames, first_recording))
+
 
 class SenderTestCase(unittest.TestCase):
     """
@@ -129,8 +200,29 @@ class SenderTestCase(unittest.TestCase):
         self.assertIsNone(receiver.received_sample)
         # Notify the receivers
         self.sender.notify_receivers(sample)
-        # The received sample must be equal to the sent one
-        self.assertEqual(receiver.received_sample, sample)
+        # The received sample must be a view of the sent one
+        self.assertIs(receiver.received_sample.data.base, sample.data)
+
+
+    def test_receivers_do_not_affect_each_other(self):
+        sample = Sample([[1, -2], [3, -4]])
+
+        # The middleware modifies the sample it receives
+        middleware = AbstractMiddleware()
+        middleware.process_sample = lambda received: received.abs() or received
+        middleware_receiver = MockReceiver()
+        middleware.attach_receiver(middleware_receiver)
+
+        receiver = MockReceiver()
+
+        self.sender.attach_receiver(middleware)
+        self.sender.attach_receiver(receiver)
+
+        self.sender.notify_receivers(sample)
+
+        self.assertTrue(np.allclose(middleware_receiver.received_sample.data, [[1, 2], [3, 4]]))
+        self.assertTrue(np.allclose(receiver.received_sample.data, [[1, -2], [3, -4]]))
+        self.assertTrue(np.allclose(sample.data, [[1, -2], [3, -4]]))
 
 
 class AbstractSampleManagerTestCase(unittest.TestCase):
@@ -175,8 +267,8 @@ class AbstractSampleManagerTestCase(unittest.TestCase):
         self.assertIsNone(receiver.received_sample)
         # Notify the receivers
         self.abstract_sample_manager.notify_receivers(sample)
-        # The received sample must be equal to the sent one
-        self.assertEqual(receiver.received_sample, sample)
+        # The received sample must be a view of the sent one
+        self.assertIs(receiver.received_sample.data.base, sample.data)
 
     def test_receive_data_not_implemented(self):
         # The function must be abstract
@@ -264,8 +356,8 @@ class AbstractMiddlewareTestCase(unittest.TestCase):
         self.assertIsNone(receiver.received_sample)
         # Notify the receivers
         self.abstract_middleware.notify_receivers(sample)
-        # The received sample must be equal to the sent one
-        self.assertEqual(receiver.received_sample, sample)
+        # The received sample must be a view of the sent one
+        self.assertIs(receiver.received_sample.data.base, sample.data)
 
     def test_receive_sample_and_notify_receivers(self):
         sample = Sample([[]])
@@ -276,8 +368,8 @@ class AbstractMiddlewareTestCase(unittest.TestCase):
         self.assertIsNone(receiver.received_sample)
         # Send the sample to the receiver
         self.abstract_middleware.receive_sample(sample)
-        # The received sample must be equal to the sent one
-        self.assertEqual(receiver.received_sample, sample)
+        # The received sample must be a view of the sent one
+        self.assertIs(receiver.received_sample.data.base, sample.data)
 
     def test_process_sample_should_not_process(self):
         sample = Sample([[]])
@@ -325,6 +417,38 @@ class AbstractClassifierTestCase(unittest.TestCase):
     def test_at_least_one_dataset_or_model_must_be_defined_should_raise_error(self):
         self.assertRaises(ValueError, AbstractClassifier)
 
+    def test_axes_projection(self):
+        classifier = AbstractClassifier(dataset_path="test_dir_abstract_classifier", axes=[2])
+
+        # The samples of the dataset are projected, the ones already projected are left unchanged
+        self.assertEqual(classifier.preprocess_sample(Sample(data=[[1, 2, 3]])).data.tolist(), [[3]])
+        self.assertEqual(classifier.preprocess_sample(Sample(data=[[3]], axes=[2])).data.tolist(), [[3]])
+
+        # The samples of a reader configured for the classifier contain only its axis
+        data_reader = AbstractDataReader()
+        sample_manager = MockSampleManager()
+        data_reader.attach_manager(sample_manager)
+        data_reader.configure_for_classifier(classifier)
+        self.assertEqual(data_reader.axes, [2])
+        self.assertEqual(sample_manager.axes, [2])
+
+    def test_axes_reordering(self):
+        classifier = AbstractClassifier(dataset_path="test_dir_abstract_classifier", axes=[1, 0])
+
+        # The axis are reordered even if the number of axis doesn't change
+        self.assertEqual(classifier.preprocess_sample(Sample(data=[[1, 2]])).data.tolist(), [[2, 1]])
+
+        # A sample that contains other axis can't be projected
+        self.assertRaises(ValueError, classifier.preprocess_sample, Sample(data=[[1, 2]], axes=[0, 2]))
+
+    def test_predict_with_confidence_uses_most_probable_gesture(self):
+        classifier = MockThresholdClassifier(threshold=5)
+
+        # The inner prediction disagrees with the probabilities, that are used instead
+        classifier.predict_sample = lambda sample: "low"
+
+        self.assertEqual(classifier.predict_with_confidence(Sample(data=[[10]])), ("high", 1.0))
+
     def test_load_gestures_ids_should_fail_if_called_before_loading_samples_filenames(self):
         self.assertRaises(ValueError, self.classifier.load_gestures_ids)
 
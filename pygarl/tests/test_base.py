@@ -1,5 +1,6 @@
 import unittest
 import os
+import threading
 import shutil
 from pygarl.abstracts import *
 from pygarl.mocks import *
@@ -72,6 +73,74 @@ class SampleTestCase(unittest.TestCase):
 
         self.assertEqual(sample.data.tolist(), [[0, 0, 0], [2, 4, 8], [4, 8, 16]])
 
+    def test_derived_arrays_are_cached(self):
+        sample = Sample(data=[[1, 2], [3, 6], [5, 4]])
+
+        gradient = sample.gradient()
+
+        self.assertIs(sample.gradient(), gradient)
+        self.assertIs(sample.fft_magnitude(), sample.fft_magnitude())
+        self.assertTrue(np.allclose(sample.axis_stats()[0], [3, 4]))
+
+        # The cached arrays can't be modified
+        self.assertRaises(ValueError, gradient.fill, 0)
+
+    def test_cache_invalidated_by_mutators(self):
+        sample = Sample(data=[[1, 2], [3, 6], [5, 4]])
+
+        for mutate in (lambda: sample.subtract(1), sample.abs, lambda: sample.scale_frames(4),
+                       lambda: sample.trim(0), sample.normalize_frames, lambda: sample.rolling_mean(2)):
+            gradient = sample.gradient()
+            stats = sample.axis_stats()
+
+            mutate()
+
+            self.assertIsNot(sample.gradient(), gradient)
+            self.assertIsNot(sample.axis_stats(), stats)
+            self.assertTrue(np.allclose(sample.gradient(), Sample(data=sample.data).gradient()))
+
+    def test_share_without_copying(self):
+        sample = Sample(data=[[1, 2], [3, 6], [5, 4]], gesture_id="a")
+        gradient = sample.gradient()
+
+        shared = sample.share()
+
+        self.assertTrue(np.shares_memory(shared.data, sample.data))
+        self.assertIs(shared.gradient(), gradient)
+        self.assertEqual(shared.gesture_id, "a")
+
+        # The shared data can't be modified in place, the array of the caller is left writable
+        self.assertRaises(ValueError, shared.data.fill, 0)
+        self.assertTrue(sample.data.flags.writeable)
+
+    def test_data_not_copied_when_ownership_is_handed_over(self):
+        data = np.array([[1.0, 2.0], [3.0, 4.0]])
+
+        self.assertIs(Sample(data=data, copy=False).data, data)
+        self.assertIsNot(Sample(data=data).data, data)
+
+    def test_shared_sample_copied_on_write(self):
+        sample = Sample(data=[[1, 2], [3, 6], [5, 4]])
+        shared = sample.share()
+
+        shared.subtract(1)
+        shared.abs()
+
+        self.assertTrue(np.allclose(sample.data, [[1, 2], [3, 6], [5, 4]]))
+        self.assertTrue(np.allclose(shared.data, [[0, 1], [2, 5], [4, 3]]))
+
+        # make_writable gives the sample its own data
+        sample.make_writable()
+        sample.data[0, 0] = 10
+
+        self.assertEqual(shared.data[0, 0], 0)
+
+    def test_rolling_mean(self):
+        sample = Sample(data=[[1, 0], [3, 2], [5, 4]])
+        sample.rolling_mean(2)
+
+        self.assertTrue(np.allclose(sample.data, [[1, 0], [2, 1], [4, 3]]))
+
     def test_get_linearized(self):
         sample = Sample(data=[[0, 0, 0], [1, 2, 4], [2, 4, 8]])
         self.assertEqual(sample.data.tolist(), [[0, 0, 0], [1, 2, 4], [2, 4, 8]])
@@ -168,5 +237,136 @@ class CallbackManagerTestCase(unittest.TestCase):
         self.assertTrue(receiver1.received)
         self.assertTrue(receiver2.received)
 
+
+class AsyncCallbackManagerTestCase(unittest.TestCase):
+    """
+    Tests to check AsyncCallbackManager behaviour
+    """
+    def setUp(self):
+        self.manager = AsyncCallbackManager(workers=2, max_backlog=5)
+        self.received = []
+
+    def tearDown(self):
+        self.manager.stop()
+        self.manager = None
+
+    def test_callbacks_called_in_order(self):
+        self.manager.attach_callback('my_gesture', lambda gesture_id: self.received.append(gesture_id))
+
+        for n in range(5):
+            self.manager.receive_gesture('my_gesture')
+        self.manager.wait()
+
+        self.assertEqual(self.received, ['my_gesture'] * 5)
+        self.assertEqual(self.manager.get_metrics()['dispatched'], 5)
+
+    def test_receive_gesture_does_not_wait_for_the_callback(self):
+        release = threading.Event()
+        self.manager.attach_callback('my_gesture', lambda gesture_id: release.wait(5))
+
+        # The callback is blocked, but receive_gesture returns immediately
+        self.manager.receive_gesture('my_gesture')
+        self.assertEqual(self.manager.get_metrics()['dispatched'], 0)
+
+        release.set()
+        self.manager.wait()
+        self.assertEqual(self.manager.get_metrics()['dispatched'], 1)
+
+    def test_drop_oldest_when_backlog_is_full(self):
+        release = threading.Event()
+
+        # Use a single worker, so that both gestures are dispatched by the blocked one
+        self.manager.stop()
+        self.manager = AsyncCallbackManager(workers=1, max_backlog=5)
+        self.manager.attach_callback('block', lambda gesture_id: release.wait(5))
+        self.manager.attach_callback('my_gesture', lambda gesture_id: self.received.append(gesture_id))
+
+        self.manager.receive_gesture('block')
+
+        for n in range(10):
+            self.manager.receive_gesture('my_gesture')
+
+        release.set()
+        self.manager.wait()
+
+        self.assertLessEqual(len(self.received), 5)
+        self.assertGreaterEqual(self.manager.get_metrics()['dropped'], 5)
+
+    def test_slow_callbacks_and_errors_are_counted(self):
+        self.manager.callback_timeout = 0.01
+
+        def failing_callback(gesture_id):
+            raise RuntimeError("Callback error")
+
+        self.manager.attach_callback('slow', lambda gesture_id: threading.Event().wait(0.05))
+        self.manager.attach_callback('failing', failing_callback)
+
+        self.manager.receive_gesture('slow')
+        self.manager.receive_gesture('failing')
+        self.manager.wait()
+
+        metrics = self.manager.get_metrics()
+        self.assertEqual(metrics['slow_callbacks'], 1)
+        self.assertEqual(metrics['errors'], 1)
+        self.assertEqual(metrics['dispatched'], 2)
+
+
+class GestureSmootherTestCase(unittest.TestCase):
+    """
+    Tests to check GestureSmoother behaviour
+    """
+    def setUp(self):
+        self.time = 0.0
+        self.callback_manager = MockCallbackManager()
+
+    def create_smoother(self, **kwargs):
+        smoother = GestureSmoother(clock=lambda: self.time, **kwargs)
+        smoother.attach_callback_manager(self.callback_manager)
+        return smoother
+
+    def test_default_forwards_every_gesture(self):
+        smoother = self.create_smoother()
+
+        for gesture_id in ['a', 'a', 'b']:
+            smoother.receive_gesture(gesture_id)
+
+        self.assertEqual(self.callback_manager.received_gestures, ['a', 'a', 'b'])
+
+    def test_majority_vote_removes_bursts_and_flickering(self):
+        smoother = self.create_smoother(vote_size=3)
+
+        for gesture_id in ['a', 'a', 'b', 'a', 'a', 'a', 'b', 'b', 'b']:
+            smoother.receive_gesture(gesture_id)
+
+        self.assertEqual(self.callback_manager.received_gestures, ['a', 'b'])
+        self.assertEqual(smoother.received, 9)
+        self.assertEqual(smoother.forwarded, 2)
+
+    def test_min_interval_per_gesture(self):
+        smoother = self.create_smoother(min_interval={'a': 1.0})
+
+        for gesture_id in ['a', 'a', 'b', 'b']:
+            smoother.receive_gesture(gesture_id)
+            self.time += 0.4
+
+        self.time += 1.0
+        smoother.receive_gesture('a')
+
+        self.assertEqual(self.callback_manager.received_gestures, ['a', 'b', 'b', 'a'])
+
+    def test_confidence_hysteresis(self):
+        smoother = self.create_smoother(vote_size=3, enter_threshold=0.8, exit_threshold=0.5)
+
+        # A low confidence can't start a gesture, but keeps the held one
+        for gesture_id, confidence in [('a', 0.6), ('a', 0.9), ('a', 0.9), ('a', 0.6), ('a', 0.6),
+                                       ('a', 0.3), ('a', 0.3), ('a', 0.6), ('a', 0.9), ('a', 0.9)]:
+            smoother.receive_gesture(gesture_id, confidence)
+
+        self.assertEqual(self.callback_manager.received_gestures, ['a', 'a'])
+        self.assertEqual(self.callback_manager.received_confidence, 0.9)
+
+    def test_invalid_thresholds_should_raise_error(self):
+        self.assertRaises(ValueError, GestureSmoother, enter_threshold=0.5, exit_threshold=0.8)
+
 if __name__ == '__main__':
     unittest.main()
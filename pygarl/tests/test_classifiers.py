@@ -1,8 +1,11 @@
 import unittest
 import shutil
-from pygarl.classifiers import SVMClassifier
+from pygarl.classifiers import SVMClassifier, OnlineClassifier, DTWClassifier, DistilledClassifier, \
+    ApproxKernelSVMClassifier
 from pygarl.mocks import *
 from pygarl.base import *
+from pygarl.recorders import FileGestureRecorder
+from pygarl.middlewares import PCAMiddleware
 
 
 class SVMClassifierTestCase(unittest.TestCase):
@@ -118,5 +121,364 @@ class SVMClassifierTestCase(unittest.TestCase):
         self.assertEqual(new_classifier.predict(test_sample2), "1")
 
 
+class ApproxKernelSVMClassifierTestCase(unittest.TestCase):
+    """
+    Tests to check ApproxKernelSVMClassifier consistency.
+    The gestures are not linearly separable, as the samples of the gesture "middle"
+    are between the ones of the gestures "low" and "high".
+    """
+
+    def setUp(self):
+        # Create a test directory if it doesn't exists
+        if not os.path.exists("test_dir_approx_classifier"):
+            os.makedirs("test_dir_approx_classifier")
+
+        for n in range(15):
+            for gesture_id, value in (("low", 0), ("middle", 5), ("high", 10)):
+                Sample(data=[[value + (n % 3) * 0.3], [value]], gesture_id=gesture_id).save_to_file(
+                    os.path.join("test_dir_approx_classifier", "{gesture}_{n}.txt".format(gesture=gesture_id, n=n)))
+
+    def tearDown(self):
+        # Destroy the test directory
+        shutil.rmtree("test_dir_approx_classifier")
+
+    def check_classifier(self, classifier):
+        classifier.load()
+
+        self.assertGreater(classifier.train_model(), 0.9)
+        self.assertEqual(classifier.predict(Sample(data=[[5.2], [5]])), "middle")
+
+        probabilities = classifier.predict_proba(Sample(data=[[10.2], [10]]))
+        self.assertAlmostEqual(probabilities.sum(), 1)
+        self.assertEqual(classifier.gestures[int(np.argmax(probabilities))], "high")
+
+    def test_nystroem_train_and_predict(self):
+        self.check_classifier(ApproxKernelSVMClassifier(dataset_path="test_dir_approx_classifier", n_jobs=1,
+                                                        params={'features__gamma': [0.1], 'svm__C': [10]}))
+
+    def test_rff_train_and_predict(self):
+        self.check_classifier(ApproxKernelSVMClassifier(dataset_path="test_dir_approx_classifier", n_jobs=1,
+                                                        feature_map="rff",
+                                                        params={'features__gamma': [0.1], 'svm__C': [10]}))
+
+    def test_save_and_load_model(self):
+        classifier = ApproxKernelSVMClassifier(dataset_path="test_dir_approx_classifier", n_jobs=1,
+                                               params={'features__gamma': [0.1], 'svm__C': [10]})
+        classifier.load()
+        classifier.train_model()
+
+        model_path = os.path.join("test_dir_approx_classifier", "model.approx")
+        classifier.save_model(model_path)
+
+        new_classifier = ApproxKernelSVMClassifier(model_path=model_path)
+        new_classifier.load()
+
+        self.assertEqual(new_classifier.predict(Sample(data=[[0.3], [0]])), "low")
+
+    def test_invalid_feature_map_should_raise_error(self):
+        self.assertRaises(ValueError, ApproxKernelSVMClassifier, dataset_path="test_dir_approx_classifier",
+                          feature_map="poly")
+
+
+class OnlineClassifierTestCase(unittest.TestCase):
+    """
+    Tests to check OnlineClassifier consistency.
+    The gestures are linearly separable, so that they can be learned by the linear models.
+    """
+
+    def setUp(self):
+        # Create a test directory if it doesn't exists
+        if not os.path.exists("test_dir_online_classifier"):
+            os.makedirs("test_dir_online_classifier")
+
+        # Create the samples of two gestures, one rising and one falling
+        for n in range(20):
+            Sample(data=[[0], [10 + n % 3]], gesture_id="up").save_to_file(
+                os.path.join("test_dir_online_classifier", "up_{n}.txt".format(n=n)))
+            Sample(data=[[10 + n % 3], [0]], gesture_id="down").save_to_file(
+                os.path.join("test_dir_online_classifier", "down_{n}.txt".format(n=n)))
+
+        self.classifier = OnlineClassifier(dataset_path="test_dir_online_classifier", test_size=0.25,
+                                           n_epochs=10)
+
+    def tearDown(self):
+        # Destroy the test directory
+        shutil.rmtree("test_dir_online_classifier")
+
+        self.classifier = None
+
+    def test_train_and_predict(self):
+        self.classifier.load()
+
+        self.assertGreater(self.classifier.train_model(), 0.9)
+
+        self.assertEqual(self.classifier.predict(Sample(data=[[0], [11]])), "up")
+        self.assertEqual(self.classifier.predict(Sample(data=[[11], [0]])), "down")
+
+    def test_partial_fit_adds_new_gesture(self):
+        self.classifier.load()
+        self.classifier.train_model()
+
+        # Learn a new gesture without retraining
+        for n in range(20):
+            self.classifier.partial_fit([Sample(data=[[-10], [-10]], gesture_id="low"),
+                                         Sample(data=[[0], [10]], gesture_id="up"),
+                                         Sample(data=[[10], [0]], gesture_id="down")])
+
+        self.assertIn("low", self.classifier.gestures)
+        self.assertEqual(self.classifier.predict(Sample(data=[[-10], [-10]])), "low")
+        self.assertEqual(self.classifier.predict(Sample(data=[[0], [11]])), "up")
+
+    def test_partial_fit_does_not_modify_sample(self):
+        self.classifier.autoscale_size = 4
+
+        sample = Sample(data=[[0], [10]], gesture_id="up")
+        self.classifier.partial_fit([sample])
+
+        self.assertEqual(sample.data.tolist(), [[0], [10]])
+
+    def test_predict_does_not_modify_sample(self):
+        self.classifier.load()
+        self.classifier.train_model()
+
+        sample = Sample(data=[[0], [11]])
+        self.classifier.predict(sample)
+        self.classifier.predict_with_confidence(sample)
+
+        self.assertEqual(sample.data.tolist(), [[0], [11]])
+
+    def test_update_from_dataset_learns_only_new_samples(self):
+        self.classifier.load()
+        self.classifier.train_model()
+
+        # All the samples have already been loaded
+        self.assertEqual(self.classifier.update_from_dataset(), 0)
+
+        Sample(data=[[0], [12]], gesture_id="up").save_to_file(
+            os.path.join("test_dir_online_classifier", "up_new.txt"))
+
+        self.assertEqual(self.classifier.update_from_dataset(), 1)
+        self.assertEqual(self.classifier.update_from_dataset(), 0)
+
+    def test_train_streaming(self):
+        self.assertGreater(self.classifier.train_streaming(chunk_size=8), 0.9)
+
+        # The held-out files are never used for training
+        self.assertGreater(self.classifier.confusion_matrix.sum(), 0)
+        self.assertLess(self.classifier.confusion_matrix.sum(), 40)
+
+        # The bound covers at least the chunk array of 8 samples with 2 features
+        self.assertGreaterEqual(self.classifier.memory_bound, 8 * 2 * np.dtype(float).itemsize)
+
+        # The memory bound depends on the chunk size, not on the dataset size
+        for n in range(20, 100):
+            Sample(data=[[0], [10 + n % 3]], gesture_id="up").save_to_file(
+                os.path.join("test_dir_online_classifier", "up_{n}.txt".format(n=n)))
+
+        larger_classifier = OnlineClassifier(dataset_path="test_dir_online_classifier", test_size=0.25,
+                                             n_epochs=1)
+        larger_classifier.train_streaming(chunk_size=8)
+
+        self.assertEqual(larger_classifier.memory_bound, self.classifier.memory_bound)
+
+        self.assertEqual(self.classifier.predict(Sample(data=[[11], [0]])), "down")
+
+    def test_train_streaming_fits_trainable_middlewares(self):
+        middleware = PCAMiddleware(n_components=1)
+        classifier = OnlineClassifier(dataset_path="test_dir_online_classifier", test_size=0.25, n_epochs=10,
+                                      trainable_middlewares=[middleware])
+
+        self.assertGreater(classifier.train_streaming(chunk_size=8, fit_size=10), 0.9)
+        self.assertTrue(middleware.is_fitted)
+        self.assertEqual(middleware.pca.n_samples_, 10)
+
+    def test_samples_learned_from_recorder_are_not_learned_again(self):
+        self.classifier.load()
+        self.classifier.train_model()
+
+        recorder = FileGestureRecorder("test_dir_online_classifier", forced_gesture_id="up")
+        recorder.attach_receiver(self.classifier)
+
+        for n in range(3):
+            recorder.receive_sample(Sample(data=[[0], [11]]))
+
+        self.assertEqual(self.classifier.update_from_dataset(), 0)
+
+    def test_checkpoint_is_not_learned_as_sample(self):
+        self.classifier.checkpoint_path = os.path.join("test_dir_online_classifier", "checkpoint.model")
+        self.classifier.checkpoint_every = 1
+
+        self.classifier.load()
+        self.classifier.train_model()
+
+        self.assertEqual(self.classifier.update_from_dataset(), 0)
+
+    def test_probabilities_with_loss_without_estimates(self):
+        self.classifier.loss = "hinge"
+        self.classifier.load()
+        self.classifier.train_model()
+
+        probabilities = self.classifier.predict_proba(Sample(data=[[0], [11]]))
+
+        self.assertAlmostEqual(probabilities.sum(), 1)
+        self.assertEqual(self.classifier.gestures[np.argmax(probabilities)], "up")
+
+    def test_checkpoint(self):
+        model_path = os.path.join("test_dir_online_classifier", "checkpoint.model")
+        self.classifier.checkpoint_path = model_path
+        self.classifier.checkpoint_every = 10
+
+        self.classifier.load()
+        self.classifier.train_model()
+
+        self.assertTrue(os.path.exists(model_path))
+
+        # Load the checkpoint and check that it works correctly
+        new_classifier = OnlineClassifier(model_path=model_path)
+        new_classifier.load()
+
+        self.assertEqual(new_classifier.predict(Sample(data=[[11], [0]])), "down")
+
+
+class DTWClassifierTestCase(unittest.TestCase):
+    """
+    Tests to check DTWClassifier consistency.
+    The samples of each gesture are the same movement performed at different speeds.
+    """
+
+    def setUp(self):
+        # Create a test directory if it doesn't exists
+        if not os.path.exists("test_dir_dtw_classifier"):
+            os.makedirs("test_dir_dtw_classifier")
+
+        for n in range(10):
+            # A single peak, reached at different times
+            peak = [[0], [0]] + [[0]] * n + [[10], [0]]
+            # Two peaks, with a variable distance between them
+            double_peak = [[0], [10]] + [[0]] * n + [[10], [0]]
+
+            Sample(data=peak, gesture_id="peak").save_to_file(
+                os.path.join("test_dir_dtw_classifier", "peak_{n}.txt".format(n=n)))
+            Sample(data=double_peak, gesture_id="double").save_to_file(
+                os.path.join("test_dir_dtw_classifier", "double_{n}.txt".format(n=n)))
+
+        self.classifier = DTWClassifier(dataset_path="test_dir_dtw_classifier", autoscale_size=20,
+                                        window=0.5, n_neighbors=3)
+
+    def tearDown(self):
+        # Destroy the test directory
+        shutil.rmtree("test_dir_dtw_classifier")
+
+        self.classifier = None
+
+    def test_train_and_predict(self):
+        self.classifier.load()
+
+        self.assertGreater(self.classifier.train_model(), 0.9)
+
+        self.assertEqual(self.classifier.predict(Sample(data=[[0]] * 6 + [[10], [0]])), "peak")
+        self.assertEqual(self.classifier.predict(Sample(data=[[0], [10], [0], [0], [10], [0]])), "double")
+
+    def test_candidates_are_pruned(self):
+        self.classifier.load()
+        self.classifier.train_model()
+
+        self.classifier.predict(Sample(data=[[0]] * 6 + [[10], [0]]))
+
+        self.assertLess(self.classifier.last_dtw_count, len(self.classifier.templates))
+
+    def test_save_and_load_model(self):
+        self.classifier.load()
+        self.classifier.train_model()
+
+        model_path = os.path.join("test_dir_dtw_classifier", "model.dtw")
+        self.classifier.save_model(model_path)
+
+        new_classifier = DTWClassifier(model_path=model_path)
+        new_classifier.load()
+
+        self.assertEqual(new_classifier.predict(Sample(data=[[0], [10], [0], [0], [10], [0]])), "double")
+
+
+class DistilledClassifierTestCase(unittest.TestCase):
+    """
+    Tests to check DistilledClassifier consistency.
+    The student mimics an SVMClassifier trained on two linearly separable gestures.
+    """
+
+    def setUp(self):
+        # Create a test directory if it doesn't exists
+        if not os.path.exists("test_dir_distilled_classifier"):
+            os.makedirs("test_dir_distilled_classifier")
+
+        # Create the samples of two gestures, one rising and one falling
+        for n in range(20):
+            Sample(data=[[0, 1], [10 + n % 3, 2]], gesture_id="up").save_to_file(
+                os.path.join("test_dir_distilled_classifier", "up_{n}.txt".format(n=n)))
+            Sample(data=[[10 + n % 3, 2], [0, 1]], gesture_id="down").save_to_file(
+                os.path.join("test_dir_distilled_classifier", "down_{n}.txt".format(n=n)))
+
+        self.teacher = SVMClassifier(dataset_path="test_dir_distilled_classifier", n_jobs=1,
+                                     params={'C': [1.0], 'kernel': ['rbf']})
+        self.teacher.load()
+        self.teacher.train_model()
+
+    def tearDown(self):
+        # Destroy the test directory
+        shutil.rmtree("test_dir_distilled_classifier")
+
+        self.teacher = None
+
+    def test_mlp_student_mimics_the_teacher(self):
+        classifier = DistilledClassifier(teacher=self.teacher, dataset_path="test_dir_distilled_classifier")
+        classifier.load()
+
+        self.assertGreater(classifier.train_model(), 0.9)
+        self.assertEqual(classifier.gestures, self.teacher.gestures)
+        self.assertGreater(classifier.report['agreement'], 0.9)
+        self.assertGreater(classifier.report['teacher_latency'], 0)
+
+        self.assertEqual(classifier.predict(Sample(data=[[0, 1], [11, 2]])), "up")
+        self.assertEqual(classifier.predict(Sample(data=[[11, 2], [0, 1]])), "down")
+
+    def test_rff_student_saved_and_loaded(self):
+        classifier = DistilledClassifier(teacher=self.teacher, student="rff", gamma=0.01,
+                                         dataset_path="test_dir_distilled_classifier")
+        classifier.load()
+
+        self.assertGreater(classifier.train_model(), 0.9)
+
+        model_path = os.path.join("test_dir_distilled_classifier", "model.distilled")
+        classifier.save_model(model_path)
+
+        new_classifier = DistilledClassifier(model_path=model_path)
+        new_classifier.load()
+
+        self.assertEqual(new_classifier.report, classifier.report)
+        self.assertEqual(new_classifier.predict(Sample(data=[[12, 2], [0, 1]])), "down")
+
+    def test_trainable_middlewares_saved_with_the_model(self):
+        classifier = SVMClassifier(dataset_path="test_dir_distilled_classifier", n_jobs=1,
+                                   params={'C': [1.0], 'kernel': ['rbf']},
+                                   trainable_middlewares=[PCAMiddleware(n_components=2)])
+        classifier.load()
+
+        self.assertEqual(len(classifier.x_data[0]), 2)
+        self.assertGreater(classifier.train_model(), 0.9)
+
+        model_path = os.path.join("test_dir_distilled_classifier", "model.pca")
+        classifier.save_model(model_path)
+
+        new_classifier = SVMClassifier(model_path=model_path)
+        new_classifier.load()
+
+        self.assertTrue(new_classifier.trainable_middlewares[0].is_fitted)
+        self.assertEqual(new_classifier.predict(Sample(data=[[0, 1], [11, 2]])), "up")
+
+    def test_invalid_student_should_raise_error(self):
+        self.assertRaises(ValueError, DistilledClassifier, teacher=self.teacher, student="tree",
+                          dataset_path="test_dir_distilled_classifier")
+
+
 if __name__ == '__main__':
     unittest.main()
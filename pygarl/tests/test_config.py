@@ -0,0 +1,124 @@
+import unittest
+import json
+import os
+import shutil
+
+from pygarl.abstracts import *
+from pygarl.config import PipelineSpec, load_spec, tomllib
+from pygarl.middlewares import LengthThresholdMiddleware
+from pygarl.pipeline import Pipeline
+from pygarl.sample_managers import StreamSampleManager
+
+# To execute tests, go to the project main directory and type:
+# python -m unittest discover
+
+# Gestures received by the callbacks of the tests
+received_gestures = []
+
+
+def record_gesture(gesture_id):
+    received_gestures.append(gesture_id)
+
+
+def get_branch(max_len, absolute_values=False):
+    return {
+        "stages": [
+            {"type": "StreamSampleManager", "params": {"window": 2, "step": 2}},
+            {"type": "LengthThresholdMiddleware", "params": {"min_len": 2, "max_len": max_len}},
+            {"type": "HighestAxisPredictor", "params": {"absolute_values": absolute_values}},
+        ],
+        "callbacks": {"0": "pygarl.tests.test_config.record_gesture",
+                      "1": "pygarl.tests.test_config.record_gesture"},
+    }
+
+
+class PipelineSpecTestCase(unittest.TestCase):
+    """
+    Tests to check PipelineSpec behaviour
+    """
+    def setUp(self):
+        del received_gestures[:]
+
+        self.spec = {
+            "reader": {"type": "pygarl.abstracts.AbstractDataReader"},
+            "branches": [get_branch(100), get_branch(100, absolute_values=True), get_branch(50)],
+        }
+
+    def send_frames(self, reader):
+        reader.notify_signal(ControlSignal.START)
+        # The last frame is shorter than the minimum length, so it's suppressed on STOP
+        for frame in ([1, 0], [1, 0], [0, 1], [0, 1], [1, 0]):
+            reader.notify_data(frame)
+        reader.notify_signal(ControlSignal.STOP)
+
+    def test_identical_stages_shared(self):
+        pipeline = PipelineSpec(self.spec).build()
+
+        # A single manager, two length middlewares and three predictors
+        self.assertEqual(len(pipeline.reader.managers), 1)
+        self.assertIsInstance(pipeline.reader.managers[0], StreamSampleManager)
+        self.assertEqual(len(pipeline.stages), 6)
+        self.assertEqual(pipeline.get_shared_count(), 3)
+
+        # The first two branches share the manager and the middleware
+        self.assertIs(pipeline.branches[0][1], pipeline.branches[1][1])
+        self.assertIsNot(pipeline.branches[0][2], pipeline.branches[1][2])
+        self.assertIsNot(pipeline.branches[0][1], pipeline.branches[2][1])
+        self.assertIsInstance(pipeline.branches[2][1], LengthThresholdMiddleware)
+
+    def test_gestures_received_by_every_branch(self):
+        pipeline = PipelineSpec(self.spec).build()
+
+        self.send_frames(pipeline.reader)
+
+        self.assertEqual(len(pipeline.callback_managers), 3)
+        self.assertEqual(received_gestures.count("0"), 3)
+        self.assertEqual(received_gestures.count("1"), 3)
+
+    def test_compiled_branches(self):
+        self.spec["compile"] = True
+        pipeline = PipelineSpec(self.spec).build()
+
+        manager = pipeline.reader.managers[0]
+        self.assertEqual(len(manager.receivers), 1)
+        self.assertIsInstance(manager.receivers[0], Pipeline)
+
+        self.send_frames(pipeline.reader)
+
+        self.assertEqual(len(received_gestures), 6)
+
+    def test_invalid_specs_should_raise_error(self):
+        self.assertRaises(ValueError, PipelineSpec({"branches": []}).build)
+
+        # A predictor can't be followed by other stages
+        self.spec["branches"][0]["stages"].append({"type": "AbstractMiddleware"})
+        self.assertRaises(ValueError, PipelineSpec(self.spec).build)
+
+        self.spec["branches"][0]["stages"][-1] = {"type": "UnknownMiddleware"}
+        self.assertRaises(ValueError, PipelineSpec(self.spec).build)
+
+    def test_load_spec_from_files(self):
+        if not os.path.exists("test_dir_config"):
+            os.makedirs("test_dir_config")
+
+        try:
+            json_path = os.path.join("test_dir_config", "pipeline.json")
+            with open(json_path, "w") as spec_file:
+                json.dump(self.spec, spec_file)
+
+            self.assertEqual(load_spec(json_path), self.spec)
+
+            if tomllib is not None:
+                toml_path = os.path.join("test_dir_config", "pipeline.toml")
+                with open(toml_path, "w") as spec_file:
+                    spec_file.write('[reader]\ntype = "pygarl.abstracts.AbstractDataReader"\n\n'
+                                    '[[branches]]\nstages = [{type = "StreamSampleManager"}]\n')
+
+                pipeline = PipelineSpec.from_file(toml_path).build()
+                self.assertEqual(len(pipeline.stages), 1)
+        finally:
+            shutil.rmtree("test_dir_config")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+import unittest
+import os
+import shutil
+import time
+
+from pygarl.abstracts import ControlSignal
+from pygarl.data_readers import SerialDataReader, FileDataReader, MultiplexDataReader
+from pygarl.mocks import MockSampleManager
+
+# To execute tests, go to the project main directory and type:
+# python -m unittest discover
+
+
+class MultiplexDataReaderTestCase(unittest.TestCase):
+    """
+    Tests to check MultiplexDataReader behaviour
+    """
+    def setUp(self):
+        self.manager = MockSampleManager()
+
+    def poll_until(self, multiplexer, condition):
+        for n in range(50):
+            if condition():
+                return
+            multiplexer.poll(timeout=0.1)
+
+        self.fail("The data has not been received")
+
+    def test_serial_devices_with_pseudo_terminals(self):
+        terminals = [os.openpty() for n in range(2)]
+
+        readers = {device: SerialDataReader(os.ttyname(slave), expected_axis=axis)
+                   for device, (master, slave), axis in zip(("left", "right"), terminals, (2, 1))}
+        multiplexer = MultiplexDataReader(readers)
+        multiplexer.attach_manager(self.manager)
+
+        right_manager = MockSampleManager()
+        multiplexer.attach_device_manager("right", right_manager)
+
+        multiplexer.open()
+        try:
+            left, right = terminals[0][0], terminals[1][0]
+
+            # The fused frames are sent after every device has sent a frame
+            os.write(left, b"START 0 0 END\n")
+            os.write(right, b"START 5 END\r\n")
+            self.poll_until(multiplexer, lambda: len(right_manager.received_frames) == 1)
+
+            os.write(left, b"STARTING BATCH\nSTART 1 2 END\nSTART 3")
+            os.write(left, b" 4 END\n")
+            self.poll_until(multiplexer, lambda: len(self.manager.received_frames) == 2)
+
+            self.assertEqual(self.manager.received_signal, ControlSignal.START)
+            self.assertEqual(self.manager.received_frames, [[1, 2, 5], [3, 4, 5]])
+            self.assertEqual(right_manager.received_frames, [[5]])
+            self.assertEqual(multiplexer.frame_counts, {"left": 3, "right": 1})
+        finally:
+            multiplexer.close()
+
+            for master, slave in terminals:
+                os.close(master)
+                os.close(slave)
+
+    def test_files_read_until_the_end(self):
+        if not os.path.exists("test_dir_multiplex"):
+            os.makedirs("test_dir_multiplex")
+
+        try:
+            readers = {}
+            for device, values in (("a", "1 2"), ("b", "3")):
+                file_path = os.path.join("test_dir_multiplex", device + ".txt")
+                with open(file_path, "w") as data_file:
+                    data_file.write("START {values} END\n".format(values=values) * 100)
+                    # The last line doesn't end with a new line
+                    data_file.write("START {values} END".format(values=values))
+
+                readers[device] = FileDataReader(file_path)
+
+            multiplexer = MultiplexDataReader(readers, reference_device="b")
+            multiplexer.attach_manager(self.manager)
+
+            multiplexer.open()
+            multiplexer.mainloop()
+            multiplexer.close()
+
+            self.assertEqual(multiplexer.frame_counts, {"a": 101, "b": 101})
+            self.assertEqual(self.manager.received_frames[-1], [1, 2, 3])
+        finally:
+            shutil.rmtree("test_dir_multiplex")
+
+    def test_throughput_of_three_devices(self):
+        if not os.path.exists("test_dir_multiplex"):
+            os.makedirs("test_dir_multiplex")
+
+        try:
+            # Two 6-axis IMUs and a piezo sensor
+            readers = {}
+            for device, values in (("left", "1 2 3 4 5 6"), ("right", "1 2 3 4 5 6"), ("piezo", "512")):
+                file_path = os.path.join("test_dir_multiplex", device + ".txt")
+                with open(file_path, "w") as data_file:
+                    data_file.write("START {values} END\n".format(values=values) * 5000)
+
+                readers[device] = FileDataReader(file_path)
+
+            multiplexer = MultiplexDataReader(readers)
+            multiplexer.attach_manager(self.manager)
+
+            start_time = time.perf_counter()
+            multiplexer.open()
+            multiplexer.mainloop()
+            multiplexer.close()
+            frames_per_second = 15000 / (time.perf_counter() - start_time)
+
+            # Far above the 3 kHz of three sensors sampled at 1 kHz
+            self.assertGreater(frames_per_second, 10000)
+            self.assertEqual(self.manager.received_frames[-1], [1, 2, 3, 4, 5, 6, 1, 2, 3, 4, 5, 6, 512])
+        finally:
+            shutil.rmtree("test_dir_multiplex")
+
+    def test_zero_order_hold_at_reference_rate(self):
+        now = [0.0]
+        readers = {"a": FileDataReader("a.txt"), "b": FileDataReader("b.txt")}
+        multiplexer = MultiplexDataReader(readers, reference_rate=10, clock=lambda: now[0])
+        multiplexer.attach_manager(self.manager)
+
+        # The first tick is at 0.1
+        multiplexer.notify_due_ticks()
+
+        # ( time, device, frame ) received, the ticks are checked also between the frames
+        for now[0], device, frame in ((0.0, "a", [1]), (0.01, "b", [10]), (0.1, None, None), (0.15, "a", [2]),
+                                      (0.2, None, None), (0.3, None, None), (0.32, "b", [20]), (0.33, "a", [3])):
+            if device is None:
+                multiplexer.notify_due_ticks()
+            else:
+                multiplexer.receive_device_data(device, frame)
+
+        # Fused frames at 0.1, 0.2 and 0.3, each with the last values received before it
+        self.assertEqual(self.manager.received_frames, [[1, 10], [2, 10], [2, 10]])
+
+        # After a stall, the missed ticks are skipped
+        now[0] = 1.05
+        multiplexer.notify_due_ticks()
+
+        self.assertEqual(self.manager.received_frames[3:], [[3, 20]])
+        self.assertEqual(multiplexer.missed_ticks, 6)
+
+        now[0] = 1.1
+        multiplexer.notify_due_ticks()
+        self.assertEqual(len(self.manager.received_frames), 5)
+
+    def test_ticks_sent_without_new_data(self):
+        master, slave = os.openpty()
+        multiplexer = MultiplexDataReader({"a": SerialDataReader(os.ttyname(slave), expected_axis=1)},
+                                          reference_rate=100)
+        multiplexer.attach_manager(self.manager)
+
+        multiplexer.open()
+        try:
+            os.write(master, b"START 7 END\n")
+            self.poll_until(multiplexer, lambda: multiplexer.frame_counts["a"] == 1)
+
+            # The device doesn't send anything else, the wait ends at each tick
+            for n in range(5):
+                multiplexer.poll()
+
+            self.assertGreaterEqual(len(self.manager.received_frames), 5)
+            self.assertEqual(self.manager.received_frames[-1], [7])
+        finally:
+            multiplexer.close()
+            os.close(master)
+            os.close(slave)
+
+    def test_invalid_reference_device_should_raise_error(self):
+        self.assertRaises(ValueError, MultiplexDataReader, {"a": FileDataReader("a.txt")}, reference_device="b")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+import numpy as np
+from pygarl.dtw import *
+
+# To execute tests, go to the project main directory and type:
+# python -m unittest discover
+
+
+def naive_dtw(query, template, window):
+    """
+    Reference implementation of the DTW distance, used to check the optimized ones
+    """
+    n = query.shape[0]
+    m = template.shape[0]
+    window = max(window, abs(n - m))
+
+    matrix = np.full((n + 1, m + 1), np.inf)
+    matrix[0, 0] = 0
+
+    for i in range(n):
+        start, end = get_band_limits(i, n, m, window)
+        for j in range(start, end + 1):
+            cost = np.sum((query[i] - template[j]) ** 2)
+            matrix[i + 1, j + 1] = cost + min(matrix[i, j], matrix[i, j + 1], matrix[i + 1, j])
+
+    return matrix[n, m]
+
+
+class DTWTestCase(unittest.TestCase):
+    """
+    Tests to check the DTW distance and the lower bounds
+    """
+    def setUp(self):
+        self.random_state = np.random.RandomState(0)
+
+    def test_distance_of_identical_samples_is_zero(self):
+        data = self.random_state.randn(20, 3)
+
+        self.assertEqual(dtw_distance_numpy(data, data, 2), 0)
+
+    def test_distance_matches_reference_implementation(self):
+        for n, m, window in [(20, 20, 3), (15, 22, 2), (1, 5, 0), (30, 30, 30)]:
+            query = self.random_state.randn(n, 2)
+            template = self.random_state.randn(m, 2)
+
+            self.assertAlmostEqual(dtw_distance_numpy(query, template, window),
+                                   naive_dtw(query, template, window))
+
+    @unittest.skipIf(numba is None, "numba is not installed")
+    def test_accelerated_distance_matches_reference_implementation(self):
+        for n, m, window in [(20, 20, 3), (15, 22, 2), (1, 5, 0), (30, 30, 30)]:
+            query = self.random_state.randn(n, 2)
+            template = self.random_state.randn(m, 2)
+
+            self.assertAlmostEqual(dtw_distance(query, template, window, accelerated=True),
+                                   naive_dtw(query, template, window))
+
+        # Early abandon
+        query = self.random_state.randn(20, 2)
+        self.assertEqual(dtw_distance(query, query + 10, 2, best_so_far=1.0, accelerated=True), np.inf)
+
+    def test_early_abandon(self):
+        query = self.random_state.randn(20, 2)
+        template = query + 10
+
+        self.assertEqual(dtw_distance_numpy(query, template, 2, best_so_far=1.0), np.inf)
+
+    def test_lower_bounds_do_not_exceed_distance(self):
+        query = self.random_state.randn(25, 3)
+        templates = self.random_state.randn(10, 25, 3)
+        upper, lower = envelope(templates, 3)
+
+        distances = np.array([dtw_distance_numpy(query, template, 3) for template in templates])
+
+        self.assertTrue(np.all(lb_kim(query, templates) <= distances + 1e-9))
+        self.assertTrue(np.all(lb_keogh(query, upper, lower) <= distances + 1e-9))
+
+
+class SpringMatcherTestCase(unittest.TestCase):
+    """
+    Tests to check the streaming subsequence DTW
+    """
+    def setUp(self):
+        self.template = np.array([[1.0], [5.0], [9.0], [5.0], [1.0]])
+        self.matcher = SpringMatcher(self.template, threshold=0.5)
+
+    def feed(self, frames):
+        """
+        Feed the frames to the matcher and return the confirmed matches
+        """
+        matches = [self.matcher.update(np.array(frame, dtype=float)) for frame in frames]
+        return [match for match in matches if match is not None]
+
+    def test_match_reported_with_start_and_end(self):
+        stream = [[0]] * 10 + self.template.tolist() + [[0]] * 10
+
+        matches = self.feed(stream)
+
+        self.assertEqual(len(matches), 1)
+        start, end, distance = matches[0]
+        self.assertEqual((start, end), (10, 14))
+        self.assertLessEqual(distance, 0.5 * len(self.template))
+
+    def test_slower_gesture_is_matched(self):
+        slow = [[1], [1], [5], [5], [9], [9], [5], [5], [1], [1]]
+        stream = [[0]] * 5 + slow + [[0]] * 10
+
+        matches = self.feed(stream)
+
+        self.assertEqual(len(matches), 1)
+        # The first repeated frame can be aligned with the template start at no cost
+        self.assertIn(matches[0][0], (5, 6))
+
+    def test_different_signal_is_not_matched(self):
+        self.assertEqual(self.feed([[0]] * 30 + [[20]] * 30), [])
+
+    def test_multiple_matches(self):
+        stream = ([[0]] * 5 + self.template.tolist()) * 3 + [[0]] * 5
+
+        self.assertEqual(len(self.feed(stream)), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import numpy as np
+from scipy import signal
+
+from pygarl.filters import SOSFilter
+
+# To execute tests, go to the project main directory and type:
+# python -m unittest discover
+
+
+class SOSFilterTestCase(unittest.TestCase):
+    """
+    Tests to check SOSFilter behaviour
+    """
+    def setUp(self):
+        self.frames = np.random.RandomState(0).randn(200, 3)
+
+    def test_frame_by_frame_equals_whole_signal(self):
+        for btype, cutoff in (("lowpass", 10), ("highpass", 5), ("bandpass", (2, 10))):
+            sos_filter = SOSFilter.design(btype, cutoff, fs=100)
+
+            expected = signal.sosfilt(sos_filter.sos, self.frames, axis=0)
+            filtered = np.array([sos_filter.process_frame(frame) for frame in self.frames])
+
+            self.assertTrue(np.allclose(filtered, expected))
+
+    def test_blocks_continue_the_state(self):
+        sos_filter = SOSFilter.design("lowpass", 10, fs=100)
+
+        expected = signal.sosfilt(sos_filter.sos, self.frames, axis=0)
+        filtered = np.vstack([sos_filter.process_block(self.frames[:77]),
+                              [sos_filter.process_frame(frame) for frame in self.frames[77:90]],
+                              sos_filter.process_block(self.frames[90:])])
+
+        self.assertTrue(np.allclose(filtered, expected))
+
+    def test_reset(self):
+        sos_filter = SOSFilter.design("lowpass", 10, fs=100)
+
+        first = sos_filter.process_block(self.frames)
+        sos_filter.reset()
+
+        self.assertTrue(np.allclose(sos_filter.process_block(self.frames), first))
+
+    def test_invalid_design_should_raise_error(self):
+        self.assertRaises(ValueError, SOSFilter.design, "notch", 10, fs=100)
+        self.assertRaises(ValueError, SOSFilter.design, "lowpass", 60, fs=100)
+        self.assertRaises(ValueError, SOSFilter, [[1, 0, 0, 1, 0]])
+
+if __name__ == '__main__':
+    unittest.main()
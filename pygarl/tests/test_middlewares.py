@@ -0,0 +1,199 @@
+import unittest
+import numpy as np
+
+from scipy import signal
+from pygarl.middlewares import FeatureExtractionMiddleware, PCAMiddleware, SelectKBestMiddleware, \
+    SOSFilterMiddleware, WelfordNormalizationMiddleware
+from pygarl.sample_managers import StreamSampleManager
+from pygarl.abstracts import *
+from pygarl.mocks import *
+from pygarl.base import *
+
+# To execute tests, go to the project main directory and type:
+# python -m unittest discover
+
+
+class FeatureExtractionMiddlewareTestCase(unittest.TestCase):
+    """
+    Tests to check FeatureExtractionMiddleware behaviour
+    """
+    def setUp(self):
+        self.sample = Sample(data=[[1, 0], [3, 0], [1, 2], [3, 2]], gesture_id="gesture")
+
+    def test_statistical_features(self):
+        middleware = FeatureExtractionMiddleware(features=["max", "mean", "energy"])
+
+        processed = middleware.process_sample(self.sample)
+
+        # The features follow the documented order, regardless of the requested one
+        self.assertTrue(np.allclose(processed.data, [[2, 1, 3, 2, 5, 2]]))
+        self.assertEqual(processed.gesture_id, "gesture")
+
+    def test_zero_crossings_and_correlation(self):
+        middleware = FeatureExtractionMiddleware(features=["zcr", "corr"])
+
+        features = middleware.extract_features(self.sample.data)
+
+        # The first axis crosses its mean at every frame, the second one only once
+        self.assertTrue(np.allclose(features, [1, 1 / 3.0, 0]))
+
+    def test_bands_energy_sums_to_the_variance(self):
+        middleware = FeatureExtractionMiddleware(features=["bands"], n_bands=2)
+
+        data = np.random.RandomState(0).randn(32, 3)
+        bands = middleware.extract_features(data).reshape(2, 3)
+
+        # By Parseval's theorem the whole spectrum sums to the variance, the one-sided
+        # spectrum contains at least half of it
+        self.assertTrue(np.all(bands.sum(axis=0) <= data.var(axis=0) + 1e-9))
+        self.assertTrue(np.all(bands.sum(axis=0) >= data.var(axis=0) / 2))
+
+    def test_fixed_length_output(self):
+        middleware = FeatureExtractionMiddleware()
+
+        short = middleware.process_sample(Sample(data=[[1, 2, 3]]))
+        long = middleware.process_sample(Sample(data=np.random.RandomState(0).randn(50, 3)))
+
+        self.assertEqual(short.data.shape, (1, middleware.get_n_features(3)))
+        self.assertEqual(long.data.shape, short.data.shape)
+
+    def test_invalid_feature_should_raise_error(self):
+        self.assertRaises(ValueError, FeatureExtractionMiddleware, features=["median"])
+
+class PCAMiddlewareTestCase(unittest.TestCase):
+    """
+    Tests to check PCAMiddleware behaviour
+    """
+    def setUp(self):
+        # The samples vary only along the direction ( 1, 1, 0, 0 )
+        self.samples = [Sample(data=[[n, 0], [n, 0]], gesture_id="gesture") for n in range(10)]
+
+    def test_unfitted_middleware_should_raise_error(self):
+        self.assertRaises(ValueError, PCAMiddleware().process_sample, self.samples[0])
+
+    def test_samples_projected_on_the_components(self):
+        middleware = PCAMiddleware(n_components=1)
+        middleware.fit(self.samples)
+
+        first = middleware.process_sample(self.samples[0])
+        last = middleware.process_sample(self.samples[-1])
+
+        self.assertEqual(first.data.shape, (1, 1))
+        self.assertEqual(last.gesture_id, "gesture")
+        # The distance between the samples is preserved by the projection
+        self.assertAlmostEqual(abs(last.data[0, 0] - first.data[0, 0]), 9 * np.sqrt(2))
+
+
+class WelfordNormalizationMiddlewareTestCase(unittest.TestCase):
+    """
+    Tests to check WelfordNormalizationMiddleware behaviour
+    """
+    def setUp(self):
+        random_state = np.random.RandomState(0)
+        self.samples = [Sample(data=random_state.randn(n + 2, 3) * [1, 10, 0] + [5, -3, 2])
+                        for n in range(10)]
+        self.frames = np.vstack([sample.data for sample in self.samples])
+
+    def test_global_statistics(self):
+        middleware = WelfordNormalizationMiddleware()
+        middleware.fit(self.samples)
+
+        self.assertTrue(np.allclose(middleware.mean, self.frames.mean(axis=0)))
+        self.assertTrue(np.allclose(middleware.m2 / middleware.count, self.frames.var(axis=0)))
+
+        # The dataset is standardized as a whole, the constant axis is only centered
+        normalized = np.vstack([middleware.process_sample(sample).data for sample in self.samples])
+        self.assertTrue(np.allclose(normalized.mean(axis=0), 0))
+        self.assertTrue(np.allclose(normalized.std(axis=0), [1, 1, 0]))
+
+    def test_linearized_batch_matches_samples(self):
+        middleware = WelfordNormalizationMiddleware()
+        middleware.fit(self.samples)
+
+        sample = self.samples[3]
+        expected = middleware.process_sample(sample).get_linearized()
+
+        self.assertTrue(np.allclose(middleware.transform_linearized(sample.get_linearized()), expected))
+
+    def test_adaptation_follows_the_stream(self):
+        middleware = WelfordNormalizationMiddleware(adaptation_rate=0.5)
+        middleware.fit(self.samples)
+
+        # The stream moves to a new offset
+        for i in range(20):
+            middleware.process_sample(Sample(data=self.samples[0].data + [100, 0, 0]))
+
+        self.assertAlmostEqual(middleware.mean[0], self.samples[0].data[:, 0].mean() + 100, places=3)
+
+    def test_adaptation_keeps_constant_axis_variance(self):
+        middleware = WelfordNormalizationMiddleware(adaptation_rate=0.5)
+        middleware.fit(self.samples)
+
+        middleware.process_sample(self.samples[0])
+
+        # The constant axis still has no variance, even if its scale is 1
+        self.assertEqual(middleware.variance[2], 0)
+        self.assertEqual(middleware.scale[2], 1)
+
+    def test_fit_without_samples_should_raise_error(self):
+        self.assertRaises(ValueError, WelfordNormalizationMiddleware().fit, [])
+
+
+class SelectKBestMiddlewareTestCase(unittest.TestCase):
+    """
+    Tests to check SelectKBestMiddleware behaviour
+    """
+    def test_discriminative_values_selected(self):
+        random_state = np.random.RandomState(0)
+
+        # Only the second axis of the last frame depends on the gesture
+        samples = []
+        for n in range(20):
+            gesture_id = "a" if n % 2 == 0 else "b"
+            data = random_state.randn(2, 2)
+            data[1, 1] += 10 if gesture_id == "a" else -10
+            samples.append(Sample(data=data, gesture_id=gesture_id))
+
+        middleware = SelectKBestMiddleware(k=1)
+        middleware.fit(samples)
+
+        self.assertEqual(list(middleware.selected), [3])
+        self.assertTrue(np.allclose(middleware.process_sample(samples[0]).data, [[samples[0].data[1, 1]]]))
+
+class SOSFilterMiddlewareTestCase(unittest.TestCase):
+    """
+    Tests to check SOSFilterMiddleware behaviour
+    """
+    def setUp(self):
+        self.middleware = SOSFilterMiddleware(btype="lowpass", cutoff=5, fs=100)
+        self.frames = np.random.RandomState(0).randn(40, 2)
+
+    def test_stream_windows_equal_the_filtered_signal(self):
+        manager = StreamSampleManager(window=10, step=10)
+        receiver = MockReceiver()
+        manager.attach_receiver(receiver)
+        self.middleware.attach_manager(manager)
+
+        for frame in self.frames:
+            self.middleware.receive_data(frame)
+
+        # The last window continues the filter state of the previous ones
+        expected = signal.sosfilt(self.middleware.filter.sos, self.frames, axis=0)
+        self.assertTrue(np.allclose(receiver.received_sample.data, expected[-10:]))
+
+    def test_signals_forwarded_and_reset_on_stop(self):
+        manager = MockSampleManager()
+        self.middleware.attach_manager(manager)
+        self.middleware.reset_on_stop = True
+
+        self.middleware.receive_data(self.frames[0])
+        first = manager.received_data
+
+        self.middleware.receive_signal(ControlSignal.STOP)
+        self.assertEqual(manager.received_signal, ControlSignal.STOP)
+
+        self.middleware.receive_data(self.frames[0])
+        self.assertTrue(np.allclose(manager.received_data, first))
+
+if __name__ == '__main__':
+    unittest.main()
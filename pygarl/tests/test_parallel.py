@@ -0,0 +1,135 @@
+import unittest
+import gc
+
+import numpy as np
+from multiprocessing import shared_memory
+from pygarl.abstracts import AbstractMiddleware
+from pygarl.base import Sample
+from pygarl.mocks import MockReceiver, MockCallbackManager
+from pygarl.parallel import ParallelStage
+from pygarl.predictors import HighestAxisPredictor
+
+# To execute tests, go to the project main directory and type:
+# python -m unittest discover
+
+
+class SquareMiddleware(AbstractMiddleware):
+    """
+    Square the data, suppressing the samples with a negative first value
+    """
+    def process_sample(self, sample):
+        if sample.data[0, 0] < 0:
+            return None
+
+        sample.data = sample.data ** 2
+        return sample
+
+
+class CollectingReceiver(MockReceiver):
+    """
+    Keep all the received samples
+    """
+    def __init__(self):
+        MockReceiver.__init__(self)
+        self.received_samples = []
+
+    def receive_sample(self, sample):
+        self.received_samples.append(sample)
+
+
+class NonZeroAxisPredictor(HighestAxisPredictor):
+    """
+    Predictor that doesn't notify the samples whose highest axis is the first one
+    """
+    def receive_sample(self, sample):
+        gesture_id = self.predict(sample)
+
+        if gesture_id != "0":
+            self.notify_callbacks(gesture_id)
+
+
+class ParallelStageTestCase(unittest.TestCase):
+    """
+    Tests to check ParallelStage behaviour
+    """
+    def tearDown(self):
+        self.stage.close()
+
+    def test_ordered_results(self):
+        self.stage = ParallelStage(SquareMiddleware(), workers=2, max_pending=3)
+        receiver = CollectingReceiver()
+        self.stage.attach_receiver(receiver)
+
+        for n in range(10):
+            sample = Sample(data=[[n, 1]] * 3, gesture_id=str(n))
+            sample.end_frame = n
+            self.stage.receive_sample(sample)
+        self.stage.receive_sample(Sample(data=[[-1]]))
+        self.stage.flush()
+
+        self.assertEqual([sample.gesture_id for sample in receiver.received_samples], [str(n) for n in range(10)])
+        self.assertEqual([sample.end_frame for sample in receiver.received_samples], list(range(10)))
+        self.assertEqual(receiver.received_samples[3].data.tolist(), [[9, 1]] * 3)
+
+    def test_unordered_results_and_big_samples(self):
+        self.stage = ParallelStage(SquareMiddleware(), workers=2, ordered=False, slot_size=64)
+        receiver = CollectingReceiver()
+        self.stage.attach_receiver(receiver)
+
+        # The big samples don't fit in the slots and are pickled
+        data = np.random.RandomState(0).rand(50, 3)
+        for n in range(6):
+            self.stage.receive_sample(Sample(data=data + n, gesture_id=n))
+        self.stage.flush()
+
+        received = sorted(receiver.received_samples, key=lambda sample: sample.gesture_id)
+        self.assertEqual(len(received), 6)
+        self.assertTrue(np.allclose(received[5].data, (data + 5) ** 2))
+
+    def test_predictor(self):
+        predictor = HighestAxisPredictor()
+        callback_manager = MockCallbackManager()
+        predictor.attach_callback_manager(callback_manager)
+
+        self.stage = ParallelStage(predictor, workers=2)
+
+        for axis in (0, 1, 2, 1):
+            data = np.zeros((4, 3))
+            data[:, axis] = 1
+            self.stage.receive_sample(Sample(data=data))
+        self.stage.flush()
+
+        self.assertEqual(callback_manager.received_gestures, ["0", "1", "2", "1"])
+
+    def test_predictor_receive_sample_is_used(self):
+        predictor = NonZeroAxisPredictor()
+        callback_manager = MockCallbackManager()
+        predictor.attach_callback_manager(callback_manager)
+
+        self.stage = ParallelStage(predictor, workers=2)
+
+        for axis in (0, 1, 0, 2):
+            data = np.zeros((4, 3))
+            data[:, axis] = 1
+            self.stage.receive_sample(Sample(data=data))
+        self.stage.flush()
+
+        self.assertEqual(callback_manager.received_gestures, ["1", "2"])
+
+    def test_shared_memory_released(self):
+        with ParallelStage(SquareMiddleware(), workers=1) as self.stage:
+            name = self.stage.input_memory.name
+
+        self.assertRaises(FileNotFoundError, shared_memory.SharedMemory, name=name)
+
+        # Without calling close, the memory is released when the stage is garbage collected
+        stage = ParallelStage(SquareMiddleware(), workers=1)
+        name = stage.output_memory.name
+        del stage
+        gc.collect()
+
+        self.assertRaises(FileNotFoundError, shared_memory.SharedMemory, name=name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+
+from pygarl.base import Sample
+from pygarl.mocks import *
+from pygarl.middlewares import *
+from pygarl.pipeline import Pipeline
+
+# To execute tests, go to the project main directory and type:
+# python -m unittest discover
+
+
+class AbsoluteValueMiddleware(AbstractMiddleware):
+    """
+    Middleware that modifies the received sample
+    """
+    def process_sample(self, sample):
+        sample.abs()
+        return sample
+
+
+class PipelineTestCase(unittest.TestCase):
+    """
+    Tests to check Pipeline behaviour
+    """
+    def test_chain_same_result_of_attached_receivers(self):
+        sample = Sample(data=[[1, 2], [3, 4], [5, 6], [7, 8]])
+
+        # Chain built by attaching the receivers
+        trimmer = TrimmerMiddleware(threshold=0)
+        scaler = AbsoluteScaleMiddleware()
+        receiver = MockReceiver()
+        trimmer.attach_receiver(scaler)
+        scaler.attach_receiver(receiver)
+        trimmer.receive_sample(sample.share())
+
+        # The same chain compiled in a pipeline
+        compiled_receiver = MockReceiver()
+        pipeline = Pipeline.chain([TrimmerMiddleware(threshold=0), AbsoluteScaleMiddleware(), compiled_receiver])
+        pipeline.receive_sample(sample.share())
+
+        self.assertTrue(np.allclose(compiled_receiver.received_sample.data, receiver.received_sample.data))
+
+    def test_suppressed_sample_does_not_reach_following_stages(self):
+        receiver = MockReceiver()
+        pipeline = Pipeline.chain([LengthThresholdMiddleware(min_len=3), receiver])
+
+        pipeline.receive_sample(Sample(data=[[1], [2]]))
+        self.assertIsNone(receiver.received_sample)
+
+        pipeline.receive_sample(Sample(data=[[1], [2], [3]]))
+        self.assertEqual(receiver.received_sample.data.tolist(), [[1], [2], [3]])
+
+    def test_branches_do_not_affect_each_other(self):
+        pipeline = Pipeline()
+        source = pipeline.add_stage(AbstractMiddleware())
+        absolute = pipeline.add_stage(AbsoluteValueMiddleware(), after=source)
+        absolute_receiver = pipeline.add_stage(MockReceiver(), after=absolute)
+        raw_receiver = pipeline.add_stage(MockReceiver(), after=source)
+
+        sample = Sample(data=[[-1], [2]])
+        pipeline.receive_sample(sample)
+
+        self.assertEqual(absolute_receiver.received_sample.data.tolist(), [[1], [2]])
+        self.assertEqual(raw_receiver.received_sample.data.tolist(), [[-1], [2]])
+        self.assertEqual(sample.data.tolist(), [[-1], [2]])
+
+    def test_from_receivers(self):
+        manager = MockSampleManager()
+        middleware = AbsoluteValueMiddleware()
+        receiver = MockReceiver()
+        manager.attach_receiver(middleware)
+        middleware.attach_receiver(receiver)
+
+        pipeline = Pipeline.from_receivers(manager)
+        pipeline.receive_sample(Sample(data=[[-3]]))
+
+        self.assertEqual(receiver.received_sample.data.tolist(), [[3]])
+        self.assertNotIn("notify_receivers", pipeline.source)
+
+    def test_timing(self):
+        pipeline = Pipeline.chain([LengthThresholdMiddleware(min_len=2), MockReceiver()], timing=True)
+
+        for length in (1, 2, 3):
+            pipeline.receive_sample(Sample(data=[[0]] * length))
+
+        stats = pipeline.get_stats()
+
+        self.assertEqual([stage['calls'] for stage in stats], [3, 2])
+        self.assertEqual(stats[1]['stage'], "MockReceiver")
+        self.assertGreaterEqual(stats[0]['total_time'], 0)
+
+    def test_invalid_graphs_should_raise_error(self):
+        pipeline = Pipeline()
+        receiver = pipeline.add_stage(MockReceiver())
+
+        # A receiver doesn't return the samples
+        self.assertRaises(ValueError, pipeline.add_stage, AbstractMiddleware(), after=receiver)
+
+        # The stages can't form a cycle
+        first = AbstractMiddleware()
+        second = AbstractMiddleware()
+        pipeline = Pipeline.chain([first, second])
+        pipeline.add_stage(first, after=second)
+
+        self.assertRaises(ValueError, pipeline.compile)
+
+
+if __name__ == '__main__':
+    unittest.main()
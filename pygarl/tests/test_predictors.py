@@ -1,9 +1,15 @@
 import unittest
+import os
+import shutil
+import tempfile
+import time
 import scipy as sp
 from pygarl.abstracts import *
 from pygarl.predictors import *
 from pygarl.mocks import *
 from pygarl.base import *
+from pygarl.sample_managers import StreamSampleManager
+from pygarl.middlewares import PCAMiddleware
 
 # To execute tests, go to the project main directory and type:
 # python -m unittest discover
@@ -49,5 +55,466 @@ class HighestAxisPredictorTestCase(unittest.TestCase):
 
         self.assertRaises(ValueError, self.predictor.predict, sample)
 
+
+class FileThresholdClassifier(MockThresholdClassifier):
+    """
+    MockThresholdClassifier whose threshold is loaded from the model file
+    """
+    def __init__(self, model_path):
+        MockThresholdClassifier.__init__(self)
+
+        self.model_path = model_path
+        self.is_trained = False
+
+    def load(self):
+        with open(self.model_path) as model_file:
+            self.threshold = float(model_file.read())
+
+        self.is_trained = True
+
+
+class ClassifierPredictorTestCase(unittest.TestCase):
+    """
+    Tests to check ClassifierPredictor behaviour
+    """
+    def setUp(self):
+        self.callback_manager = MockCallbackManager()
+
+    def test_confidence_notified_to_callbacks(self):
+        predictor = ClassifierPredictor(MockThresholdClassifier(), with_confidence=True)
+        predictor.attach_callback_manager(self.callback_manager)
+
+        predictor.receive_sample(Sample(data=[[0, 0], [10, 0]]))
+
+        self.assertEqual(self.callback_manager.received_gesture, "high")
+        self.assertEqual(self.callback_manager.received_confidence, 1.0)
+
+    def test_confidence_not_notified_by_default(self):
+        predictor = ClassifierPredictor(MockThresholdClassifier())
+        predictor.attach_callback_manager(self.callback_manager)
+
+        predictor.receive_sample(Sample(data=[[0, 0], [1, 0]]))
+
+        self.assertEqual(self.callback_manager.received_gesture, "low")
+        self.assertIsNone(self.callback_manager.received_confidence)
+
+
+class ClassifierPredictorReloadTestCase(unittest.TestCase):
+    """
+    Tests to check the model reloading of the ClassifierPredictor
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.model_path = os.path.join(self.directory, "model.txt")
+        self.write_model(5)
+
+        classifier = FileThresholdClassifier(self.model_path)
+        classifier.load()
+        self.predictor = ClassifierPredictor(classifier)
+
+    def tearDown(self):
+        self.predictor.stop_watching()
+        self.predictor.stop_shadow()
+        shutil.rmtree(self.directory)
+
+    def write_model(self, threshold):
+        with open(self.model_path, "w") as model_file:
+            model_file.write(str(threshold))
+
+    def test_reload_model(self):
+        old_classifier = self.predictor.classifier
+        self.write_model(20)
+
+        self.predictor.reload_model(wait=True)
+
+        self.assertIsNot(self.predictor.classifier, old_classifier)
+        self.assertEqual(self.predictor.model_version, 1)
+        self.assertEqual(self.predictor.predict(Sample(data=[[10]])), "low")
+
+        # The old classifier is not modified
+        self.assertEqual(old_classifier.threshold, 5)
+
+    def test_failed_reload_keeps_current_model(self):
+        classifier = self.predictor.classifier
+
+        self.predictor.reload_model(model_path=os.path.join(self.directory, "missing.txt"), wait=True)
+
+        self.assertIs(self.predictor.classifier, classifier)
+        self.assertIsInstance(self.predictor.reload_error, IOError)
+
+    def test_watch_model(self):
+        self.predictor.watch_model(interval=0.01)
+
+        # Make sure the modification time changes
+        time.sleep(0.05)
+        self.write_model(20)
+
+        deadline = time.time() + 5
+        while self.predictor.model_version == 0 and time.time() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(self.predictor.classifier.threshold, 20)
+
+    def test_shadow_stats_and_promotion(self):
+        self.write_model(20)
+        self.predictor.reload_model(shadow=True, wait=True)
+
+        # The live model is not replaced
+        self.assertEqual(self.predictor.classifier.threshold, 5)
+
+        for value in (1, 10, 30):
+            self.predictor.predict(Sample(data=[[value]]))
+
+        self.predictor.wait_shadow()
+        stats = self.predictor.get_shadow_stats()
+
+        self.assertEqual(stats['samples'], 3)
+        self.assertEqual(stats['disagreements'], 1)
+        self.assertEqual(stats['pairs'], {("high", "low"): 1})
+
+        self.predictor.promote_shadow()
+
+        self.assertIsNone(self.predictor.shadow)
+        self.assertEqual(self.predictor.classifier.threshold, 20)
+        self.assertRaises(RuntimeError, self.predictor.promote_shadow)
+
+
+class SpringPredictorTestCase(unittest.TestCase):
+    """
+    Tests to check SpringPredictor behaviour
+    """
+    def setUp(self):
+        templates = [Sample(data=[[0, 0], [5, 0], [10, 0], [5, 0], [0, 0]], gesture_id="right"),
+                     Sample(data=[[0, 0], [0, 5], [0, 10], [0, 5], [0, 0]], gesture_id="up")]
+
+        self.predictor = SpringPredictor(templates, threshold=1.0)
+        self.callback_manager = MockCallbackManager()
+        self.predictor.attach_callback_manager(self.callback_manager)
+
+    def tearDown(self):
+        self.predictor = None
+
+    def test_gesture_spotted_in_frames(self):
+        frames = [[0, 0]] * 5 + [[5, 0], [10, 0], [10, 0], [5, 0]] + [[0, 0]] * 10
+
+        for frame in frames:
+            self.predictor.receive_data(frame)
+
+        self.assertEqual(self.callback_manager.received_gesture, "right")
+        self.assertEqual(len(self.predictor.matches), 1)
+
+    def test_matching_restarts_after_overrun(self):
+        frames = [[0, 0]] * 5 + [[5, 0], [10, 0]]
+
+        for frame in frames:
+            self.predictor.receive_data(frame)
+
+        # The rest of the gesture follows lost frames, so it's not matched with its beginning
+        self.predictor.receive_signal(ControlSignal.OVERRUN)
+
+        for frame in [[5, 0]] + [[0, 0]] * 10:
+            self.predictor.receive_data(frame)
+
+        self.assertIsNone(self.callback_manager.received_gesture)
+        self.assertEqual(len(self.predictor.matches), 0)
+
+    def test_gesture_spotted_in_stream_windows(self):
+        self.predictor.window_step = 5
+
+        frames = [[0, 0]] * 5 + [[0, 5], [0, 10], [0, 5]] + [[0, 0]] * 12
+
+        # Send windows of 10 frames with a step of 5 frames
+        for end in range(10, len(frames) + 1, 5):
+            self.predictor.receive_sample(Sample(data=frames[end - 10:end]))
+
+        self.assertEqual(self.callback_manager.received_gesture, "up")
+        self.assertEqual(len(self.predictor.matches), 1)
+
+    def test_stream_frames_processed_once_with_stop_signal(self):
+        manager = StreamSampleManager(window=10, step=5)
+        manager.attach_receiver(self.predictor)
+
+        frames = [[0, 0]] * 12 + [[0, 5], [0, 10], [0, 5]] + [[0, 0]] * 15
+
+        # The STOP signal sends a partial window made of frames already processed
+        for frame in frames[:12]:
+            manager.receive_data(frame)
+        manager.receive_signal(ControlSignal.STOP)
+        for frame in frames[12:]:
+            manager.receive_data(frame)
+
+        for gesture_id, matcher in self.predictor.matchers:
+            self.assertEqual(matcher.time, len(frames))
+        self.assertEqual(self.callback_manager.received_gesture, "up")
+        self.assertEqual(len(self.predictor.matches), 1)
+
+    def test_predict(self):
+        sample = Sample(data=[[0, 0], [0, 5], [0, 10], [0, 5], [0, 0]])
+
+        self.assertEqual(self.predictor.predict(sample), "up")
+
+
+class SlidingWindowPredictorTestCase(unittest.TestCase):
+    """
+    Tests to check SlidingWindowPredictor behaviour
+    """
+    def setUp(self):
+        self.classifier = MockThresholdClassifier()
+        self.predictor = SlidingWindowPredictor(self.classifier, window=10, step=2, batch_size=4,
+                                                threshold=0.5, ignored_gestures=["low"])
+        self.callback_manager = MockCallbackManager()
+        self.predictor.attach_callback_manager(self.callback_manager)
+
+    def tearDown(self):
+        self.predictor = None
+
+    def test_overlapping_detections_are_notified_once(self):
+        frames = [[0, 0]] * 30 + [[10, 0]] * 5 + [[0, 0]] * 40
+
+        for frame in frames:
+            self.predictor.receive_data(frame)
+
+        self.assertEqual(self.callback_manager.received_gestures, ["high"])
+        self.assertGreater(self.predictor.windows_per_second(), 0)
+
+    def test_windows_restart_after_overrun(self):
+        for frame in [[10, 0]] * 8:
+            self.predictor.receive_data(frame)
+
+        # No window spans the lost frames
+        self.predictor.receive_signal(ControlSignal.OVERRUN)
+
+        for frame in [[0, 0]] * 30:
+            self.predictor.receive_data(frame)
+        self.predictor.flush()
+
+        self.assertEqual(self.callback_manager.received_gestures, [])
+        self.assertGreater(self.predictor.processed_windows, 0)
+
+    def test_throughput_target(self):
+        # A 100 Hz sensor with a step of 2 frames produces 50 windows per second
+        self.predictor.target_windows_per_second = 50
+
+        for frame in np.random.RandomState(0).randn(1000, 2):
+            self.predictor.receive_data(frame)
+
+        self.assertGreater(self.predictor.processed_windows, 0)
+        self.assertTrue(self.predictor.meets_target())
+
+    def test_separate_gestures_are_notified(self):
+        frames = ([[0, 0]] * 30 + [[10, 0]] * 3) * 3 + [[0, 0]] * 30
+
+        for frame in frames:
+            self.predictor.receive_data(frame)
+
+        self.assertEqual(self.callback_manager.received_gestures, ["high"] * 3)
+
+    def test_flush_on_stop_signal(self):
+        for frame in [[0, 0]] * 10 + [[10, 0]] * 3:
+            self.predictor.receive_data(frame)
+
+        self.assertEqual(self.callback_manager.received_gestures, [])
+
+        self.predictor.receive_signal(ControlSignal.STOP)
+
+        self.assertEqual(self.callback_manager.received_gestures, ["high"])
+
+    def test_stream_frames_received_once_with_stop_signal(self):
+        manager = StreamSampleManager(window=10, step=2)
+        manager.attach_receiver(self.predictor)
+
+        frames = [[0, 0]] * 13 + [[10, 0]] * 3 + [[0, 0]] * 40
+
+        for frame in frames[:13]:
+            manager.receive_data(frame)
+        manager.receive_signal(ControlSignal.STOP)
+        for frame in frames[13:]:
+            manager.receive_data(frame)
+
+        self.assertEqual(self.predictor.buffer_start + self.predictor.buffer_count, len(frames))
+        self.assertEqual(self.callback_manager.received_gestures, ["high"])
+
+    def test_batch_preprocessing_matches_classifier(self):
+        self.classifier.autonormalize = True
+        self.classifier.autoscale_size = 7
+
+        windows = np.random.RandomState(0).randn(3, 10, 2)
+        expected = [self.classifier.preprocess_sample(Sample(data=window)).get_linearized(one_dimensional=True)
+                    for window in windows]
+
+        self.assertTrue(np.allclose(self.predictor.preprocess_windows(windows), expected))
+
+    def test_batch_preprocessing_with_trainable_middlewares(self):
+        windows = np.random.RandomState(0).randn(3, 10, 2)
+
+        middleware = PCAMiddleware(n_components=2)
+        middleware.fit([Sample(data=window) for window in windows])
+        self.classifier.trainable_middlewares = [middleware]
+
+        expected = [self.classifier.preprocess_sample(Sample(data=window)).get_linearized(one_dimensional=True)
+                    for window in windows]
+
+        self.assertTrue(np.allclose(self.predictor.preprocess_windows(windows), expected))
+
+class CascadePredictorTestCase(unittest.TestCase):
+    """
+    Tests to check CascadePredictor behaviour
+    """
+    def setUp(self):
+        self.cheap = MockConfidencePredictor(["a", "b"])
+        self.expensive = MockConfidencePredictor(["b", "a"])
+        self.predictor = CascadePredictor([(self.cheap, 0.8), (self.expensive, 0.5)])
+        self.callback_manager = MockCallbackManager()
+        self.predictor.attach_callback_manager(self.callback_manager)
+
+    def tearDown(self):
+        self.predictor = None
+
+    def test_confident_stage_skips_the_following_ones(self):
+        self.assertEqual(self.predictor.predict(Sample(data=[[0, 0.9]])), "a")
+        self.assertEqual(self.expensive.calls, 0)
+
+    def test_uncertain_stage_uses_the_following_one(self):
+        self.assertEqual(self.predictor.predict(Sample(data=[[0, 0.6]])), "b")
+        self.assertEqual(self.expensive.calls, 1)
+
+    def test_rejected_sample_is_not_notified(self):
+        self.predictor.receive_sample(Sample(data=[[0, 0.4]]))
+        self.predictor.receive_sample(Sample(data=[[1, 0.9]]))
+
+        self.assertEqual(self.callback_manager.received_gestures, ["b"])
+
+        stats = self.predictor.get_stats()
+        self.assertEqual(stats['samples'], 2)
+        self.assertEqual(stats['rejection_rate'], 0.5)
+        self.assertEqual(stats['stages'][0]['hit_rate'], 0.5)
+        self.assertEqual(stats['stages'][1]['calls'], 1)
+        self.assertGreaterEqual(stats['latency_saved'], 0)
+
+    def test_unknown_gesture(self):
+        self.predictor.unknown_gesture = "unknown"
+
+        self.assertEqual(self.predictor.predict(Sample(data=[[0, 0.1]])), "unknown")
+
+    def test_tune_thresholds(self):
+        # The cheap stage is wrong on the samples of the gesture "b" with a confidence below 0.7
+        samples = [Sample(data=[[0, 0.9]], gesture_id="a"),
+                   Sample(data=[[1, 0.8]], gesture_id="b"),
+                   Sample(data=[[0, 0.7]], gesture_id="a"),
+                   Sample(data=[[0, 0.6]], gesture_id="b"),
+                   Sample(data=[[0, 0.5]], gesture_id="b")]
+
+        thresholds = self.predictor.tune_thresholds(samples, target_accuracy=1.0)
+
+        self.assertEqual(thresholds, [0.7, 0.5])
+
+
+class RoutingPredictorTestCase(unittest.TestCase):
+    """
+    Tests to check RoutingPredictor behaviour
+    """
+    def setUp(self):
+        self.now = [0.0]
+        self.classifier = MockThresholdClassifier(threshold=5)
+        self.predictor = RoutingPredictor(self.classifier, batch_size=3, max_latency=0.05,
+                                          clock=lambda: self.now[0])
+
+        self.callback_manager = MockCallbackManager()
+        self.predictor.attach_callback_manager(self.callback_manager)
+
+    def test_gestures_routed_to_their_devices(self):
+        managers = {}
+        for device_id in ("a", "b"):
+            managers[device_id] = MockCallbackManager()
+            self.predictor.attach_device_callback_manager(device_id, managers[device_id])
+
+        for device_id, value in (("a", 10), ("b", 1), ("a", 2)):
+            self.predictor.receive_sample(Sample(data=[[value]], device_id=device_id))
+
+        # A single batch has been classified
+        self.assertEqual(self.predictor.batches, 1)
+        self.assertEqual(managers["a"].received_gestures, ["high", "low"])
+        self.assertEqual(managers["b"].received_gestures, ["low"])
+        self.assertEqual(self.callback_manager.received_gestures, ["high", "low", "low"])
+
+        metrics = self.predictor.get_metrics()
+        self.assertEqual(metrics["a"]["samples"], 2)
+        self.assertEqual(metrics["b"]["gesture_counts"], {"low": 1})
+
+    def test_batch_classified_within_latency_budget(self):
+        self.predictor.receive_sample(Sample(data=[[10]], device_id="a"))
+        self.assertEqual(self.callback_manager.received_gestures, [])
+
+        self.now[0] = 0.06
+        self.predictor.poll()
+
+        self.assertEqual(self.callback_manager.received_gestures, ["high"])
+        self.assertAlmostEqual(self.predictor.get_metrics("a")["max_latency"], 0.06)
+
+    def test_calibration_per_device(self):
+        self.predictor.batch_size = 1
+
+        # The device "b" has an offset of 10 at rest
+        self.predictor.calibrate("b", [Sample(data=[[9], [11]])])
+        self.predictor.set_calibration("c", offset=10)
+
+        for device_id in ("a", "b", "c"):
+            sample = Sample(data=[[12]], device_id=device_id)
+            self.predictor.receive_sample(sample)
+
+        self.assertEqual(self.callback_manager.received_gestures, ["high", "low", "low"])
+        # The samples are not modified
+        self.assertEqual(sample.data.tolist(), [[12]])
+
+    def test_smoother_per_device(self):
+        self.predictor.smoother_factory = lambda: GestureSmoother(vote_size=3)
+        self.predictor.batch_size = 1
+
+        # The devices alternate, but each one has a stable majority
+        for value in (10, 1, 10, 1, 10, 1):
+            device_id = "a" if value == 10 else "b"
+            self.predictor.receive_sample(Sample(data=[[value]], device_id=device_id))
+
+        self.assertEqual(sorted(self.callback_manager.received_gestures), ["high", "low"])
+        self.assertEqual(self.predictor.get_metrics("a")["predictions"], 3)
+        self.assertEqual(self.predictor.get_metrics("a")["notified"], 1)
+
+    def test_smoother_uses_predictor_clock(self):
+        self.predictor.smoother_factory = lambda: GestureSmoother(min_interval=1.0)
+        self.predictor.batch_size = 1
+
+        for now in (0.0, 0.5, 1.5):
+            self.now[0] = now
+            self.predictor.receive_sample(Sample(data=[[10]], device_id="a"))
+
+        # The second prediction is within the interval of the first one on the predictor clock
+        self.assertEqual(self.callback_manager.received_gestures, ["high", "high"])
+
+    def test_removed_device_samples_are_discarded(self):
+        self.predictor.receive_sample(Sample(data=[[10]], device_id="a"))
+        self.predictor.receive_sample(Sample(data=[[1]], device_id="b"))
+
+        self.predictor.remove_device("a")
+        self.predictor.flush()
+
+        self.assertEqual(self.callback_manager.received_gestures, ["low"])
+
+    def test_samples_processed_once_without_batch_probabilities(self):
+        counter = MockFunctionCounter()
+        preprocess_sample = self.classifier.preprocess_sample
+
+        def counted_preprocess_sample(sample, trainable=True):
+            counter.callback()
+            return preprocess_sample(sample, trainable)
+
+        self.classifier.preprocess_sample = counted_preprocess_sample
+
+        # Samples of different lengths can't be classified in a single call
+        predictions = predict_batch(self.classifier, [Sample(data=[[10]]), Sample(data=[[1], [2]])])
+
+        self.assertEqual(predictions, [("high", 1.0), ("low", 1.0)])
+        self.assertEqual(counter.counter, 2)
+
+
 if __name__ == '__main__':
     unittest.main()
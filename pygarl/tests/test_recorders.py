@@ -62,5 +62,15 @@ class FileGestureRecorderTestCase(unittest.TestCase):
 
         self.assertTrue(filepath1 != filepath2)
 
+    def test_saved_sample_forwarded_to_receivers(self):
+        receiver = MockReceiver()
+        self.recorder.attach_receiver(receiver)
+
+        sample = MockSample()
+        self.recorder.receive_sample(sample)
+
+        self.assertIs(receiver.received_sample.data.base, sample.data)
+        self.assertEqual(receiver.received_sample.file_path, sample.file_path)
+
 if __name__ == '__main__':
     unittest.main()
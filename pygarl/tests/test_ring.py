@@ -0,0 +1,104 @@
+import unittest
+import multiprocessing
+
+import numpy as np
+from pygarl.abstracts import ControlSignal
+from pygarl.mocks import MockSampleManager, MockReceiver
+from pygarl.ring import SharedRingWriter, SharedRingReader
+from pygarl.sample_managers import StreamSampleManager
+
+# To execute tests, go to the project main directory and type:
+# python -m unittest discover
+
+
+def count_windows(name, ready, results):
+    """
+    Read the ring in another process, counting the windows of a StreamSampleManager
+    """
+    reader = SharedRingReader(name, from_oldest=True)
+    manager = StreamSampleManager(window=10, step=10)
+    receiver = MockReceiver()
+    windows = []
+    receiver.receive_sample = lambda sample: windows.append(sample.data[:, 0].tolist())
+    reader.attach_manager(manager)
+    manager.attach_receiver(receiver)
+
+    reader.open()
+    ready.set()
+    reader.mainloop()
+    reader.close()
+
+    results.put((windows, reader.overruns))
+
+
+class SharedRingTestCase(unittest.TestCase):
+    """
+    Tests to check the SharedRingWriter and SharedRingReader behaviour
+    """
+    def setUp(self):
+        self.writer = SharedRingWriter(capacity=8, n_axis=2)
+        self.reader = SharedRingReader(self.writer.name)
+        self.manager = MockSampleManager()
+        self.reader.attach_manager(self.manager)
+
+    def tearDown(self):
+        if self.reader.ring is not None:
+            self.reader.close()
+        self.writer.close()
+
+    def test_frames_and_signals_received(self):
+        self.reader.open()
+
+        self.writer.receive_signal(ControlSignal.START)
+        self.writer.receive_data([1, 2])
+        self.writer.receive_data([3, 4])
+
+        self.assertEqual(self.reader.poll(), 3)
+        self.assertEqual(self.manager.received_signal, ControlSignal.START)
+        self.assertEqual(np.array(self.manager.received_frames).tolist(), [[1, 2], [3, 4]])
+
+        # Nothing new has been written
+        self.assertEqual(self.reader.poll(), 0)
+
+    def test_overrun_detected(self):
+        self.reader.open()
+
+        for n in range(20):
+            self.writer.receive_data([n, n])
+
+        self.reader.poll()
+
+        self.assertEqual(self.reader.overruns, 1)
+        self.assertEqual(self.manager.received_signal, ControlSignal.OVERRUN)
+
+        # Only the frames still in the ring are received, in order
+        received = [frame[0] for frame in self.manager.received_frames]
+        self.assertEqual(received, list(range(20 - len(received), 20)))
+        self.assertEqual(self.reader.lost_records + len(received), 20)
+
+    def test_frames_of_wrong_size_should_raise_error(self):
+        self.assertRaises(ValueError, self.writer.receive_data, [1, 2, 3])
+
+    def test_reader_in_another_process(self):
+        writer = SharedRingWriter(capacity=64, n_axis=1)
+        ready = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        consumer = multiprocessing.Process(target=count_windows, args=(writer.name, ready, results))
+        consumer.start()
+
+        # The ring is removed when the writer is closed, so the consumer must attach to it first
+        self.assertTrue(ready.wait(timeout=30))
+
+        for n in range(40):
+            writer.receive_data([n])
+        writer.close()
+
+        windows, overruns = results.get(timeout=30)
+        consumer.join()
+
+        self.assertEqual(overruns, 0)
+        self.assertEqual(windows, [list(range(n, n + 10)) for n in range(0, 40, 10)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -229,5 +229,33 @@ class StreamSampleManagerTestCase(unittest.TestCase):
         # Check the StreamSampleManager raises an exception if step > window
         self.assertRaises(ValueError, StreamSampleManager, step=10, window=5)
 
+    def test_samples_tagged_with_device_id(self):
+        manager = StreamSampleManager(window=2, step=2, device_id="left")
+        receiver = MockReceiver()
+        manager.attach_receiver(receiver)
+
+        manager.receive_data([1, 2, 3])
+        manager.receive_data([4, 5, 6])
+
+        self.assertEqual(receiver.received_sample.device_id, "left")
+
+    def test_window_restarted_after_overrun(self):
+        receiver = MockReceiver()
+        self.manager.attach_receiver(receiver)
+
+        self.manager.receive_data([1, 2, 3])
+        self.manager.receive_data([4, 5, 6])
+        self.manager.receive_data([7, 8, 9])
+
+        # The frames received before the overrun are discarded
+        self.manager.receive_signal(ControlSignal.OVERRUN)
+        self.assertEqual(len(self.manager.buffer), 0)
+
+        for n in range(4):
+            self.manager.receive_data([n, n, n])
+
+        self.assertEqual(receiver.received_sample.data[:, 0].tolist(), [0, 1, 2, 3])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,227 @@
+import unittest
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+from pygarl.abstracts import ControlSignal
+from pygarl.base import Sample
+from pygarl.mocks import MockThresholdClassifier
+from pygarl.server import GestureServer, GestureClient, MessageType, encode_message, decode_messages, \
+    encode_gesture, decode_gesture, encode_sample
+
+# To execute tests, go to the project main directory and type:
+# python -m unittest discover
+
+
+class ProtocolTestCase(unittest.TestCase):
+    """
+    Tests to check the encoding of the messages
+    """
+    def test_decode_partial_messages(self):
+        message = encode_message(MessageType.FRAME, b"abcd") + encode_message(MessageType.HEALTH)
+
+        # The last message is incomplete
+        buffer = bytearray(message[:-2])
+        self.assertEqual(decode_messages(buffer), [(MessageType.FRAME, b"abcd")])
+
+        buffer.extend(message[-2:])
+        self.assertEqual(decode_messages(buffer), [(MessageType.HEALTH, b"")])
+        self.assertEqual(len(buffer), 0)
+
+    def test_gesture_without_confidence(self):
+        message = encode_gesture(3, "tap", None)
+        (message_type, payload), = decode_messages(bytearray(message))
+
+        self.assertEqual(message_type, MessageType.GESTURE)
+        self.assertEqual(decode_gesture(payload), (3, "tap", None))
+
+
+class OneAxisClassifier(MockThresholdClassifier):
+    """
+    Classifier that can't classify the samples with more than one axis
+    """
+    def predict_linearized_proba(self, x):
+        if x.shape[1] > 1:
+            raise ValueError("Only one value is supported")
+
+        return MockThresholdClassifier.predict_linearized_proba(self, x)
+
+
+class GestureServerTestCase(unittest.TestCase):
+    """
+    Tests to check GestureServer behaviour, on a Unix domain socket
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.address = os.path.join(self.directory, "pygarl.sock")
+
+        self.server = GestureServer(MockThresholdClassifier(threshold=5), self.address, window=4, step=4,
+                                    workers=2, batch_size=4, max_latency=0.01).start()
+        self.client = GestureClient(self.address).connect()
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def test_samples_are_predicted_in_order(self):
+        for value in (1, 10, 2, 20):
+            self.client.send_sample(Sample(data=[[value, 0]] * 3))
+
+        gestures = [self.client.receive_gesture() for n in range(4)]
+
+        self.assertEqual(sorted(gesture[0] for gesture in gestures), [0, 1, 2, 3])
+        self.assertEqual([gesture[1] for gesture in sorted(gestures)], ["low", "high", "low", "high"])
+        self.assertEqual(gestures[0][2], 1.0)
+
+    def test_frames_are_grouped_in_windows(self):
+        for n in range(8):
+            self.client.send_frame([n, 0])
+
+        # The last window is ended prematurely by the STOP signal
+        self.client.send_frame([0, 0])
+        self.client.send_signal(ControlSignal.STOP)
+
+        gestures = sorted(self.client.receive_gesture() for n in range(3))
+
+        self.assertEqual([gesture[1] for gesture in gestures], ["low", "high", "low"])
+
+    def test_multiple_clients(self):
+        other_client = GestureClient(self.address).connect()
+
+        try:
+            self.client.send_sample([[1]])
+            other_client.send_sample([[9]])
+
+            self.assertEqual(other_client.receive_gesture(), (0, "high", 1.0))
+            self.assertEqual(self.client.receive_gesture(), (0, "low", 1.0))
+            self.assertEqual(self.client.request_health()['clients'], 2)
+        finally:
+            other_client.close()
+
+    def test_health(self):
+        self.client.send_sample([[1], [2]])
+        self.client.receive_gesture()
+
+        health = self.client.request_health()
+
+        self.assertEqual(health['status'], "ok")
+        self.assertEqual(health['gestures'], ["low", "high"])
+        self.assertEqual(health['received_samples'], 1)
+        self.assertEqual(health['predicted_samples'], 1)
+        self.assertGreaterEqual(health['average_latency'], 0)
+
+    def test_invalid_sample_should_return_error(self):
+        self.client.socket.sendall(encode_message(MessageType.SAMPLE, b"\x00\x00\x00\x02\x00\x00\x00\x02"))
+
+        self.assertRaises(ValueError, self.client.receive_gesture)
+
+        # The connection is still usable
+        self.client.send_sample([[7]])
+        self.assertEqual(self.client.receive_gesture()[1], "high")
+
+    def test_stop_removes_socket_file(self):
+        self.client.close()
+        self.server.stop()
+
+        self.assertFalse(os.path.exists(self.address))
+
+        # Restart, so that tearDown can stop it again
+        self.server.start()
+        self.client.connect()
+
+    def test_failed_sample_should_return_error_only_to_its_client(self):
+        self.server.classifier = OneAxisClassifier(threshold=5)
+        self.server.max_latency = 0.5
+        other_client = GestureClient(self.address).connect()
+
+        try:
+            # The first sample waits for the other one to fill the batch
+            self.client.send_sample([[1, 2, 3]])
+            other_client.send_sample([[9]])
+
+            self.assertEqual(other_client.receive_gesture(), (0, "high", 1.0))
+            self.assertRaises(ValueError, self.client.receive_gesture)
+        finally:
+            other_client.close()
+
+    def test_slow_client_does_not_block_other_clients(self):
+        self.server.max_backlog = 16
+        self.server.max_output = 4096
+
+        # The slow client sends samples without ever reading the gestures
+        slow_client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        slow_client.connect(self.address)
+        slow_client.settimeout(0.1)
+        stop_event = threading.Event()
+
+        def flood():
+            message = encode_sample([[9]])
+            while not stop_event.is_set():
+                try:
+                    slow_client.sendall(message)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+
+        flooder = threading.Thread(target=flood)
+        flooder.daemon = True
+        flooder.start()
+
+        try:
+            self.client.send_sample([[1]])
+            self.assertEqual(self.client.receive_gesture(), (0, "low", 1.0))
+
+            # The reading of the slow client eventually stops
+            health = self.client.request_health()
+            for attempt in range(50):
+                if health['paused_clients'] == 1:
+                    break
+                stop_event.wait(0.1)
+                health = self.client.request_health()
+
+            self.assertEqual(health['paused_clients'], 1)
+
+            self.client.send_sample([[2]])
+            self.assertEqual(self.client.receive_gesture(), (1, "low", 1.0))
+        finally:
+            stop_event.set()
+            flooder.join()
+            slow_client.close()
+
+    def test_start_should_not_remove_other_files(self):
+        self.client.close()
+        self.server.stop()
+
+        with open(self.address, "w") as file:
+            file.write("data")
+
+        self.assertRaises(ValueError, self.server.start)
+        self.assertTrue(os.path.exists(self.address))
+
+        os.remove(self.address)
+        self.server.start()
+        self.client.connect()
+
+    def test_stop_closes_wakeup_pipe(self):
+        wakeup_reader = self.server.wakeup_reader
+
+        self.client.close()
+        self.server.stop()
+
+        self.assertRaises(OSError, os.fstat, wakeup_reader)
+
+        self.server.start()
+        self.client.connect()
+
+    def test_stop_without_start(self):
+        server = GestureServer(MockThresholdClassifier(threshold=5), os.path.join(self.directory, "other.sock"))
+
+        server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -125,6 +125,12 @@ setup(
     # https://packaging.python.org/en/latest/requirements.html
     install_requires=["joblib", "click", "matplotlib", "scipy", "numpy", "scikit-learn", "pyserial", "seaborn"],  # Optional
 
+    # Optional dependencies, installed with: pip install pygarl[fast]
+    # numba compiles the DTW kernel used by the DTWClassifier.
+    extras_require={  # Optional
+        'fast': ["numba"],
+    },
+
     # If there are data files included in your packages that need to be
     # installed, specify them here.
     #